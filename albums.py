@@ -0,0 +1,91 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Типи, які можна надіслати в sendMediaGroup
+GROUP_MEDIA_TYPES = ("photo", "video", "document", "audio")
+
+
+def input_media(msg):
+    """InputMedia для sendMediaGroup з повідомлення альбому; None, якщо тип не підтримується"""
+    for kind in GROUP_MEDIA_TYPES:
+        if kind in msg:
+            file_id = msg[kind][-1]["file_id"] if kind == "photo" else msg[kind]["file_id"]
+            media = {"type": kind, "media": file_id}
+            if "caption" in msg:
+                media["caption"] = msg["caption"]
+                if "caption_entities" in msg:
+                    media["caption_entities"] = msg["caption_entities"]
+            return media
+    return None
+
+
+class MediaGroupBuffer:
+    """Збирає частини альбому, які Telegram надсилає окремими оновленнями.
+
+    Частини з однаковим ключем (media_group_id + адресат) накопичуються,
+    поки не мине window секунд без нових частин або не набереться
+    max_items, після чого flush(messages) викликається один раз для
+    всього альбому. Таймер вікна - задача в спільному планувальнику.
+    flush_source(source) відправляє недозібрані альбоми відправника
+    одразу - перед його наступним звичайним повідомленням.
+    """
+
+    def __init__(self, scheduler, window=1.0, max_items=10):
+        self.scheduler = scheduler
+        self.window = window
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._groups = {}
+
+    def add(self, key, message, flush, source=None):
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = [[], flush, None, source]
+            else:
+                group[2].cancel()
+            group[0].append(message)
+            if len(group[0]) >= self.max_items:
+                del self._groups[key]
+            else:
+                size = len(group[0])
+                group[2] = self.scheduler.call_later(self.window, self._expire, key, size, name="media-group")
+                return
+        self._flush(group)
+
+    def flush_source(self, source):
+        """Відправляє недозібрані альбоми від source, не чекаючи кінця вікна"""
+        if not self._groups:
+            return
+        with self._lock:
+            keys = [k for k, g in self._groups.items() if g[3] == source]
+            groups = [self._groups.pop(k) for k in keys]
+        for group in groups:
+            group[2].cancel()
+            self._flush(group)
+
+    def stop(self):
+        """Відправляє недозібрані альбоми"""
+        with self._lock:
+            groups, self._groups = list(self._groups.values()), {}
+        for group in groups:
+            group[2].cancel()
+            self._flush(group)
+
+    def _expire(self, key, size):
+        with self._lock:
+            group = self._groups.get(key)
+            # Таймер, скасований надто пізно, не має відправити альбом без нових частин
+            if group is None or len(group[0]) != size:
+                return
+            del self._groups[key]
+        self._flush(group)
+
+    def _flush(self, group):
+        messages, flush = group[0], group[1]
+        try:
+            flush(messages)
+        except Exception as e:
+            logger.error(f"[ALBUMS] Помилка відправки альбому: {e}", exc_info=True)
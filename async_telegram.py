@@ -0,0 +1,135 @@
+import asyncio
+import json
+import logging
+import time
+
+import aiohttp
+
+from telegram_api import DEFAULT_API_URL, JSON_HEADERS, TelegramAPIError
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTelegramClient:
+    """Клієнт Bot API на aiohttp з одним пулом з'єднань на цикл подій.
+
+    Поведінка та сама, що в TelegramClient: повертає поле result, помилки -
+    TelegramAPIError, on_call(method, seconds, error) після кожного виклику.
+    Сесія створюється при першому виклику всередині циклу подій.
+    """
+
+    def __init__(self, token, pool_size=100, connect_timeout=3.05, read_timeout=8,
+                 api_url=DEFAULT_API_URL, on_call=None):
+        self.base_url = f"{api_url.rstrip('/')}/bot{token}/"
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.on_call = on_call
+        self.session = None
+
+    async def call(self, method, payload=None):
+        """payload - dict або вже закодоване JSON-тіло (bytes)"""
+        started = time.perf_counter()
+        error = None
+        try:
+            return await self._call(method, payload)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if self.on_call is not None:
+                self.on_call(method, time.perf_counter() - started, error)
+
+    async def _call(self, method, payload):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=self.timeout,
+            )
+        if not isinstance(payload, bytes):
+            payload = json.dumps(payload or {}, ensure_ascii=False).encode("utf-8")
+        async with self.session.post(self.base_url + method, data=payload, headers=JSON_HEADERS) as resp:
+            try:
+                data = await resp.json(content_type=None)
+            except ValueError:
+                resp.raise_for_status()
+                raise TelegramAPIError(method, resp.status, "non-JSON response")
+        if not data.get("ok"):
+            params = data.get("parameters") or {}
+            raise TelegramAPIError(
+                method,
+                data.get("error_code", resp.status),
+                data.get("description", ""),
+                retry_after=params.get("retry_after"),
+            )
+        return data.get("result")
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class AsyncOutboundDrainer:
+    """Вичерпує OutboundQueue з циклу asyncio замість потоків відправки.
+
+    Черга лишається тією ж (порядок у чаті, ліміти, повтор 429), але
+    кожен виклик - задача в циклі подій, тож одночасно в польоті може бути
+    до concurrency викликів без окремого потоку на кожен.
+    """
+
+    def __init__(self, queue, client, concurrency=200):
+        self.queue = queue
+        self.client = client
+        self.concurrency = concurrency
+        self._wakeup = None
+        self._tasks = set()
+        self._stopping = False
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        slots = asyncio.Semaphore(self.concurrency)
+        if self.queue.workers:
+            raise RuntimeError("OutboundQueue для asyncio має бути створена з workers=0")
+        self.queue.on_ready = lambda: loop.call_soon_threadsafe(self._wakeup.set)
+        logger.info(f"[OUTBOUND] Відправка з циклу asyncio, до {self.concurrency} викликів одночасно")
+        try:
+            while True:
+                self._wakeup.clear()
+                job, wait = self.queue.take_ready()
+                if job is not None:
+                    if not self.queue.admit(job):
+                        continue
+                    await slots.acquire()
+                    task = loop.create_task(self._send(job, slots))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                    continue
+                if self._stopping:
+                    if not self.queue.pending():
+                        return
+                    # Виклики в польоті ще можуть повернутись з 429
+                    wait = 0.05 if wait is None else min(wait, 0.05)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.queue.on_ready = None
+
+    async def _send(self, job, slots):
+        job.attempts += 1
+        try:
+            result = await self.client.call(job.method, job.payload)
+        except Exception as e:
+            self.queue.complete(job, error=e)
+        else:
+            self.queue.complete(job, result=result)
+        finally:
+            slots.release()
+
+    def stop(self):
+        """run() завершиться, коли черга спорожніє"""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
@@ -0,0 +1,164 @@
+"""Навантажувальний тест вебхука з локальним фейковим Bot API.
+
+    python -m bench.driver --rate 200 --duration 30 --save baseline.json
+    python -m bench.driver --rate 200 --duration 30 --baseline baseline.json
+
+За замовчуванням бот імпортується в цей же процес і запити йдуть через
+Flask test client; з --url оновлення відправляються по HTTP на вже
+запущений бот (його TELEGRAM_API_URL має вказувати на --api-port).
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.fake_api import FakeTelegramAPI
+from bench.report import build_report, format_report, load, rss_bytes, save
+from bench.updates import UpdateGenerator
+
+OPERATOR_ID = 1
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Навантажувальний тест вебхука з фейковим Bot API")
+    p.add_argument("--rate", type=float, default=100, help="оновлень за секунду")
+    p.add_argument("--duration", type=float, default=20, help="тривалість, секунди")
+    p.add_argument("--concurrency", type=int, default=32, help="одночасних HTTP-запитів")
+    p.add_argument("--users", type=int, default=50, help="одночасних синтетичних клієнтів")
+    p.add_argument("--latency", type=float, default=0.05, help="затримка фейкового API, с")
+    p.add_argument("--jitter", type=float, default=0.02)
+    p.add_argument("--rate-429", type=float, default=0.0, help="частка відповідей 429")
+    p.add_argument("--error-rate", type=float, default=0.0, help="частка відповідей 500")
+    p.add_argument("--api-port", type=int, default=0)
+    p.add_argument("--url", help="URL вебхука запущеного бота замість бота в процесі")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--drain-timeout", type=float, default=10, help="скільки чекати дренажу черг, с")
+    p.add_argument("--save", help="зберегти звіт у JSON")
+    p.add_argument("--baseline", help="порівняти з раніше збереженим звітом")
+    return p.parse_args(argv)
+
+
+def prepare_environment(api_url, workdir):
+    """Змінні середовища для бота в процесі; існуючі значення не перезаписуються"""
+    defaults = {
+        "API_TOKEN": "bench:token",
+        "ADMIN_ID": str(OPERATOR_ID),
+        "OPERATOR_IDS": str(OPERATOR_ID),
+        "OPERATOR_MAX_CHATS": "100000",
+        "TELEGRAM_API_URL": api_url,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench_state.db')}",
+        "ADMIN_LOG_PATH": os.path.join(workdir, "bench_admin_log.csv"),
+        "HISTORY_DB_PATH": os.path.join(workdir, "bench_history.db"),
+        "OUTBOUND_SPOOL_PATH": os.path.join(workdir, "bench_outbound_spool.jsonl"),
+        "PROFILE_DIR": os.path.join(workdir, "profiles"),
+        "SERVER_URL": "http://127.0.0.1:5000",
+        # Служба підтримки відкрита цілодобово: звіт не залежить від часу запуску
+        "WORK_HOURS": "mon-sun 00:00-24:00",
+        "HOLIDAYS": "",
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+
+def in_process_sender():
+    import bot
+
+    logging.getLogger().setLevel(logging.WARNING)
+    local = threading.local()
+
+    def send(update):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = bot.app.test_client()
+        return client.post("/webhook", json=update).status_code
+
+    def drain(timeout):
+        """Чекає, поки черги обробки і відправки спорожніють; (секунди, залишок)"""
+        started = time.perf_counter()
+        deadline = started + timeout
+        while time.perf_counter() < deadline:
+            if not bot.update_executor.pending() and not bot.outbound.pending():
+                break
+            time.sleep(0.01)
+        return time.perf_counter() - started, bot.update_executor.pending() + bot.outbound.pending()
+
+    def finish():
+        # Залишок черги вже не цікавий - не засмічуємо звіт помилками з'єднання
+        logging.disable(logging.CRITICAL)
+        bot.shutdown()
+
+    return send, drain, finish
+
+
+def http_sender(url):
+    import requests
+
+    local = threading.local()
+
+    def send(update):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        return session.post(url, json=update, timeout=10).status_code
+
+    return send, lambda timeout: (0.0, 0), lambda: None
+
+
+def run(args):
+    api = FakeTelegramAPI(port=args.api_port, latency=args.latency, jitter=args.jitter,
+                          rate_429=args.rate_429, error_rate=args.error_rate, seed=args.seed).start()
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    prepare_environment(api.url, workdir)
+    send, drain, finish = http_sender(args.url) if args.url else in_process_sender()
+
+    updates = UpdateGenerator(operator_id=OPERATOR_ID, seed=args.seed).stream(args.users)
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def fire(update):
+        started = time.perf_counter()
+        try:
+            status = send(update)
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] += 1
+
+    rss_start = rss_bytes()
+    total = int(args.rate * args.duration)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for i in range(total):
+            # Відкритий цикл: оновлення йдуть за розкладом незалежно від відповідей
+            delay = started + i / args.rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, next(updates))
+    elapsed = time.perf_counter() - started
+    drained, left = drain(args.drain_timeout)
+    report = build_report(latencies, statuses, elapsed, drained, left, rss_start, rss_bytes(), api)
+    finish()
+    api.stop()
+    return report
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    baseline = load(args.baseline) if args.baseline else None
+    print(format_report(report, baseline))
+    if args.save:
+        save(report, args.save)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeTelegramAPI:
+    """Локальна заміна api.telegram.org для навантажувальних тестів.
+
+    Кожен виклик відповідає із затримкою latency ± jitter секунд; частка
+    rate_429 викликів отримує 429 з retry_after, частка error_rate - 500.
+    Лічильники викликів по методах доступні в calls.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, jitter=0.02,
+                 rate_429=0.0, retry_after=1, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.throttled = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._message_ids = itertools.count(1000)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # ======= Відповіді =======
+    def _outcome(self):
+        with self._lock:
+            roll = self._random.random()
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+        if roll < self.rate_429:
+            return delay, 429
+        if roll < self.rate_429 + self.error_rate:
+            return delay, 500
+        return delay, 200
+
+    def _respond(self, method, payload):
+        delay, status = self._outcome()
+        with self._lock:
+            self.calls[method] += 1
+            if status == 429:
+                self.throttled += 1
+            elif status == 500:
+                self.errors += 1
+        if method == "getUpdates":
+            time.sleep(min(payload.get("timeout", 0), 1))
+            return 200, {"ok": True, "result": []}
+        time.sleep(delay)
+        if status == 429:
+            return 429, {"ok": False, "error_code": 429, "description": "Too Many Requests: retry later",
+                         "parameters": {"retry_after": self.retry_after}}
+        if status == 500:
+            return 500, {"ok": False, "error_code": 500, "description": "Internal Server Error"}
+        if method in ("answerCallbackQuery", "setWebhook", "deleteWebhook"):
+            return 200, {"ok": True, "result": True}
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": payload.get("chat_id"), "type": "private"},
+        }
+        if method == "sendMediaGroup":
+            return 200, {"ok": True, "result": [message for _ in payload.get("media", ())]}
+        if method == "copyMessage":
+            return 200, {"ok": True, "result": {"message_id": message["message_id"]}}
+        return 200, {"ok": True, "result": message}
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                method = self.path.rsplit("/", 1)[-1]
+                try:
+                    payload = json.loads(body or b"{}")
+                except ValueError:
+                    payload = {}
+                status, data = api._respond(method, payload)
+                out = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,87 @@
+import json
+import os
+import resource
+
+
+def rss_bytes():
+    """Поточний RSS процесу (Linux), інакше пікове значення з getrusage"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def build_report(latencies, statuses, elapsed, drain, left, rss_start, rss_end, api):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "outbound_drain_s": round(drain, 3),
+        "outbound_left": left,
+        "memory_mb": {
+            "start": round(rss_start / 2**20, 1),
+            "end": round(rss_end / 2**20, 1),
+            "growth": round((rss_end - rss_start) / 2**20, 1),
+        },
+        "api": {
+            "calls": dict(sorted(api.calls.items())),
+            "throttled": api.throttled,
+            "errors": api.errors,
+        },
+    }
+
+
+def _compare(current, baseline):
+    """Відсоткова зміна відносно базового значення"""
+    if not baseline:
+        return ""
+    return f" ({(current - baseline) / baseline * 100:+.1f}%)"
+
+
+def format_report(report, baseline=None):
+    base = baseline or {}
+    lat, base_lat = report["latency_ms"], base.get("latency_ms", {})
+    mem, base_mem = report["memory_mb"], base.get("memory_mb", {})
+    lines = [
+        f"Запитів:            {report['requests']} за {report['elapsed_s']} с",
+        f"Пропускна здатність: {report['throughput_rps']} rps{_compare(report['throughput_rps'], base.get('throughput_rps'))}",
+    ]
+    for q in ("p50", "p95", "p99", "max"):
+        lines.append(f"Затримка {q}:       {lat[q]} мс{_compare(lat[q], base_lat.get(q))}")
+    lines += [
+        f"HTTP статуси:       {report['statuses']}",
+        f"Дренаж черги:       {report['outbound_drain_s']} с, залишилось {report['outbound_left']}",
+        f"Пам'ять (RSS):      {mem['start']} → {mem['end']} МБ "
+        f"(+{mem['growth']}{_compare(mem['growth'], base_mem.get('growth'))})",
+        f"Виклики API:        {sum(report['api']['calls'].values())}, "
+        f"429: {report['api']['throttled']}, помилки: {report['api']['errors']}",
+    ]
+    for method, count in report["api"]["calls"].items():
+        lines.append(f"    {method}: {count}")
+    return "\n".join(lines)
+
+
+def save(report, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,112 @@
+import itertools
+import random
+import time
+
+DELIVERY_KEYS = ("ukrposhta", "novaposhta", "meest", "pickup")
+QUICK_ANSWERS = ("qa_delivery", "qa_payment", "qa_order")
+
+
+class UpdateGenerator:
+    """Синтетичні оновлення, схожі на реальний трафік бота.
+
+    Кожен клієнт проходить один зі сценаріїв (воронка замовлення, чат з
+    оператором з текстом, фото і альбомами, швидкі відповіді). Сценарії
+    різних клієнтів перемішуються, але порядок оновлень одного клієнта
+    зберігається. Оператор у чаті відповідає і натискає кнопки.
+    """
+
+    SCENARIOS = ("order", "support", "quick_answers")
+
+    def __init__(self, operator_id=1, first_user=100000, weights=(5, 3, 2), seed=None):
+        self.operator_id = operator_id
+        self.weights = weights
+        self._random = random.Random(seed)
+        self._users = itertools.count(first_user)
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._callback_ids = itertools.count(1)
+
+    # ======= Будівельники оновлень =======
+    def _message(self, chat_id, **fields):
+        msg = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Bench", "username": f"user{chat_id}"},
+        }
+        msg.update(fields)
+        return {"update_id": next(self._update_ids), "message": msg}
+
+    def text(self, chat_id, text):
+        return self._message(chat_id, text=text)
+
+    def photo(self, chat_id, media_group_id=None, caption=None):
+        file_id = f"AgAC{self._random.getrandbits(64):016x}"
+        fields = {"photo": [{"file_id": file_id + "s", "width": 90, "height": 90},
+                            {"file_id": file_id, "width": 1280, "height": 1280}]}
+        if media_group_id is not None:
+            fields["media_group_id"] = media_group_id
+        if caption is not None:
+            fields["caption"] = caption
+        return self._message(chat_id, **fields)
+
+    def contact(self, chat_id):
+        phone = f"380{self._random.randrange(10**8, 10**9)}"
+        return self._message(chat_id, contact={"phone_number": phone, "user_id": chat_id})
+
+    def callback(self, chat_id, data, from_id=None):
+        from_id = from_id or chat_id
+        return {
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._callback_ids)),
+                "from": {"id": from_id, "is_bot": False, "first_name": "Bench"},
+                "data": data,
+                "message": {"message_id": next(self._message_ids), "chat": {"id": chat_id}, "text": "…"},
+            },
+        }
+
+    # ======= Сценарії =======
+    def order(self, user):
+        yield self.text(user, "/start")
+        yield self.text(user, "🛒 Замовити товар")
+        yield self.text(user, f"https://t.me/elfbar202405/{self._random.randrange(1, 5000)}")
+        yield self.callback(user, f"delivery_{self._random.choice(DELIVERY_KEYS)}")
+        yield self.contact(user)
+        yield self.callback(user, f"confirm_order_{user}")
+
+    def support(self, user):
+        yield self.text(user, "/start")
+        yield self.text(user, "💬 Написати адміну")
+        yield self.callback(self.operator_id, f"reply_{user}", from_id=self.operator_id)
+        for _ in range(self._random.randrange(1, 4)):
+            yield self.text(user, "Доброго дня, є в наявності?")
+            yield self.text(self.operator_id, "Так, є")
+        if self._random.random() < 0.5:
+            yield self.photo(user, caption="Ось цей")
+        if self._random.random() < 0.3:
+            group = f"{self._random.getrandbits(48)}"
+            for i in range(self._random.randrange(2, 5)):
+                yield self.photo(user, media_group_id=group, caption="Альбом" if i == 0 else None)
+        yield self.text(user, "✓ Завершити")
+
+    def quick_answers(self, user):
+        yield self.text(user, "/start")
+        yield self.text(user, "❓ Швидкі відповіді")
+        for data in self._random.sample(QUICK_ANSWERS, 2):
+            yield self.callback(user, data)
+        yield self.callback(user, "back_to_menu")
+
+    def stream(self, concurrent_users=50):
+        """Нескінченний потік оновлень від concurrent_users одночасних клієнтів"""
+        active = []
+        while True:
+            while len(active) < concurrent_users:
+                scenario = self._random.choices(self.SCENARIOS, self.weights)[0]
+                active.append(getattr(self, scenario)(next(self._users)))
+            i = self._random.randrange(len(active))
+            try:
+                yield next(active[i])
+            except StopIteration:
+                active[i] = active[-1]
+                active.pop()
@@ -1,16 +1,46 @@
 import os
+import sys
 import logging
 from html import escape
-from datetime import datetime, timedelta
+from datetime import datetime
 import random
 import threading
 import time
-import csv
 import json
 import re
-
-import requests
-from flask import Flask, request
+import atexit
+import signal
+import hmac
+from functools import partial
+
+from flask import Flask, Response, g, request
+
+from telegram_api import TelegramClient, DEFAULT_API_URL
+from outbound import OutboundQueue
+from circuit import CircuitBreaker
+from spool import OutboundSpool, SpoolReplayer
+from executor import ChatExecutor
+from chat_log import CsvLogWriter
+from history import HistoryIndex
+from storage import StateStore, StoreMapping
+from payloads import PayloadRegistry, var
+from router import CallbackQuery, Message, Router
+import inline_reply
+from inline_reply import InlineReply
+from polling import LongPoller
+from dedup import RecentKeys
+from sessions import ChatSession, OrderSession, OrderStatus, SessionSweeper
+from support_desk import SupportDesk
+from albums import MediaGroupBuffer, input_media
+from coalesce import NoticeCoalescer
+from catalog import Catalog
+from broadcast import Broadcaster, ChatRegistry
+from metrics import MetricsRegistry
+from log_pipeline import LogPipeline, correlation, level_value, parse_pairs
+from scheduler import Scheduler
+from work_calendar import DEFAULT_HOURS, WorkCalendar, parse_holidays, parse_hours
+from tracing import Tracer, activate, span
+from profiling import SamplingProfiler
 
 # ======= Конфігурація =======
 TOKEN = os.getenv("API_TOKEN")
@@ -24,41 +54,226 @@ except ValueError:
 
 SERVER_URL = os.getenv("SERVER_URL", "http://localhost:5000")
 WEBHOOK_URL = f"{SERVER_URL}/webhook"
+ALLOWED_UPDATES = ["message", "callback_query", "channel_post", "edited_channel_post"]
 
-app = Flask(__name__)
+def env_int(name, default):
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
+def env_float(name, default):
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+# webhook (Flask), async (aiohttp) або polling; прапорці --async/--polling мають пріоритет
+if "--polling" in sys.argv[1:]:
+    BOT_MODE = "polling"
+elif "--async" in sys.argv[1:]:
+    BOT_MODE = "async"
+else:
+    BOT_MODE = os.getenv("BOT_MODE", "webhook")
+
+# ======= Метрики =======
+metrics = MetricsRegistry()
+http_seconds = metrics.histogram("bot_http_request_seconds", "Час обробки HTTP-запиту", ("route", "method"))
+update_seconds = metrics.histogram("bot_update_seconds", "Час обробки оновлення", ("kind",))
+tg_call_seconds = metrics.histogram("bot_telegram_call_seconds", "Тривалість викликів Bot API", ("method",))
+tg_errors = metrics.counter("bot_telegram_errors_total", "Помилки викликів Bot API", ("method", "code"))
+tg_throttled = metrics.counter("bot_telegram_throttled_total", "Відповіді 429 від Bot API", ("method",))
+
+def observe_telegram_call(method, seconds, error):
+    tg_call_seconds.labels(method).observe(seconds)
+    if error is not None:
+        code = getattr(error, "error_code", "network")
+        tg_errors.labels(method, str(code)).inc()
+        if code == 429:
+            tg_throttled.labels(method).inc()
+
+# ======= Telegram Bot API =======
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", DEFAULT_API_URL)
+# В режимі async чергу відправки вичерпує цикл asyncio - без потоків
+OUTBOUND_WORKERS = 0 if BOT_MODE == "async" else env_int("OUTBOUND_WORKERS", 8)
+TG_POOL_SIZE = env_int("TG_POOL_SIZE", max(OUTBOUND_WORKERS, 8) + 2)
+TG_CONNECT_TIMEOUT = env_float("TG_CONNECT_TIMEOUT", 3.05)
+TG_READ_TIMEOUT = env_float("TG_READ_TIMEOUT", 8)
+
+tg = TelegramClient(
+    TOKEN,
+    pool_size=TG_POOL_SIZE,
+    connect_timeout=TG_CONNECT_TIMEOUT,
+    read_timeout=TG_READ_TIMEOUT,
+    api_url=TELEGRAM_API_URL,
+    on_call=observe_telegram_call,
 )
+
+# При збоях Bot API виклики відхиляються одразу, а недоставлені повідомлення
+# пишуться в журнал на диску і доставляються по порядку після відновлення
+breaker = CircuitBreaker(
+    window=env_int("CIRCUIT_WINDOW", 20),
+    threshold=env_float("CIRCUIT_THRESHOLD", 0.5),
+    min_calls=env_int("CIRCUIT_MIN_CALLS", 5),
+    reset_after=env_float("CIRCUIT_RESET_AFTER", 5),
+    max_reset_after=env_float("CIRCUIT_MAX_RESET_AFTER", 120),
+)
+outbound_spool = OutboundSpool(os.getenv("OUTBOUND_SPOOL_PATH", "outbound_spool.jsonl"))
+
+# Ліміти Telegram: ~30 повідомлень/с глобально і ~1/с в один чат
+outbound = OutboundQueue(
+    tg,
+    workers=OUTBOUND_WORKERS,
+    global_rate=env_float("TG_GLOBAL_RATE", 30),
+    global_burst=env_int("TG_GLOBAL_BURST", 30),
+    chat_rate=env_float("TG_CHAT_RATE", 1),
+    chat_burst=env_int("TG_CHAT_BURST", 3),
+    max_retries=env_int("TG_MAX_RETRIES", 3),
+    breaker=breaker,
+    spool=outbound_spool,
+)
+# Потоки відправки стартують до першого виклику, щоб режим не залежав від порядку імпорту
+outbound.start()
+
+# ======= Обробка оновлень у пулі потоків =======
+# Оновлення одного чату - послідовно, різних чатів - паралельно
+update_executor = ChatExecutor(
+    workers=env_int("UPDATE_WORKERS", 8),
+    max_pending=env_int("UPDATE_QUEUE_DEPTH", 1000),
+    policy=os.getenv("UPDATE_BACKPRESSURE", "reject"),
+    block_timeout=env_float("UPDATE_BLOCK_TIMEOUT", 1.0),
+    name="UPDATES",
+)
+
+# Перша відповідь обробника повертається прямо в тілі відповіді на вебхук
+WEBHOOK_INLINE_REPLY = os.getenv("WEBHOOK_INLINE_REPLY", "1") == "1"
+WEBHOOK_INLINE_WAIT = env_float("WEBHOOK_INLINE_WAIT", 0.5)
+
+app = Flask(__name__)
+
+# Логи пишуться з фонового потоку; LOG_LEVELS/LOG_SAMPLE - по категоріях, напр. "WEBHOOK=0.1"
+log_pipeline = LogPipeline(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    fmt=os.getenv("LOG_FORMAT", "json"),
+    levels=parse_pairs(os.getenv("LOG_LEVELS"), level_value),
+    sample=parse_pairs(os.getenv("LOG_SAMPLE"), float),
+).install()
 logger = logging.getLogger(__name__)
 
+# ======= Трасування і профілювання =======
+# TRACE_SLOW_MS > 0 - дерево відрізків оновлень, довших за поріг, іде в лог;
+# PROFILE_EVERY=N - cProfile на кожному N-му оновленні. Обидва змінюються через /debug/profiling
+TRACE_SLOW_MS = env_float("TRACE_SLOW_MS", 0)
+tracer = Tracer(slow_seconds=TRACE_SLOW_MS / 1000 if TRACE_SLOW_MS > 0 else None)
+profiler = SamplingProfiler(
+    every=env_int("PROFILE_EVERY", 0),
+    directory=os.getenv("PROFILE_DIR", "profiles"),
+    flush_every=env_int("PROFILE_FLUSH_EVERY", 100),
+)
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
+
+# ======= Планувальник =======
+# Один потік для всіх таймерів: холостий хід, прибирання сесій, вікна альбомів
+scheduler = Scheduler()
+
+spool_replayer = SpoolReplayer(
+    outbound_spool,
+    outbound,
+    scheduler,
+    backoff=env_float("SPOOL_BACKOFF", 1),
+    max_backoff=env_float("SPOOL_MAX_BACKOFF", 60),
+)
+outbound_spool.on_append = spool_replayer.kick
+outbound_spool.load()
+if len(outbound_spool):
+    spool_replayer.kick()
+
 # ======= Стан чатів =======
-active_chats = {}
-admin_targets = {}
-user_orders = {}  # Зберігаємо замовлення користувачів
-user_phone = {}   # Зберігаємо номер телефону
+# Postgres (DATABASE_URL) або локальний SQLite; стан переживає перезапуск (бот працює одним процесом)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///bot_state.db")
+
+state_store = StateStore(
+    DATABASE_URL,
+    flush_interval=env_float("STATE_FLUSH_INTERVAL", 0.05),
+    batch_size=env_int("STATE_BATCH_SIZE", 200),
+)
+
+SESSION_MAX_CACHED = env_int("SESSION_MAX_CACHED", 10000)
+ORDER_SESSION_TTL = env_int("ORDER_SESSION_TTL", 2 * 3600)
+CHAT_SESSION_TTL = env_int("CHAT_SESSION_TTL", 24 * 3600)
+
+def session_mapping(namespace, cls=None):
+    codec = {} if cls is None else {"encode": cls.to_dict, "decode": cls.from_dict}
+    return StoreMapping(state_store, namespace, max_cached=SESSION_MAX_CACHED, **codec)
+
+active_chats = session_mapping("active_chats", ChatSession)
+admin_targets = session_mapping("admin_targets")
+user_orders = session_mapping("user_orders", OrderSession)  # Зберігаємо замовлення користувачів
+user_phone = session_mapping("user_phone")    # Зберігаємо номер телефону
+
+# Покинуті замовлення і звернення прибирає один фоновий потік
+session_sweeper = SessionSweeper()
+session_sweeper.register("user_orders", user_orders, ORDER_SESSION_TTL)
+session_sweeper.register("user_phone", user_phone, ORDER_SESSION_TTL)
+scheduler.call_every(env_int("SESSION_SWEEP_INTERVAL", 60), session_sweeper.sweep, name="session-sweep")
+
+# ======= Дедуплікація =======
+# update_id і ключі ідемпотентності. У polling зсув offset іде лише по суцільно
+# обробленому префіксу, тож після падіння оновлення за ним приходять повторно -
+# спільний індекс у БД за замовчуванням відсіює вже оброблені
+processed_keys = RecentKeys(
+    capacity=env_int("DEDUP_CAPACITY", 10000),
+    shared=state_store if os.getenv("DEDUP_SHARED", "1" if BOT_MODE == "polling" else "0") == "1" else None,
+    shared_ttl=env_int("DEDUP_SHARED_TTL", 24 * 3600),
+)
+
+def claim_once(key):
+    """True при першому виклику з цим ключем, False - для повторів"""
+    return not processed_keys.seen(key)
+
+def update_is_duplicate(update):
+    update_id = update.get("update_id")
+    if update_id is None or claim_once(f"update:{update_id}"):
+        return False
+    logger.warning(f"[DEDUP] Повторне оновлення {update_id} відкинуто")
+    return True
+
+def release_update(update):
+    """Оновлення не прийняли в обробку (503) - повтор від Telegram має пройти"""
+    update_id = update.get("update_id")
+    if update_id is not None:
+        processed_keys.forget(f"update:{update_id}")
 
 # ======= Idle mode =======
 idle_mode_enabled = True
 idle_min_interval = 240
 idle_max_interval = 480
-idle_thread = None
-idle_stop_event = threading.Event()
+idle_job = None
 idle_counter = 0
 
 # ======= Лог файл =======
-LOG_PATH = "admin_chat_log.csv"
+LOG_PATH = os.getenv("ADMIN_LOG_PATH", "admin_chat_log.csv")
+
+# Індекс історії по user_id для /history; поповнюється потоком запису логу
+chat_history = HistoryIndex(os.getenv("HISTORY_DB_PATH", "chat_history.db"))
+if chat_history.is_empty() or os.getenv("HISTORY_REBUILD", "0") == "1":
+    chat_history.rebuild(LOG_PATH)
+
+admin_log = CsvLogWriter(
+    LOG_PATH,
+    header=["timestamp", "sender", "user_id", "text"],
+    batch_size=env_int("ADMIN_LOG_BATCH", 100),
+    flush_interval=env_float("ADMIN_LOG_FLUSH_INTERVAL", 1.0),
+    max_bytes=env_int("ADMIN_LOG_MAX_BYTES", 10 * 1024 * 1024),
+    rotate_daily=os.getenv("ADMIN_LOG_ROTATE_DAILY", "0") == "1",
+    compress=os.getenv("ADMIN_LOG_COMPRESS", "1") == "1",
+    on_write=chat_history.add_rows,
+)
 
 def log_admin_communication(sender, user_id, message_text):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    file_exists = os.path.isfile(LOG_PATH)
-    with open(LOG_PATH, "a", encoding="utf-8", newline='') as csvfile:
-        writer = csv. writer(csvfile, delimiter=',', quoting=csv.QUOTE_ALL)
-        if not file_exists:
-            writer. writerow(["timestamp", "sender", "user_id", "text"])
-        writer.writerow([timestamp, sender, user_id, message_text])
+    with span("log_write"):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        admin_log.write([timestamp, sender, user_id, message_text])
 
 # ======= КОНСТАНТИ МАГАЗИНУ =======
 WELCOME_TEXT = (
@@ -114,28 +329,15 @@ ADMIN_CHAT_CLOSED_TEXT = (
 )
 
 # ======= Функція для перевірки робочого часу =======
+# Години в часовому поясі магазину; WORK_HOURS у форматі "mon-thu 09:00-18:00; fri 09:00-15:00"
+work_calendar = WorkCalendar(
+    tz=os.getenv("WORK_TZ", "Europe/Kyiv"),
+    hours=parse_hours(os.getenv("WORK_HOURS", DEFAULT_HOURS)),
+    holidays=parse_holidays(os.getenv("HOLIDAYS")),
+)
+
 def is_working_hours():
-    try:
-        now = datetime.utcnow()
-        now_local = now + timedelta(hours=2)
-        weekday = now_local.weekday()
-        hour = now_local.hour
-        minute = now_local.minute
-        current_time = hour * 60 + minute
-        if weekday in (5, 6):
-            return False
-        if weekday in (0, 1, 2, 3):
-            start = 9 * 60
-            end = 18 * 60
-            return start <= current_time < end
-        if weekday == 4:
-            start = 9 * 60
-            end = 15 * 60
-            return start <= current_time < end
-        return False
-    except Exception as e:  
-        logger.error(f"Error checking working hours: {e}")
-        return True
+    return work_calendar.is_open()
 
 # ======= Функції для холостого ходу =======
 def simulate_user_activity():
@@ -150,78 +352,48 @@ def simulate_user_activity():
         now = datetime.now()
         timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
         idle_counter += 1
-        out = (
-            f"\n----- SIMULATION #{idle_counter} -----\n"
-            f"Симуляція дії клієнта в {timestamp}\n"
-            f"Дія: {activity}\n"
-            f"------------------------------"
-        )
-        print(out)
         logger.info(f"[IDLE MODE] #{idle_counter}:    {timestamp} → {activity}")
     except Exception as e:
         logger.error(f"Error in simulate_user_activity: {e}")
 
-def idle_mode_worker():
-    logger.info("[IDLE MODE] Холостий хід активований")
-    while not idle_stop_event.is_set():
-        try:
-            wait_time = random.randint(idle_min_interval, idle_max_interval)
-            logger. info(f"[IDLE MODE] Очікування {wait_time//60} хвилин ({wait_time} с) до наступної симуляції...")
-            if idle_stop_event.wait(timeout=wait_time):
-                break
-            simulate_user_activity()
-        except Exception as e:
-            logger. error(f"[IDLE MODE] Помилка:    {e}")
-            time.sleep(5)
-
 def start_idle_mode():
-    global idle_thread
+    global idle_job
     try:
-        if idle_mode_enabled and idle_thread is None:
-            idle_stop_event.clear()
-            idle_thread = threading.Thread(target=idle_mode_worker, daemon=True)
-            idle_thread.start()
-            logger.info("[IDLE MODE] Потік запущен")
+        if idle_mode_enabled and idle_job is None:
+            # Випадковий інтервал між idle_min_interval і idle_max_interval
+            idle_job = scheduler.call_every(
+                (idle_min_interval + idle_max_interval) / 2,
+                simulate_user_activity,
+                jitter=(idle_max_interval - idle_min_interval) / 2,
+                name="idle-mode",
+            )
+            logger.info("[IDLE MODE] Холостий хід активований")
     except Exception as e:
         logger.error(f"Error starting idle mode: {e}")
 
 def stop_idle_mode():
-    global idle_thread
+    global idle_job
     try:
-        if idle_thread is not None:
-            idle_stop_event.set()
-            idle_thread.join(timeout=2)
-            idle_thread = None
-            logger. info("[IDLE MODE] Потік зупинен")
+        if idle_job is not None:
+            idle_job.cancel()
+            idle_job = None
+            logger. info("[IDLE MODE] Холостий хід зупинено")
     except Exception as e:   
         logger.error(f"Error stopping idle mode: {e}")
 
 # ======= Функція для реєстрації вебхука =======
 def register_webhook():
-    url = f"https://api.telegram.org/bot{TOKEN}/setWebhook"
-    payload = {
-        "url":    WEBHOOK_URL,
-        "allowed_updates": ["message", "callback_query"]
-    }
     try:
-        resp = requests.post(url, json=payload, timeout=10)
-        resp.raise_for_status()
-        result = resp.json()
-        if result.get("ok"):
-            logger.info(f"✅ Вебхук зареєстрований:   {WEBHOOK_URL}")
-            return True
-        else:
-            logger.error(f"❌ Помилка:    {result.get('description')}")
-            return False
+        tg.set_webhook(WEBHOOK_URL, allowed_updates=ALLOWED_UPDATES)
+        logger.info(f"✅ Вебхук зареєстрований:   {WEBHOOK_URL}")
+        return True
     except Exception as e:
         logger.error(f"❌ Помилка реєстрації вебхука:  {e}")
         return False
 
 def delete_webhook():
-    url = f"https://api.telegram.org/bot{TOKEN}/deleteWebhook"
     try:
-        resp = requests.post(url, timeout=10)
-        resp.raise_for_status()
+        tg.delete_webhook()
         logger.info("✅ Вебхук видалений")
     except Exception as e:
         logger.error(f"❌ Помилка видалення вебхука: {e}")
@@ -326,25 +498,78 @@ def phone_request_markup():
         "one_time_keyboard": True,
     }
 
+# ======= Готові тіла запитів для статичних відповідей =======
+# Кодуються в JSON один раз при старті; при відправці підставляються лише chat_id/user_id
+payload_cache = PayloadRegistry()
+
+def _static_message(name, text, reply_markup=None, **extra):
+    payload = {"chat_id": var("chat_id"), "text": text, "parse_mode": "HTML"}
+    if reply_markup is not None:
+        payload["reply_markup"] = reply_markup
+    payload.update(extra)
+    payload_cache.add(name, "sendMessage", payload)
+
+def _static_edit(name, text, reply_markup=None):
+    payload = {"chat_id": var("chat_id"), "message_id": var("message_id"), "text": text, "parse_mode": "HTML"}
+    if reply_markup is not None:
+        payload["reply_markup"] = reply_markup
+    payload_cache.add(name, "editMessageText", payload)
+
+_static_message("welcome", WELCOME_TEXT, main_menu_markup())
+_static_message("welcome_plain", WELCOME_TEXT)
+_static_message("about", ABOUT_TEXT, main_menu_markup())
+_static_message("order_instructions", ORDER_INSTRUCTIONS_TEXT)
+_static_message("quick_answers", QUICK_ANSWERS_TEXT, quick_answers_markup())
+_static_message("off_hours", OFF_HOURS_TEXT, user_finish_markup())
+_static_message("admin_pending", "Адміністратор прочитає ваше повідомлення найближчим часом..  .", user_finish_markup())
+_static_message("already_sent", "Ваше повідомлення вже відправлено.    Очікуйте..  .", user_finish_markup())
+_static_message("chat_start", CHAT_START_TEXT, user_finish_markup())
+_static_message("chat_closed", CHAT_CLOSED_TEXT, main_menu_markup())
+_static_message("unknown_command", "Команда не розпізнана.    Виберіть опцію з меню.", main_menu_markup())
+_static_message("choose_delivery", "<b>Оберіть спосіб доставки:</b>", delivery_markup())
+_static_message("phone_request", "<b>☎️ Поділіться своїм номером телефону</b>\n\nНатисніть на кнопку нижче для автоматичного надсилання:", phone_request_markup())
+_static_message("empty_link", "❌ Введіть текст.  Надишліть посилання на товар або напишіть його назву.")
+# Текст змінний, але клавіатура з user_id закодована заздалегідь
+_static_message("admin_notice", var("text"), admin_reply_markup(var("user_id")))
+_static_message("admin_relay", var("text"), user_finish_markup())
+_static_message("admin_media_notice", "Адміністратор магазину надіслав медіа", user_finish_markup())
+
+_static_edit("admin_notice_edit", var("text"), admin_reply_markup(var("user_id")))
+_static_edit("welcome_edit", WELCOME_TEXT, main_menu_markup())
+_static_edit("order_instructions_edit", ORDER_INSTRUCTIONS_TEXT)
+for _key, _text in quick_answers.items():
+    _static_edit(_key, _text, quick_answers_markup())
+
 # ======= Хелпери для відправки повідомлень =======
+# Частини альбому чекають одна одну стільки секунд після останньої
+media_groups = MediaGroupBuffer(scheduler, window=env_float("MEDIA_GROUP_WINDOW", 1.0))
+
+def submit_call(chat_id, method, payload, callback=None, spoolable=False):
+    """Ставить виклик у чергу або в буфер відповіді на поточний вебхук"""
+    with span("outbound", method=method):
+        slot = inline_reply.current()
+        if slot is not None:
+            job = slot.capture(chat_id, method, payload, callback, spoolable)
+            if job is not None:
+                return job
+        return outbound.submit(chat_id, method, payload, callback, spoolable)
+
+def send_static(name, chat_id, callback=None, spoolable=False, **values):
+    """Ставить у чергу готовий шаблон, підставивши chat_id та інші змінні"""
+    template = payload_cache[name]
+    return submit_call(chat_id, template.method, template.render(chat_id=chat_id, **values), callback, spoolable)
+
 def send_message(chat_id, text, reply_markup=None, parse_mode=None):
-    url = f"https://api.telegram.org/bot{TOKEN}/sendMessage"
+    """Ставить sendMessage у чергу відправки і повертає OutboundJob"""
     payload = {"chat_id": chat_id, "text": text}
     if reply_markup is not None:
-        payload["reply_markup"] = json.dumps(reply_markup)
+        payload["reply_markup"] = reply_markup
     if parse_mode is not None:
         payload["parse_mode"] = parse_mode
-    try:
-        resp = requests.post(url, json=payload, timeout=8)
-        resp.raise_for_status()
-        return resp. json()
-    except Exception as e:
-        logger.error(f"Failed to send message to {chat_id}: {e}")
-        return None
+    return submit_call(chat_id, "sendMessage", payload)
 
 def edit_message(chat_id, message_id, text, reply_markup=None, parse_mode="HTML"):
     """Редактирует сообщение (для кнопок)"""
-    url = f"https://api.telegram.org/bot{TOKEN}/editMessageText"
     payload = {
         "chat_id": chat_id,
         "message_id": message_id,
@@ -352,47 +577,41 @@ def edit_message(chat_id, message_id, text, reply_markup=None, parse_mode="HTML"
         "parse_mode": parse_mode
     }
     if reply_markup is not None:  
-        payload["reply_markup"] = json.dumps(reply_markup)
-    try:
-        resp = requests.post(url, json=payload, timeout=8)
-        resp.raise_for_status()
-        return resp.json()
-    except Exception as e:  
-        logger.error(f"Failed to edit message:   {e}")
-        return None
-
-def send_media(chat_id, msg):
-    try:
-        for key, api in [
-            ("photo", "sendPhoto"),
-            ("document", "sendDocument"),
-            ("video", "sendVideo"),
-            ("audio", "sendAudio"),
-            ("voice", "sendVoice"),
-        ]:
-            if key in msg:
-                file_id = msg[key][-1]["file_id"] if key == "photo" else msg[key]["file_id"]
-                url = f"https://api.telegram.org/bot{TOKEN}/{api}"
-                payload = {"chat_id": chat_id, key: file_id}
-                if "caption" in msg:
-                    payload["caption"] = msg. get("caption")
-                try:
-                    resp = requests.post(url, json=payload, timeout=8)
-                    resp.raise_for_status()
-                    return True
-                except Exception as e:  
-                    logger.error(f"Failed to send media to {chat_id}: {e}")
-                    return False
-    except Exception as e:
-        logger.error(f"Error in send_media: {e}")
-    return False
-
-def format_order(order_data):
-    """Форматирование данных заказа"""
-    parts = []
-    for key, value in order_data.items():
-        parts.append(f"<b>{key}:</b> {value}")
-    return "\n".join(parts)
+        payload["reply_markup"] = reply_markup
+    return submit_call(chat_id, "editMessageText", payload)
+
+def answer_callback(query):
+    """Прибирає «годинник» на натиснутій inline-кнопці"""
+    return submit_call(f"cbq:{query.id}", "answerCallbackQuery", {"callback_query_id": query.id})
+
+def copy_message(chat_id, msg):
+    """Копіює будь-яке повідомлення (фото, стікер, відеокружок, підпис...) без позначки пересилання"""
+    payload = {"chat_id": chat_id, "from_chat_id": msg["chat"]["id"], "message_id": msg["message_id"]}
+    return submit_call(chat_id, "copyMessage", payload)
+
+def send_album(chat_id, messages):
+    """Відправляє частини альбому одним sendMediaGroup"""
+    messages = sorted(messages, key=lambda x: x["message_id"])
+    media = [input_media(x) for x in messages]
+    if len(media) < 2 or None in media:
+        for msg in messages:
+            copy_message(chat_id, msg)
+        return
+    submit_call(chat_id, "sendMediaGroup", {"chat_id": chat_id, "media": media})
+
+def relay_media(chat_id, msg, notify):
+    """Копіює медіа адресату і один раз викликає notify(кількість); альбом збирається цілим"""
+    group_id = msg.get("media_group_id")
+    if group_id is None:
+        copy_message(chat_id, msg)
+        notify(1)
+        return
+
+    def flush(messages):
+        send_album(chat_id, messages)
+        notify(len(messages))
+
+    media_groups.add((group_id, chat_id), msg, flush, source=msg["chat"]["id"])
 
 def format_phone(phone_number):
     """Форматирует номер телефона для отображения"""
@@ -400,312 +619,925 @@ def format_phone(phone_number):
         return phone_number
     return f"+{phone_number}"
 
-# ======= Обработка команд в отдельном потоке =======
-def handle_command(command, chat_id, msg, user_id):
+# ======= Оператори =======
+# OPERATOR_IDS через кому; за замовчуванням єдиний оператор - ADMIN_ID
+OPERATOR_IDS = [int(x) for x in os.getenv("OPERATOR_IDS", "").replace(",", " ").split()
+                if x.lstrip("-").isdigit()] or [ADMIN_ID]
+
+def announce_assignment(client_id, operator_id):
+    if client_id in digest_clients:
+        # Про звернення поза робочим часом адмін уже дізнався з дайджесту
+        if support_desk.target_of(operator_id) == client_id:
+            announce_focus(operator_id, client_id)
+        send_static("chat_start", client_id)
+        return
+    notif = (
+        f"<b>НОВИЙ ЗАПИТ ВІД КЛІЄНТА</b>\n\n"
+        f"User ID: <code>{client_id}</code>\n"
+        f"Час:    {datetime.now().strftime('%H:%M:%S')}"
+    )
+    send_static("admin_notice", operator_id, text=notif, user_id=client_id)
+    if support_desk.target_of(operator_id) == client_id:
+        announce_focus(operator_id, client_id)
+    send_static("chat_start", client_id)
+
+def announce_focus(operator_id, client_id):
+    send_message(operator_id, f"Спілкуєтесь з клієнтом {client_id}\nТип 'завершити' для закриття", parse_mode="HTML", reply_markup=admin_chat_markup())
+
+# Маршрути клієнт ↔ оператор живуть у пам'яті процесу, тому бот працює одним процесом:
+# з кількома воркерами відповідь оператора потрапила б до воркера без маршруту
+support_desk = SupportDesk(
+    OPERATOR_IDS,
+    max_chats=env_int("OPERATOR_MAX_CHATS", 3),
+    sessions=active_chats,
+    focus=admin_targets,
+    on_assign=announce_assignment,
+    # Звернення в черзі чекають довше за CHAT_SESSION_TTL - до відкриття після вихідних
+    queue_ttl=env_int("DESK_QUEUE_TTL", 72 * 3600),
+)
+if not is_working_hours():
+    support_desk.pause()
+support_desk.restore()
+session_sweeper.register("support_desk", support_desk, CHAT_SESSION_TTL)
+
+# ======= Поза робочим часом =======
+# Звернення чекають у черзі без сповіщень і приходять адміну одним дайджестом при відкритті
+digest_clients = set()
+DIGEST_MAX_BUTTONS = 20
+
+def deliver_off_hours_digest():
+    clients = support_desk.pending_clients()
+    if clients:
+        lines = "\n".join(f"• <code>{c}</code>" for c in clients)
+        buttons = [[{"text": f"✉️ {c}", "callback_data": f"reply_{c}"}] for c in clients[:DIGEST_MAX_BUTTONS]]
+        send_message(ADMIN_ID, f"<b>Запити поза робочим часом ({len(clients)})</b>\n\n{lines}",
+                     reply_markup={"inline_keyboard": buttons}, parse_mode="HTML")
+    digest_clients.update(clients)
     try:
-        logger.info(f"[THREAD] Команда: {command} від {chat_id}")
-        if chat_id == ADMIN_ID and command == "/help":
-            send_message(chat_id, WELCOME_TEXT, parse_mode="HTML")
-        elif command. startswith("/start") or command == "🏠 Меню":
-            active_chats. pop(user_id, None)
-            admin_targets.pop(ADMIN_ID, None)
-            user_orders.pop(user_id, None)
-            user_phone.pop(user_id, None)
-            send_message(chat_id, WELCOME_TEXT, reply_markup=main_menu_markup(), parse_mode="HTML")
-        elif command == "🛒 Замовити товар":
-            # Начало процесса заказа
-            user_orders[chat_id] = {"status": "waiting_link"}
-            send_message(chat_id, ORDER_INSTRUCTIONS_TEXT, parse_mode="HTML")
-        elif command == "❓ Швидкі відповіді":  
-            send_message(chat_id, QUICK_ANSWERS_TEXT, reply_markup=quick_answers_markup(), parse_mode="HTML")
-        elif command == "📌 Про нас":
-            send_message(chat_id, ABOUT_TEXT, reply_markup=main_menu_markup(), parse_mode="HTML")
-        elif command == "💬 Написати адміну":
-            if chat_id not in active_chats:
-                active_chats[chat_id] = "pending"
-                if not is_working_hours():
-                    send_message(chat_id, OFF_HOURS_TEXT, reply_markup=user_finish_markup(), parse_mode="HTML")
-                else:  
-                    send_message(chat_id, "Адміністратор прочитає ваше повідомлення найближчим часом..  .", reply_markup=user_finish_markup(), parse_mode="HTML")
-                notif = (
-                    f"<b>НОВИЙ ЗАПИТ ВІД КЛІЄНТА</b>\n\n"
-                    f"User ID: <code>{chat_id}</code>\n"
-                    f"Час:    {datetime.now().strftime('%H:%M:%S')}"
-                )
-                send_message(ADMIN_ID, notif, parse_mode="HTML", reply_markup=admin_reply_markup(chat_id))
-                if any(k in msg for k in ("photo", "document", "video", "audio", "voice")):
-                    send_media(ADMIN_ID, msg)
-            else:
-                if not is_working_hours():
-                    send_message(chat_id, OFF_HOURS_TEXT, reply_markup=user_finish_markup(), parse_mode="HTML")
-                else:
-                    send_message(chat_id, "Ваше повідомлення вже відправлено.    Очікуйте..  .", reply_markup=user_finish_markup(), parse_mode="HTML")
-        elif command == "✓ Завершити" and chat_id in active_chats:
-            active_chats.pop(chat_id, None)
-            if admin_targets.get(ADMIN_ID) == chat_id:
-                admin_targets.pop(ADMIN_ID, None)
-            send_message(chat_id, CHAT_CLOSED_TEXT, reply_markup=main_menu_markup(), parse_mode="HTML")
-            send_message(ADMIN_ID, f"Клієнт завершив чат", parse_mode="HTML")
-            log_admin_communication("user", chat_id, "Чат завершен клієнтом")
-        elif command == "✓ Завершити чат" and chat_id == ADMIN_ID:
-            target = admin_targets.get(ADMIN_ID)
-            if target:
-                active_chats.pop(target, None)
-                admin_targets.pop(ADMIN_ID, None)
-                send_message(target, CHAT_CLOSED_TEXT, reply_markup=main_menu_markup(), parse_mode="HTML")
-                send_message(ADMIN_ID, f"Чат закритий", parse_mode="HTML")
-                send_message(ADMIN_ID, WELCOME_TEXT, reply_markup=main_menu_markup(), parse_mode="HTML")
-                log_admin_communication("admin", target, "Чат завершен админом")
-            else:
-                send_message(ADMIN_ID, "Немає активного чату для закриття", parse_mode="HTML")
-        elif command == "🏠 До меню" and chat_id == ADMIN_ID:
-            target = admin_targets.get(ADMIN_ID)
-            if target:
-                active_chats. pop(target, None)
-                admin_targets.pop(ADMIN_ID, None)
-            send_message(ADMIN_ID, WELCOME_TEXT, reply_markup=main_menu_markup(), parse_mode="HTML")
+        support_desk.resume()
+    finally:
+        digest_clients.clear()
+
+def on_work_hours_change():
+    """Перемикає чергу звернень на межі робочого часу і планує наступну межу"""
+    if work_calendar.is_open():
+        if support_desk.paused:
+            logger.info("[WORK HOURS] Магазин відкрито")
+            deliver_off_hours_digest()
+    elif not support_desk.paused:
+        logger.info("[WORK HOURS] Магазин зачинено")
+        support_desk.pause()
+    delay = work_calendar.next_transition() - time.time() + 0.5
+    scheduler.call_later(max(delay, 1), on_work_hours_change, name="work-hours")
+
+on_work_hours_change()
+
+# ======= Розсилка =======
+# Усі, хто натискав /start; темп нижчий за глобальний ліміт, щоб лишався запас для відповідей
+subscribers = ChatRegistry(state_store, "subscribers")
+subscribers.load()
+
+# ======= Каталог =======
+# Пости каналу (бот має бути його адміністратором) → товари для замовлень
+catalog = Catalog(os.getenv("CATALOG_CHANNEL", "elfbar202405"), state_store)
+catalog.load()
+
+def product_line(order):
+    return f"<b>Товар:</b> {escape(order.product)}\n" if order.product else ""
+
+def report_broadcast(job):
+    send_message(ADMIN_ID, format_broadcast(job), parse_mode="HTML")
+
+def format_broadcast(job):
+    s = job.summary()
+    return (
+        f"<b>Розсилка {job.job_id}</b>: {s['state']}\n"
+        f"Надіслано: {s['sent']} / {s['total']}\n"
+        f"Заблокували бота: {s['blocked']}\n"
+        f"Помилки: {s['failed']}\n"
+        f"В черзі: {s['pending']}"
+    )
+
+broadcaster = Broadcaster(
+    outbound,
+    subscribers,
+    jobs=session_mapping("broadcast_jobs"),
+    recipients=session_mapping("broadcast_recipients"),
+    rate=env_float("BROADCAST_RATE", 20),
+    window=env_int("BROADCAST_WINDOW", 50),
+    on_finish=report_broadcast,
+)
+
+# ======= Маршрути =======
+router = Router()
+DELIVERY_OPTIONS = {
+    "ukrposhta": "🏤 Укрпошта (2-5 днів)",
+    "novaposhta": "📦 Нова Пошта (1-2 дні)",
+    "meest":   "📦 Meest Express (1-2 дні)",
+    "pickup":  "🚗 Самовивіз Київ"
+}
+
+def parse_user_id(query):
+    """user_id з callback_data на кшталт reply_<id>; None, якщо не число"""
+    try:
+        return int(query.arg)
+    except ValueError:
+        logger.error(f"Error parsing user_id:   {query.data}")
+        return None
+
+# ======= Команди та кнопки меню =======
+@router.command("/help")
+def on_help(m):
+    if support_desk.is_operator(m.chat_id):
+        send_static("welcome_plain", m.chat_id)
+    else:
+        send_static("unknown_command", m.chat_id)
+
+@router.command("/start")
+@router.label("🏠 Меню")
+def on_start(m):
+    subscribers.add(m.chat_id)
+    if support_desk.is_operator(m.user_id):
+        support_desk.unfocus(m.user_id)
+    else:
+        support_desk.close(m.user_id)
+    user_orders.pop(m.user_id, None)
+    user_phone.pop(m.user_id, None)
+    send_static("welcome", m.chat_id)
+
+@router.label("🛒 Замовити товар")
+def on_order(m):
+    # Начало процесса заказа
+    user_orders[m.chat_id] = OrderSession(OrderStatus.WAITING_LINK)
+    send_static("order_instructions", m.chat_id)
+
+@router.label("❓ Швидкі відповіді")
+def on_quick_answers(m):
+    send_static("quick_answers", m.chat_id)
+
+@router.label("📌 Про нас")
+def on_about(m):
+    send_static("about", m.chat_id)
+
+@router.label("💬 Написати адміну")
+def on_contact_admin(m):
+    chat_id = m.chat_id
+    if support_desk.request(chat_id):
+        if not is_working_hours():
+            send_static("off_hours", chat_id)
+        elif support_desk.operator_of(chat_id) is None:
+            send_static("admin_pending", chat_id)
+    else:
+        if not is_working_hours():
+            send_static("off_hours", chat_id)
         else:
-            send_message(chat_id, "Команда не розпізнана.    Виберіть опцію з меню.", reply_markup=main_menu_markup(), parse_mode="HTML")
-    except Exception as e:  
-        logger.error(f"[THREAD ERROR] {e}", exc_info=True)
+            send_static("already_sent", chat_id)
+
+@router.label("✓ Завершити")
+def on_user_finish(m):
+    chat_id = m.chat_id
+    if chat_id not in support_desk:
+        send_static("unknown_command", chat_id)
+        return
+    operator_id = support_desk.close(chat_id)
+    send_static("chat_closed", chat_id)
+    if operator_id is not None:
+        send_message(operator_id, f"Клієнт {chat_id} завершив чат", parse_mode="HTML")
+    log_admin_communication("user", chat_id, "Чат завершен клієнтом")
+
+@router.label("✓ Завершити чат")
+def on_admin_finish(m):
+    if not support_desk.is_operator(m.chat_id):
+        send_static("unknown_command", m.chat_id)
+        return
+    target = support_desk.target_of(m.chat_id)
+    if target:
+        support_desk.close(target)
+        send_static("chat_closed", target)
+        send_message(m.chat_id, f"Чат закритий", parse_mode="HTML")
+        send_static("welcome", m.chat_id)
+        log_admin_communication("admin", target, "Чат завершен админом")
+    else:
+        send_message(m.chat_id, "Немає активного чату для закриття", parse_mode="HTML")
+
+@router.label("🏠 До меню")
+def on_admin_menu(m):
+    if not support_desk.is_operator(m.chat_id):
+        send_static("unknown_command", m.chat_id)
+        return
+    target = support_desk.target_of(m.chat_id)
+    if target:
+        support_desk.close(target)
+    send_static("welcome", m.chat_id)
+
+# ======= Розсилка (лише ADMIN_ID) =======
+@router.command("/broadcast")
+def on_broadcast(m):
+    """/broadcast у відповідь на повідомлення копіює його всім; /broadcast <текст> - надсилає текст"""
+    if m.chat_id != ADMIN_ID:
+        send_static("unknown_command", m.chat_id)
+        return
+    source = m.raw.get("reply_to_message")
+    text = m.text.partition(" ")[2].strip()
+    if source is not None:
+        job = broadcaster.start_job("copyMessage", {"from_chat_id": m.chat_id, "message_id": source["message_id"]})
+    elif text:
+        job = broadcaster.start_job("sendMessage", {"text": text, "parse_mode": "HTML"})
+    else:
+        send_message(m.chat_id, "Надішліть /broadcast у відповідь на повідомлення або /broadcast <текст>")
+        return
+    if job is None:
+        send_message(m.chat_id, "Попередня розсилка ще триває: /broadcast_status, /broadcast_stop")
+        return
+    send_message(m.chat_id, f"Розсилка {job.job_id} запущена: {job.total} отримувачів")
+
+@router.command("/broadcast_status")
+def on_broadcast_status(m):
+    if m.chat_id != ADMIN_ID:
+        send_static("unknown_command", m.chat_id)
+        return
+    job = broadcaster.current
+    send_message(m.chat_id, format_broadcast(job) if job else "Розсилок ще не було", parse_mode="HTML")
+
+@router.command("/broadcast_stop")
+def on_broadcast_stop(m):
+    if m.chat_id != ADMIN_ID:
+        send_static("unknown_command", m.chat_id)
+        return
+    stopped = broadcaster.cancel()
+    send_message(m.chat_id, "Розсилку скасовано" if stopped else "Немає активної розсилки")
+
+@router.command("/broadcast_resume")
+def on_broadcast_resume(m):
+    """Продовжує розсилку, перервану перезапуском (в режимі gunicorn вона не стартує сама)"""
+    if m.chat_id != ADMIN_ID:
+        send_static("unknown_command", m.chat_id)
+        return
+    job = broadcaster.resume()
+    send_message(m.chat_id, f"Розсилка {job.job_id} продовжена з {job.cursor}/{job.total}" if job else "Немає перерваної розсилки")
+
+# ======= Логи (лише ADMIN_ID) =======
+@router.command("/log")
+def on_log(m):
+    """/log - поточні налаштування; /log <КАТЕГОРІЯ> <РІВЕНЬ|частка 0..1>"""
+    if m.chat_id != ADMIN_ID:
+        send_static("unknown_command", m.chat_id)
+        return
+    args = m.text.split()[1:]
+    try:
+        if len(args) == 2:
+            category, value = args[0].upper(), args[1]
+            if value.replace(".", "", 1).isdigit():
+                log_pipeline.set_sample(category, value)
+            else:
+                log_pipeline.set_level(category, value)
+        elif args:
+            raise ValueError("Формат: /log WEBHOOK WARNING або /log WEBHOOK 0.1")
+    except ValueError as e:
+        send_message(m.chat_id, str(e))
+        return
+    send_message(m.chat_id, json.dumps(log_pipeline.settings(), ensure_ascii=False))
+
+# ======= Історія листування (оператори) =======
+HISTORY_MAX_PAGE = 50
+HISTORY_TEXT_LIMIT = 300
+
+def format_history(user_id, limit, offset):
+    """Текст сторінки історії і клавіатура для гортання"""
+    total = chat_history.count(user_id)
+    rows = chat_history.last(user_id, limit, offset)
+    if not rows:
+        return f"Історії для {user_id} немає", None
+    first = max(total - offset - len(rows), 0) + 1
+    lines = [f"<b>Історія {user_id}</b> ({first}-{first + len(rows) - 1} з {total})\n"]
+    for ts, sender, text in rows:
+        if len(text) > HISTORY_TEXT_LIMIT:
+            text = text[:HISTORY_TEXT_LIMIT] + "…"
+        who = "🛠" if sender == "admin" else "👤"
+        lines.append(f"<code>{ts}</code> {who} {escape(text)}")
+    body = "\n".join(lines)
+    if len(body) > 4000:
+        body = body[:4000] + "…"
+    nav = []
+    if offset + limit < total:
+        nav.append({"text": "◀ Раніше", "callback_data": f"hist_{user_id}_{offset + limit}_{limit}"})
+    if offset > 0:
+        nav.append({"text": "Пізніше ▶", "callback_data": f"hist_{user_id}_{max(offset - limit, 0)}_{limit}"})
+    return body, {"inline_keyboard": [nav]} if nav else None
+
+@router.command("/history")
+def on_history(m):
+    """/history <user_id> [n] - останні n повідомлень клієнта"""
+    if not support_desk.is_operator(m.chat_id):
+        send_static("unknown_command", m.chat_id)
+        return
+    args = m.text.split()[1:]
+    try:
+        user_id = int(args[0])
+        limit = int(args[1]) if len(args) > 1 else 10
+    except (IndexError, ValueError):
+        send_message(m.chat_id, "Формат: /history <user_id> [кількість]")
+        return
+    text, markup = format_history(user_id, min(max(limit, 1), HISTORY_MAX_PAGE), 0)
+    send_message(m.chat_id, text, reply_markup=markup, parse_mode="HTML")
+
+@router.callback_prefix("hist_")
+def on_history_page(q):
+    if not support_desk.is_operator(q.from_id):
+        return
+    try:
+        user_id, offset, limit = (int(x) for x in q.arg.split("_"))
+    except ValueError:
+        return
+    text, markup = format_history(user_id, min(max(limit, 1), HISTORY_MAX_PAGE), max(offset, 0))
+    edit_message(q.chat_id, q.message_id, text, reply_markup=markup)
+
+# ======= Стани замовлення =======
+@router.state(OrderStatus.WAITING_PHONE)
+def on_phone(m, order):
+    # ===== ОБРАБОТКА КОНТАКТА =====
+    contact = m.raw.get("contact")
+    if not contact:
+        return False
+    order.phone = format_phone(contact.get("phone_number", ""))
+    order.username = m.raw.get("from", {}).get("username", "не вказано")
+    order.status = OrderStatus.WAITING_CONFIRMATION
+    user_orders[m.chat_id] = order
+
+    # Показываем подтверждение заказа
+    order_summary = (
+        f"<b>📦 ПІДТВЕРДЖЕННЯ ЗАМОВЛЕННЯ</b>\n\n"
+        f"<b>Посилання:   </b> {order.link or 'не вказано'}\n"
+        f"{product_line(order)}"
+        f"<b>Спосіб доставки: </b> {order.delivery or 'не вказано'}\n"
+        f"<b>Номер телефону:</b> {order.phone or 'не вказано'}\n"
+        f"<b>Ім'я користувача:</b> @{order.username}\n\n"
+        f"<b>Все вірно?  Натисніть 'Підтвердити' для відправки замовлення адміну.</b>"
+    )
+
+    send_message(m.chat_id, order_summary, reply_markup={
+        "inline_keyboard":  [
+            [{"text": "✅ Підтвердити замовлення", "callback_data": f"confirm_order_{m.chat_id}"}],
+            [{"text": "❌ Скасувати", "callback_data": "back_to_menu"}],
+        ]
+    }, parse_mode="HTML")
+
+@router.state(OrderStatus.WAITING_LINK)
+def on_link(m, order):
+    # Ожидание ссылки на товар ИЛИ названия товара
+    if m.command:
+        # Принимаем ЛЮБой текст как товар (ссылка или название)
+        order.link = m.text
+        product = catalog.lookup(m.text)
+        order.product = product.summary() if product else None
+        order.status = OrderStatus.WAITING_DELIVERY
+        user_orders[m.chat_id] = order
+        # Показываем выбор доставки
+        send_static("choose_delivery", m.chat_id)
+    else:
+        send_static("empty_link", m.chat_id)
+
+# ======= Inline-кнопки =======
+@router.callback_prefix("qa_")
+def on_quick_answer(q):
+    if q.data in quick_answers:
+        send_static(q.data, q.chat_id, message_id=q.message_id)
+
+@router.callback("back_to_menu")
+def on_back_to_menu(q):
+    send_static("welcome_edit", q.chat_id, message_id=q.message_id)
+    user_orders.pop(q.chat_id, None)
+    user_phone. pop(q.chat_id, None)
+
+@router.callback("back_to_link")
+def on_back_to_link(q):
+    # Back to link selection (after choosing delivery)
+    send_static("order_instructions_edit", q.chat_id, message_id=q.message_id)
+
+@router.callback_prefix("delivery_")
+def on_delivery(q):
+    order = user_orders.get(q.chat_id)
+    if order is None:
+        return
+    order.delivery = DELIVERY_OPTIONS.get(q.arg, q.arg)
+
+    # Запрашиваем номер телефону через Telegram контакт
+    order.status = OrderStatus.WAITING_PHONE
+    user_orders[q.chat_id] = order
+    send_static("phone_request", q.chat_id)
+
+@router.callback_prefix("confirm_order_")
+def on_confirm_order(q):
+    user_id = parse_user_id(q)
+    if user_id is None:
+        return
+    order = user_orders.get(user_id)
+    if order is None:
+        return
+    if not claim_once(f"confirm:{order.order_id}"):
+        logger.warning(f"[DEDUP] Замовлення {order.order_id} вже підтверджене")
+        return
+
+    # Отправляем админу с пометкой ЗАКАЗА
+    admin_notification = (
+        f"<b>🛒 НОВЕ ЗАМОВЛЕННЯ</b>\n\n"
+        f"<b>Посилання на товар:</b> {order.link or 'не вказано'}\n"
+        f"{product_line(order)}"
+        f"<b>Ім'я користувача:</b> @{order.username or 'не вказано'}\n"
+        f"<b>Номер телефону:</b> {order.phone or 'не вказано'}\n"
+        f"<b>Спосіб доставки:</b> {order.delivery or 'не вказано'}\n\n"
+        f"<b>User ID:</b> <code>{user_id}</code>\n"
+        f"<b>Час:</b> {datetime.now().strftime('%H:%M:%S')}"
+    )
+    send_static("admin_notice", ADMIN_ID, text=admin_notification, user_id=user_id)
+
+    # Подтверждение клиенту
+    send_message(user_id, (
+        f"<b>✅ Замовлення прийнято!</b>\n\n"
+        f"Ваші дані відправлені адміністратору.\n"
+        f"Очікуйте дзвінку на номер:    <code>{order.phone or 'не вказано'}</code>\n\n"
+        f"Дякуємо за замовлення!    🙏"
+    ), reply_markup=main_menu_markup(), parse_mode="HTML")
+
+    log_admin_communication("user", user_id, f"Заказ:    {order.link}")
+
+    # Очистка данных заказа
+    user_orders. pop(user_id, None)
+    user_phone.pop(user_id, None)
+
+@router.callback_prefix("reply_")
+def on_admin_reply(q):
+    if not support_desk.is_operator(q.from_id):
+        return
+    user_id = parse_user_id(q)
+    if user_id is None:
+        return
+    # Клієнт з черги стає чатом цього оператора, свій - просто отримує фокус
+    was_pending = support_desk.operator_of(user_id) is None
+    if not support_desk.focus(q.from_id, user_id):
+        send_message(q.from_id, f"Клієнт {user_id} вже спілкується з іншим оператором", parse_mode="HTML")
+        return
+    edit_message(q.chat_id, q.message_id, q.message.get("text", ""), reply_markup=None)
+    announce_focus(q.from_id, user_id)
+    if was_pending:
+        send_static("chat_start", user_id)
+
+@router.callback_prefix("close_")
+def on_admin_close(q):
+    if not support_desk.is_operator(q.from_id):
+        return
+    user_id = parse_user_id(q)
+    if user_id is None:
+        return
+    if support_desk.operator_of(user_id) not in (None, q.from_id):
+        return
+    support_desk.close(user_id)
+    send_static("chat_closed", user_id)
+    send_message(q.from_id, ADMIN_CHAT_CLOSED_TEXT % user_id, parse_mode="HTML")
+    send_static("welcome", q.from_id)
+    log_admin_communication("admin", user_id, "Чат завершен админом (по кнопке)")
+
+# ======= Пересилання в активному чаті =======
+# Серія текстів клієнта - одне сповіщення оператору, яке дописується через editMessageText.
+# Під час збою сповіщення стають у журнал недоставлених слідом за іншими повідомленнями оператору
+def _send_client_notice(key, text, callback):
+    operator_id, client_id = key
+    return send_static("admin_notice", operator_id, callback, spoolable=True, text=text, user_id=client_id)
+
+def _edit_client_notice(key, message_id, text, callback):
+    operator_id, client_id = key
+    return send_static("admin_notice_edit", operator_id, callback, spoolable=True,
+                       message_id=message_id, text=text, user_id=client_id)
+
+client_notices = NoticeCoalescer(
+    _send_client_notice,
+    _edit_client_notice,
+    window=env_float("NOTICE_COALESCE_WINDOW", 5.0),
+)
+
+def notify_client_media(operator_id, chat_id, count):
+    client_notices.reset((operator_id, chat_id))
+    if count == 1:
+        send_static("admin_notice", operator_id, text=f"Медіа від клієнта {chat_id}", user_id=chat_id)
+        log_admin_communication("user", chat_id, "[Медіа]")
+    else:
+        send_static("admin_notice", operator_id, text=f"Альбом ({count}) від клієнта {chat_id}", user_id=chat_id)
+        log_admin_communication("user", chat_id, f"[Альбом: {count}]")
+
+def notify_operator_media(target, count):
+    send_static("admin_media_notice", target)
+    log_admin_communication("admin", target, "[Медіа]" if count == 1 else f"[Альбом: {count}]")
+
+def relay_message(m):
+    chat_id = m.chat_id
+    if not claim_once(f"relay:{chat_id}:{m.raw.get('message_id')}"):
+        return
+    if m.raw.get("media_group_id") is None:
+        # Альбом, надісланий перед цим повідомленням, має дійти до адресата раніше
+        media_groups.flush_source(chat_id)
+    # Если есть активный чат с оператором
+    operator_id = support_desk.operator_of(chat_id)
+    if operator_id is not None and not support_desk.is_operator(m.user_id):
+        if "text" not in m.raw:
+            relay_media(operator_id, m.raw, partial(notify_client_media, operator_id, chat_id))
+        elif m.text:  
+            client_notices.add((operator_id, chat_id), f"<b>Клієнт {chat_id}:</b>", m.text)
+            log_admin_communication("user", chat_id, m.text)
+        return
+
+    # Если это сообщение от оператора
+    if support_desk.is_operator(chat_id):
+        target = support_desk.target_of(chat_id)
+        if target: 
+            # Відповідь оператора розриває серію: нові тексти клієнта підуть окремим сповіщенням
+            client_notices.reset((chat_id, target))
+            if "text" not in m.raw:
+                relay_media(target, m.raw, partial(notify_operator_media, target))
+            elif m.text:
+                send_static("admin_relay", target, text=m.text)
+                log_admin_communication("admin", target, m.text)
+
+# ======= Обробка оновлень =======
+def update_chat_id(update):
+    """chat_id, в межах якого оновлення обробляються строго по черзі"""
+    if "callback_query" in update:
+        cb = update["callback_query"]
+        return (cb.get("message") or {}).get("chat", {}).get("id") or cb["from"]["id"]
+    msg = update.get("message") or update.get("channel_post") or update.get("edited_channel_post")
+    return (msg or {}).get("chat", {}).get("id")
+
+def inline_targets(update):
+    """Адресати, яким відповідь можна віддати в тілі вебхука: сам чат і callback query"""
+    targets = [update_chat_id(update)]
+    if "callback_query" in update:
+        targets.append(f"cbq:{update['callback_query'].get('id')}")
+    return targets
+
+def handle_message(msg):
+    m = Message(msg)
+    logger.debug(f"[WEBHOOK] chat_id={m.chat_id}, {len(m.text)} символів")
+
+    with span("load_order"):
+        order = user_orders.get(m.chat_id)
+    with span("route"):
+        if order is not None and router.dispatch_state(order.status, m, order):
+            return
+        if router.dispatch_text(m):
+            logger.info(f"[WEBHOOK] Команда: {m.command}")
+            return
+    with span("relay"):
+        relay_message(m)
+
+def dispatch_update(update):
+    post = update.get("channel_post") or update.get("edited_channel_post")
+    if post is not None:
+        product = catalog.update(post)
+        if product is not None:
+            logger.info(f"[CATALOG] Пост {product.post_id}: {product.title}")
+        return
+    if "callback_query" in update:
+        query = CallbackQuery(update["callback_query"])
+        try:
+            with span("route"):
+                router.dispatch_callback(query)
+        finally:
+            answer_callback(query)
+        return
+    msg = update.get("message")
+    if not msg:
+        logger.warning("[WEBHOOK] Немає message")
+        return
+    handle_message(msg)
+
+def process_polled_update(update):
+    if not update_is_duplicate(update):
+        process_update(update, trace=tracer.start("update"))
+
+def process_update(update, slot=None, trace=None):
+    started = time.perf_counter()
+    kind = next((k for k in ("callback_query", "channel_post", "edited_channel_post") if k in update), "message")
+    if slot is not None:
+        slot.activate()
+    if trace is not None:
+        trace.root.attrs["id"] = update.get("update_id")
+    try:
+        with correlation(update.get("update_id")), activate(trace), span("dispatch", kind=kind):
+            profiler.run(dispatch_update, update)
+    finally:
+        if slot is not None:
+            slot.finish()
+        update_seconds.labels(kind).observe(time.perf_counter() - started)
+        tracer.finish(trace)
 
 # ======= Webhook handler =======
 @app.route("/webhook", methods=["GET", "POST"])
 def webhook():
-    logger.info(f"[WEBHOOK] {request.method}")
-
     if request.method == "GET":
         return "OK", 200
 
-    if request.method == "POST":  
-        try:
-            update = request.get_json(force=True)
-            logger.info(f"[WEBHOOK] Update отримано")
-
-            # callback_query handling
-            if "callback_query" in update:  
-                cb = update["callback_query"]
-                data = cb. get("data", "")
-                from_id = cb["from"]["id"]
-                message = cb. get("message") or {}
-                chat_id = message.get("chat", {}).get("id")
-                message_id = message.get("message_id")
-
-                # Quick answers
-                if data in quick_answers:
-                    edit_message(chat_id, message_id, quick_answers[data], reply_markup=quick_answers_markup(), parse_mode="HTML")
-                    return "ok", 200
-
-                # Back to menu
-                if data == "back_to_menu":
-                    edit_message(chat_id, message_id, WELCOME_TEXT, reply_markup=main_menu_markup(), parse_mode="HTML")
-                    user_orders.pop(chat_id, None)
-                    user_phone. pop(chat_id, None)
+    try:
+        trace = tracer.start("update")
+        with activate(trace):
+            with span("parse"):
+                update = request.get_json(force=True)
+            logger.debug(f"[WEBHOOK] Update {update.get('update_id')} отримано")
+            with span("dedup"):
+                if update_is_duplicate(update):
                     return "ok", 200
+            slot = InlineReply(outbound, inline_targets(update)) if WEBHOOK_INLINE_REPLY else None
+            with span("enqueue"):
+                accepted = update_executor.submit(update_chat_id(update), process_update, update, slot, trace)
+        if not accepted:
+            release_update(update)
+            return "busy", 503
+        if slot is not None:
+            body = slot.wait(WEBHOOK_INLINE_WAIT)
+            if body is not None:
+                return Response(body, status=200, mimetype="application/json")
+        return "ok", 200
+    except Exception as e:
+        logger.error(f"[WEBHOOK ERROR] {e}", exc_info=True)
+        return "error", 500
+
+# ======= Зупинка =======
+def shutdown():
+    """Зупиняє фонові підсистеми, дочікуючись скидання черг"""
+    stop_idle_mode()
+    scheduler.stop()
+    update_executor.stop()
+    broadcaster.stop()
+    media_groups.stop()
+    outbound.stop()
+    outbound_spool.close()
+    admin_log.stop()
+    chat_history.close()
+    profiler.flush()
+    state_store.stop()
+    log_pipeline.stop()
+
+atexit.register(shutdown)
 
-                # Back to link selection (after choosing delivery)
-                if data == "back_to_link":
-                    edit_message(chat_id, message_id, ORDER_INSTRUCTIONS_TEXT, parse_mode="HTML")
-                    return "ok", 200
+@app.route("/", methods=["GET"])
+def index():
+    return "✅ Магазин запущен", 200
 
-                # ===== ДОСТАВКА =====
-                if data. startswith("delivery_"):
-                    delivery = data.split("_")[1]
-                    delivery_map = {
-                        "ukrposhta": "🏤 Укрпошта (2-5 днів)",
-                        "novaposhta": "📦 Нова Пошта (1-2 дні)",
-                        "meest":   "📦 Meest Express (1-2 дні)",
-                        "pickup":  "🚗 Самовивіз Київ"
-                    }
-                    delivery_text = delivery_map.get(delivery, delivery)
-                    user_orders[chat_id]["доставка"] = delivery_text
-
-                    # Запрашиваем номер телефону через Telegram контакт
-                    user_orders[chat_id]["status"] = "waiting_phone"
-                    send_message(chat_id, "<b>☎️ Поділіться своїм номером телефону</b>\n\nНатисніть на кнопку нижче для автоматичного надсилання:", reply_markup=phone_request_markup(), parse_mode="HTML")
-                    return "ok", 200
+# ======= Метрики: HTTP і розміри стану =======
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        http_seconds.labels(route, request.method).observe(time.perf_counter() - started)
+    return response
+
+metrics.gauge("bot_active_chats", "Записи active_chats").set_function(lambda: len(active_chats))
+metrics.gauge("bot_user_orders", "Незавершені замовлення").set_function(lambda: len(user_orders))
+metrics.gauge("bot_threads", "Кількість потоків процесу").set_function(threading.active_count)
+metrics.gauge("bot_scheduler_pending", "Задачі в планувальнику").set_function(scheduler.pending)
+metrics.gauge("bot_scheduler_lag_seconds", "Запізнення останньої задачі планувальника").set_function(lambda: scheduler.last_lag)
+metrics.gauge("bot_scheduler_max_lag_seconds", "Найбільше запізнення задачі планувальника").set_function(lambda: scheduler.max_lag)
+metrics.gauge("bot_outbound_pending", "Виклики в черзі відправки").set_function(outbound.pending)
+metrics.gauge("bot_update_queue_pending", "Оновлення в черзі обробки").set_function(update_executor.pending)
+metrics.counter("bot_updates_rejected_total", "Оновлення, відхилені через переповнення").set_function(update_executor.rejected)
+metrics.counter("bot_client_notices_merged_total", "Тексти клієнтів, дописані в уже надіслане сповіщення").set_function(lambda: client_notices.merged)
+metrics.gauge("bot_outbound_spooled", "Недоставлені виклики в журналі").set_function(lambda: len(outbound_spool))
+metrics.gauge("bot_circuit_open", "Запобіжник Bot API розімкнено (1) чи ні (0)").set_function(lambda: int(breaker.state != "closed"))
+metrics.counter("bot_circuit_opens_total", "Скільки разів запобіжник розмикався").set_function(lambda: breaker.opens)
+metrics.counter("bot_route_hits_total", "Спрацювання маршрутів роутера", ("route",)).set_collector(
+    lambda: {(route,): hits for route, hits in router.hits().items()})
+sessions_gauge = metrics.gauge("bot_sessions", "Сесії в реєстрах прибирання", ("registry", "state"))
+sessions_gauge.set_collector(lambda: {
+    (name, state): counts[state]
+    for name, counts in session_sweeper.stats().items() for state in ("live", "cached")
+})
+metrics.counter("bot_sessions_evicted_total", "Сесії, витіснені з кешу за LRU", ("registry",)).set_collector(
+    lambda: {(name,): counts["evicted"] for name, counts in session_sweeper.stats().items()})
+metrics.counter("bot_sessions_expired_total", "Сесії, видалені після TTL", ("registry",)).set_collector(
+    lambda: {(name,): counts["expired"] for name, counts in session_sweeper.stats().items()})
+desk_gauge = metrics.gauge("bot_support_chats", "Звернення в службі підтримки", ("state",))
+desk_gauge.set_function(lambda: support_desk.stats()["active"], "active")
+desk_gauge.set_function(lambda: support_desk.stats()["pending"], "pending")
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# ======= Трасування і профілювання на льоту (лише з DEBUG_TOKEN) =======
+def debug_authorized(token):
+    return bool(DEBUG_TOKEN) and hmac.compare_digest((token or "").encode(), DEBUG_TOKEN.encode())
+
+def debug_settings():
+    return {
+        "trace_slow_ms": tracer.slow_seconds * 1000 if tracer.enabled else 0,
+        "slow_captured": tracer.captured,
+        "slow_recent": list(tracer.recent),
+        "profile": profiler.settings(),
+    }
 
-                # ===== ПІДТВЕРДЖЕННЯ ЗАМОВЛЕННЯ =====
-                if data.startswith("confirm_order_"):
-                    try:
-                        user_id = int(data.split("_", 2)[2])
-                    except Exception as e:
-                        logger.error(f"Error parsing user_id from confirm_order:    {e}")
-                        return "ok", 200
-                    
-                    if user_id in user_orders:    
-                        order = user_orders[user_id]
-                        
-                        # Отправляем админу с пометкой ЗАКАЗА
-                        admin_notification = (
-                            f"<b>🛒 НОВЕ ЗАМОВЛЕННЯ</b>\n\n"
-                            f"<b>Посилання на товар:</b> {order. get('посилання', 'не вказано')}\n"
-                            f"<b>Ім'я користувача:</b> @{order.get('username', 'не вказано')}\n"
-                            f"<b>Номер телефону:</b> {order. get('номер телефону', 'не вказано')}\n"
-                            f"<b>Спосіб доставки:</b> {order.get('доставка', 'не вказано')}\n\n"
-                            f"<b>User ID:</b> <code>{user_id}</code>\n"
-                            f"<b>Час:</b> {datetime.now().strftime('%H:%M:%S')}"
-                        )
-                        
-                        send_message(ADMIN_ID, admin_notification, parse_mode="HTML", reply_markup=admin_reply_markup(user_id))
-                        
-                        # Подтверждение клиенту
-                        send_message(user_id, (
-                            f"<b>✅ Замовлення прийнято!</b>\n\n"
-                            f"Ваші дані відправлені адміністратору.\n"
-                            f"Очікуйте дзвінку на номер:    <code>{order.get('номер телефону', 'не вказано')}</code>\n\n"
-                            f"Дякуємо за замовлення!    🙏"
-                        ), reply_markup=main_menu_markup(), parse_mode="HTML")
-                        
-                        # Логирование
-                        log_admin_communication("user", user_id, f"Заказ:    {order.get('посилання')}")
-                        
-                        # Очистка данных заказа
-                        user_orders. pop(user_id, None)
-                        user_phone.pop(user_id, None)
-                    
-                    return "ok", 200
+def apply_debug_settings(params):
+    """{"trace_slow_ms": 500, "profile_every": 100, "flush": true}; 0 вимикає"""
+    if "trace_slow_ms" in params:
+        slow_ms = float(params["trace_slow_ms"])
+        tracer.slow_seconds = slow_ms / 1000 if slow_ms > 0 else None
+    if "profile_every" in params:
+        profiler.every = max(0, int(params["profile_every"]))
+        if not profiler.every:
+            profiler.flush()
+    if params.get("flush"):
+        profiler.flush()
+
+@app.route("/debug/profiling", methods=["GET", "POST"])
+def debug_profiling():
+    if not debug_authorized(request.headers.get("X-Debug-Token")):
+        return "not found", 404
+    if request.method == "POST":
+        try:
+            apply_debug_settings(request.get_json(force=True) or {})
+        except (TypeError, ValueError) as e:
+            return str(e), 400
+    return Response(json.dumps(debug_settings(), ensure_ascii=False), mimetype="application/json")
+
+# ======= Long polling =======
+def run_polling():
+    """Режим без публічного URL: оновлення через getUpdates пачками"""
+    delete_webhook()
+    poller = LongPoller(
+        tg,
+        update_executor,
+        process_polled_update,
+        update_chat_id,
+        session_mapping("polling_offset"),
+        limit=env_int("POLLING_LIMIT", 100),
+        timeout=env_int("POLLING_TIMEOUT", 50),
+        allowed_updates=ALLOWED_UPDATES,
+    )
+
+    def on_signal(signum, frame):
+        # Heroku зупиняє dyno через SIGTERM; KeyboardInterrupt перериває довгий getUpdates.
+        # Повторний сигнал не має обірвати вже розпочату зупинку
+        if not poller.stopped:
+            poller.stop()
+            raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    try:
+        poller.run()
+    except KeyboardInterrupt:
+        logger.info("[POLLING] Зупинка за сигналом")
+    finally:
+        # Чекає на оновлення в обробці (їхній offset), скидає чергу відправки, лог і стан
+        shutdown()
 
-                # Admin reply
-                if data.startswith("reply_") and from_id == ADMIN_ID:   
-                    try:
-                        user_id = int(data. split("_", 1)[1])
-                    except Exception as e:
-                        logger.error(f"Error parsing user_id:   {e}")
-                        return "ok", 200
-                    active_chats[user_id] = "active"
-                    admin_targets[from_id] = user_id
-                    edit_message(chat_id, message_id, message. get("text", ""), reply_markup=None)
-                    send_message(from_id, f"Спілкуєтесь з клієнтом {user_id}\nТип 'завершити' для закриття", parse_mode="HTML", reply_markup=admin_chat_markup())
-                    send_message(user_id, CHAT_START_TEXT, reply_markup=user_finish_markup(), parse_mode="HTML")
-                    return "ok", 200
+def run_webhook_server():
+    register_webhook()
+    port = int(os.getenv("PORT", "5000"))
+    try:
+        app.run("0.0.0.0", port=port, threaded=True)
+    except Exception as e:
+        logger.error(f"Error running app: {e}")
+    finally:
+        shutdown()
+        delete_webhook()
 
-                # Admin close chat
-                if data.startswith("close_") and from_id == ADMIN_ID:
-                    try:  
-                        user_id = int(data.split("_", 1)[1])
-                    except Exception as e:
-                        logger.error(f"Error parsing user_id:  {e}")
-                        return "ok", 200
-                    active_chats.pop(user_id, None)
-                    if admin_targets.get(from_id) == user_id:
-                        admin_targets.pop(from_id, None)
-                    send_message(user_id, CHAT_CLOSED_TEXT, reply_markup=main_menu_markup(), parse_mode="HTML")
-                    send_message(from_id, ADMIN_CHAT_CLOSED_TEXT % user_id, parse_mode="HTML")
-                    send_message(from_id, WELCOME_TEXT, reply_markup=main_menu_markup(), parse_mode="HTML")
-                    log_admin_communication("admin", user_id, "Чат завершен админом (по кнопке)")
-                    return "ok", 200
+# ======= Вебхук на asyncio =======
+def create_async_app():
+    """aiohttp-застосунок: вебхук, відправка Bot API і метрики в одному циклі подій.
+
+    Обробники лишаються синхронними і виконуються в update_executor, але
+    мережеві виклики з черги відправки йдуть задачами asyncio через спільний
+    пул з'єднань, тож потоки не простоюють в очікуванні Telegram.
+    """
+    import asyncio
+    from aiohttp import web
+    from async_telegram import AsyncOutboundDrainer, AsyncTelegramClient
+
+    client = AsyncTelegramClient(
+        TOKEN,
+        pool_size=env_int("TG_ASYNC_POOL_SIZE", 100),
+        connect_timeout=TG_CONNECT_TIMEOUT,
+        read_timeout=TG_READ_TIMEOUT,
+        api_url=TELEGRAM_API_URL,
+        on_call=observe_telegram_call,
+    )
+    drainer = AsyncOutboundDrainer(outbound, client, concurrency=env_int("TG_ASYNC_CONCURRENCY", 200))
+
+    @web.middleware
+    async def timing(req, handler):
+        started = time.perf_counter()
+        try:
+            return await handler(req)
+        finally:
+            route = req.match_info.route.resource.canonical if req.match_info.route.resource else "unmatched"
+            http_seconds.labels(route, req.method).observe(time.perf_counter() - started)
 
-                return "ok", 200
-
-            # message handling
-            msg = update.get("message")
-            if not msg:
-                logger.warning("[WEBHOOK] Немає message")
-                return "ok", 200
-
-            chat_id = msg.get("chat", {}).get("id")
-            user_id = msg.get("from", {}).get("id")
-            text = msg.get("text", "") or ""
-
-            logger.info(f"[WEBHOOK] chat_id={chat_id}, text='{text}'")
-
-            # ===== ОБРАБОТКА КОНТАКТА =====
-            if "contact" in msg:
-                contact = msg. get("contact")
-                phone_number = contact.get("phone_number", "")
-                
-                # Проверяем, ожидаем ли мы номер телефона
-                if chat_id in user_orders and user_orders[chat_id].get("status") == "waiting_phone":
-                    user_orders[chat_id]["номер телефону"] = format_phone(phone_number)
-                    user_orders[chat_id]["username"] = msg.get("from", {}).get("username", "не вказано")
-                    user_orders[chat_id]["status"] = "waiting_confirmation"
-
-                    # Показываем подтверждение заказа
-                    order_summary = (
-                        f"<b>📦 ПІДТВЕРДЖЕННЯ ЗАМОВЛЕННЯ</b>\n\n"
-                        f"<b>Посилання:   </b> {user_orders[chat_id].get('посилання', 'не вказано')}\n"
-                        f"<b>Спосіб доставки: </b> {user_orders[chat_id].get('доставка', 'не вказано')}\n"
-                        f"<b>Номер телефону:</b> {user_orders[chat_id].get('номер телефону', 'не вказано')}\n"
-                        f"<b>Ім'я користувача:</b> @{user_orders[chat_id]['username']}\n\n"
-                        f"<b>Все вірно?  Натисніть 'Підтвердити' для відправки замовлення адміну.</b>"
-                    )
-
-                    send_message(chat_id, order_summary, reply_markup={
-                        "inline_keyboard":  [
-                            [{"text": "✅ Підтвердити замовлення", "callback_data": f"confirm_order_{chat_id}"}],
-                            [{"text": "❌ Скасувати", "callback_data": "back_to_menu"}],
-                        ]
-                    }, parse_mode="HTML")
-                    return "ok", 200
+    async def webhook_get(req):
+        return web.Response(text="OK")
 
-            # Проверяем статус заказа - ожидание ссылки на товар ИЛИ названия товара
-            if chat_id in user_orders and user_orders[chat_id].get("status") == "waiting_link":
-                if text and len(text. strip()) > 0:
-                    # Принимаем ЛЮБой текст как товар (ссылка или название)
-                    user_orders[chat_id]["посилання"] = text
-                    user_orders[chat_id]["status"] = "waiting_delivery"
-                    # Показываем выбор доставки
-                    send_message(chat_id, "<b>Оберіть спосіб доставки:</b>", reply_markup=delivery_markup(), parse_mode="HTML")
-                    return "ok", 200
+    async def webhook_post(req):
+        loop = asyncio.get_running_loop()
+        try:
+            update = await req.json()
+            logger.debug(f"[WEBHOOK] Update {update.get('update_id')} отримано")
+            # Спільний індекс дедуплікації - запит до БД, не в циклі подій
+            if processed_keys.shared is not None:
+                duplicate = await loop.run_in_executor(None, update_is_duplicate, update)
+            else:
+                duplicate = update_is_duplicate(update)
+            if duplicate:
+                return web.Response(text="ok")
+            slot = None
+            if WEBHOOK_INLINE_REPLY:
+                ready = loop.create_future()
+                slot = InlineReply(outbound, inline_targets(update), on_finish=lambda: loop.call_soon_threadsafe(
+                    lambda: ready.done() or ready.set_result(None)))
+            trace = tracer.start("update")
+            if not update_executor.submit(update_chat_id(update), process_update, update, slot, trace):
+                if processed_keys.shared is not None:
+                    await loop.run_in_executor(None, release_update, update)
                 else:
-                    send_message(chat_id, "❌ Введіть текст.  Надишліть посилання на товар або напишіть його назву.", reply_markup=None, parse_mode="HTML")
-                    return "ok", 200
-
-            # Проверяем команды
-            command = None
-            for possible in ("/start", "🏠 Меню", "🛒 Замовити товар", "❓ Швидкі відповіді", "📌 Про нас", "💬 Написати адміну", "✓ Завершити", "✓ Завершити чат", "🏠 До меню"):
-                if text.startswith(possible) or text == possible:
-                    command = text. strip()
-                    logger.info(f"[WEBHOOK] Команда: {command}")
-                    break
-
-            if command:  
-                threading.Thread(target=handle_command, args=(command, chat_id, msg, user_id), daemon=True).start()
-                return "ok", 200
-
-            # Если есть активный чат с админом
-            if chat_id in active_chats and active_chats[chat_id] == "active" and user_id != ADMIN_ID:
-                if any(k in msg for k in ("photo", "document", "video", "audio", "voice")):
-                    send_media(ADMIN_ID, msg)
-                    send_message(ADMIN_ID, f"Медіа від клієнта {chat_id}", parse_mode="HTML", reply_markup=admin_reply_markup(chat_id))
-                    log_admin_communication("user", chat_id, "[Медіа]")
-                elif text:  
-                    send_message(ADMIN_ID, f"<b>Клієнт {chat_id}:</b>\n{text}", parse_mode="HTML", reply_markup=admin_reply_markup(chat_id))
-                    log_admin_communication("user", chat_id, text)
-                return "ok", 200
-
-            # Если это сообщение от админа
-            if chat_id == ADMIN_ID:   
-                target = admin_targets.get(ADMIN_ID)
-                if target: 
-                    if any(k in msg for k in ("photo", "document", "video", "audio", "voice")):
-                        send_media(target, msg)
-                        send_message(target, "Адміністратор магазину надіслав медіа", reply_markup=user_finish_markup(), parse_mode="HTML")
-                        log_admin_communication("admin", target, "[Медіа]")
-                    elif text:
-                        send_message(target, text, reply_markup=user_finish_markup(), parse_mode="HTML")
-                        log_admin_communication("admin", target, text)
-                    return "ok", 200
-
-            return "ok", 200
-
+                    release_update(update)
+                return web.Response(text="busy", status=503)
+            if slot is not None:
+                try:
+                    await asyncio.wait_for(ready, WEBHOOK_INLINE_WAIT)
+                except asyncio.TimeoutError:
+                    pass
+                body = slot.wait(0)
+                if body is not None:
+                    return web.Response(body=body, content_type="application/json")
+            return web.Response(text="ok")
         except Exception as e:
             logger.error(f"[WEBHOOK ERROR] {e}", exc_info=True)
-            return "error", 500
-
-@app.route("/", methods=["GET"])
-def index():
-    return "✅ Магазин запущен", 200
+            return web.Response(text="error", status=500)
+
+    async def index_get(req):
+        return web.Response(text="✅ Магазин запущен")
+
+    async def metrics_get(req):
+        return web.Response(body=metrics.render().encode("utf-8"),
+                            headers={"Content-Type": "text/plain; version=0.0.4"})
+
+    async def debug_profiling_aio(req):
+        if not debug_authorized(req.headers.get("X-Debug-Token")):
+            return web.Response(text="not found", status=404)
+        if req.method == "POST":
+            try:
+                apply_debug_settings(await req.json() or {})
+            except (TypeError, ValueError) as e:
+                return web.Response(text=str(e), status=400)
+        return web.json_response(debug_settings())
+
+    async def on_startup(aio_app):
+        aio_app["drainer"] = asyncio.get_running_loop().create_task(drainer.run())
+
+    async def on_cleanup(aio_app):
+        # Недозібрані альбоми і розсилка ще мають пройти через цикл відправки
+        media_groups.stop()
+        broadcaster.stop()
+        drainer.stop()
+        try:
+            await asyncio.wait_for(aio_app["drainer"], 5)
+        except asyncio.TimeoutError:
+            logger.warning(f"[OUTBOUND] Зупинка з {outbound.pending()} невідправленими викликами")
+        await client.close()
+
+    aio_app = web.Application(middlewares=[timing])
+    aio_app.router.add_get("/webhook", webhook_get)
+    aio_app.router.add_post("/webhook", webhook_post)
+    aio_app.router.add_get("/", index_get)
+    aio_app.router.add_get("/metrics", metrics_get)
+    aio_app.router.add_route("*", "/debug/profiling", debug_profiling_aio)
+    aio_app.on_startup.append(on_startup)
+    aio_app.on_cleanup.append(on_cleanup)
+    return aio_app
+
+def run_async_server():
+    from aiohttp import web
 
-if __name__ == "__main__":   
-    start_idle_mode()
     register_webhook()
-    port = int(os.getenv("PORT", "5000"))
     try:
-        app.run("0.0.0.0", port=port, threaded=True)
+        web.run_app(create_async_app(), host="0.0.0.0", port=int(os.getenv("PORT", "5000")), print=None)
     except Exception as e:
         logger.error(f"Error running app: {e}")
     finally:
-        stop_idle_mode()
+        shutdown()
         delete_webhook()
+
+if __name__ == "__main__":   
+    start_idle_mode()
+    broadcaster.resume()
+    try:
+        if BOT_MODE == "polling":
+            run_polling()
+        elif BOT_MODE == "async":
+            run_async_server()
+        else:
+            run_webhook_server()
+    finally:
+        shutdown()
+        tg.close()
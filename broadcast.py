@@ -0,0 +1,313 @@
+import base64
+import bisect
+import logging
+import threading
+import time
+from array import array
+
+from outbound import TokenBucket
+from payloads import PayloadTemplate, var
+from telegram_api import TelegramAPIError
+
+logger = logging.getLogger(__name__)
+
+# Статус одержувача розсилки, 2 біти на кожного
+PENDING, SENT, BLOCKED, FAILED = range(4)
+
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+
+
+class ChatRegistry:
+    """Компактний реєстр відомих chat_id: відсортований масив int64 у пам'яті.
+
+    Кожен новий chat_id один раз записується в StateStore (namespace),
+    load() читає їх при старті. Перевірка і вставка - бінарний пошук.
+    """
+
+    def __init__(self, store, namespace="subscribers"):
+        self.store = store
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._ids = array("q")
+
+    def load(self):
+        ids = array("q", sorted(self.store.keys(self.namespace)))
+        with self._lock:
+            self._ids = ids
+        logger.info(f"[BROADCAST] Завантажено {len(ids)} отримувачів")
+
+    def add(self, chat_id):
+        """Додає chat_id; False, якщо він уже відомий"""
+        with self._lock:
+            i = bisect.bisect_left(self._ids, chat_id)
+            if i < len(self._ids) and self._ids[i] == chat_id:
+                return False
+            self._ids.insert(i, chat_id)
+        self.store.put(self.namespace, chat_id, 1)
+        return True
+
+    def discard(self, chat_id):
+        with self._lock:
+            i = bisect.bisect_left(self._ids, chat_id)
+            if i == len(self._ids) or self._ids[i] != chat_id:
+                return
+            del self._ids[i]
+        self.store.delete(self.namespace, chat_id)
+
+    def __contains__(self, chat_id):
+        with self._lock:
+            i = bisect.bisect_left(self._ids, chat_id)
+            return i < len(self._ids) and self._ids[i] == chat_id
+
+    def __len__(self):
+        return len(self._ids)
+
+    def snapshot(self):
+        with self._lock:
+            return array("q", self._ids)
+
+
+class StatusBitmap:
+    """Статуси одержувачів, упаковані по 2 біти (4 на байт)"""
+
+    __slots__ = ("size", "data")
+
+    def __init__(self, size, data=None):
+        self.size = size
+        self.data = bytearray((size + 3) // 4) if data is None else bytearray(data)
+
+    def get(self, i):
+        return (self.data[i >> 2] >> ((i & 3) << 1)) & 3
+
+    def set(self, i, status):
+        shift = (i & 3) << 1
+        self.data[i >> 2] = (self.data[i >> 2] & ~(3 << shift)) | (status << shift)
+
+    def counts(self):
+        result = [0, 0, 0, 0]
+        for i in range(self.size):
+            result[self.get(i)] += 1
+        return result
+
+    def encode(self):
+        return base64.b64encode(self.data).decode("ascii")
+
+    @classmethod
+    def decode(cls, size, text):
+        return cls(size, base64.b64decode(text))
+
+
+class BroadcastJob:
+    """Запис розсилки: що відправляємо, курсор і статус кожного одержувача.
+
+    cursor - індекс, до якого всі одержувачі вже мають остаточний статус;
+    після перезапуску відправка продовжується з нього, пропускаючи тих,
+    хто вже позначений. Список одержувачів зберігається окремо, бо не
+    змінюється за час розсилки.
+    """
+
+    __slots__ = ("job_id", "method", "payload", "recipients", "statuses", "cursor", "state", "created")
+
+    def __init__(self, job_id, method, payload, recipients, statuses=None, cursor=0,
+                 state=RUNNING, created=None):
+        self.job_id = job_id
+        self.method = method
+        self.payload = payload
+        self.recipients = recipients
+        self.statuses = statuses or StatusBitmap(len(recipients))
+        self.cursor = cursor
+        self.state = state
+        self.created = created or time.time()
+
+    @property
+    def total(self):
+        return len(self.recipients)
+
+    def to_dict(self):
+        return {
+            "method": self.method,
+            "payload": self.payload,
+            "total": self.total,
+            "cursor": self.cursor,
+            "state": self.state,
+            "statuses": self.statuses.encode(),
+            "created": self.created,
+        }
+
+    @classmethod
+    def from_dict(cls, job_id, data, recipients):
+        return cls(
+            job_id,
+            data["method"],
+            data["payload"],
+            recipients,
+            statuses=StatusBitmap.decode(data["total"], data["statuses"]),
+            cursor=data["cursor"],
+            state=data["state"],
+            created=data["created"],
+        )
+
+    def summary(self):
+        pending, sent, blocked, failed = self.statuses.counts()
+        return {"state": self.state, "total": self.total, "sent": sent,
+                "blocked": blocked, "failed": failed, "pending": pending}
+
+
+def encode_recipients(ids):
+    return base64.b64encode(ids.tobytes()).decode("ascii")
+
+
+def decode_recipients(text):
+    ids = array("q")
+    ids.frombytes(base64.b64decode(text))
+    return ids
+
+
+class Broadcaster:
+    """Розсилка одного повідомлення всім з реєстру через OutboundQueue.
+
+    Темп задається власним token bucket (rate/с, нижче глобального ліміту
+    черги, щоб лишався запас для звичайних відповідей), а в черзі
+    одночасно не більше window викликів. 403 (бот заблокований) прибирає
+    chat_id з реєстру. Запис розсилки зберігається кожні
+    checkpoint_interval секунд і при зупинці; resume() продовжує
+    незавершену розсилку після перезапуску.
+    """
+
+    def __init__(self, outbound, registry, jobs, recipients, rate=20.0, window=50,
+                 checkpoint_interval=2.0, on_finish=None):
+        self.outbound = outbound
+        self.registry = registry
+        self.jobs = jobs
+        self.recipients = recipients
+        self.rate = rate
+        self.window = window
+        self.checkpoint_interval = checkpoint_interval
+        self.on_finish = on_finish
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(window)
+        self._stop_event = threading.Event()
+        self._job = None
+        self._inflight = set()
+        self._next = 0
+        self._thread = None
+
+    # ======= Публічний API =======
+    @property
+    def current(self):
+        return self._job
+
+    def start_job(self, method, payload):
+        """Створює і запускає розсилку; None, якщо інша ще триває"""
+        with self._lock:
+            if self._job is not None and self._job.state == RUNNING:
+                return None
+            job = BroadcastJob(int(time.time() * 1000), method, payload, self.registry.snapshot())
+            self.recipients[job.job_id] = encode_recipients(job.recipients)
+            self._launch(job)
+        logger.info(f"[BROADCAST] Розсилка {job.job_id}: {job.total} отримувачів")
+        return job
+
+    def resume(self):
+        """Продовжує розсилку, перервану перезапуском"""
+        for job_id in sorted(self.jobs, reverse=True):
+            data = self.jobs.get(job_id)
+            if data is None or data["state"] != RUNNING:
+                continue
+            job = BroadcastJob.from_dict(job_id, data, decode_recipients(self.recipients[job_id]))
+            with self._lock:
+                if self._job is not None and self._job.state == RUNNING:
+                    return None
+                self._launch(job)
+            logger.info(f"[BROADCAST] Продовження розсилки {job_id} з {job.cursor}/{job.total}")
+            return job
+        return None
+
+    def cancel(self):
+        job = self._job
+        if job is None or job.state != RUNNING:
+            return False
+        job.state = CANCELLED
+        return True
+
+    def stop(self, timeout=5):
+        """Зупиняє відправку, зберігаючи розсилку для продовження після старту"""
+        self._stop_event.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    # ======= Відправка =======
+    def _launch(self, job):
+        self._job = job
+        self._next = job.cursor
+        self._inflight = set()
+        self._stop_event.clear()
+        self.jobs[job.job_id] = job.to_dict()
+        self._thread = threading.Thread(target=self._run, args=(job,), name="broadcast", daemon=True)
+        self._thread.start()
+
+    def _run(self, job):
+        template = PayloadTemplate(job.method, dict(job.payload, chat_id=var("chat_id")))
+        bucket = TokenBucket(self.rate, max(1, int(self.rate)), time.monotonic())
+        last_save = time.monotonic()
+        i = job.cursor
+        while i < job.total and job.state == RUNNING and not self._stop_event.is_set():
+            if job.statuses.get(i) != PENDING:
+                i += 1
+                continue
+            now = time.monotonic()
+            if now - last_save > self.checkpoint_interval:
+                self._save(job)
+                last_save = now
+            wait = bucket.delay(now)
+            if wait > 0:
+                self._stop_event.wait(wait)
+                continue
+            if not self._slots.acquire(timeout=1):
+                continue
+            bucket.consume()
+            chat_id = job.recipients[i]
+            with self._lock:
+                self._inflight.add(i)
+                self._next = i + 1
+            self.outbound.submit(chat_id, job.method, template.render(chat_id=chat_id),
+                                 callback=lambda result, i=i: self._done(job, i, result))
+            i += 1
+        # Дочікуємось відповідей на вже поставлені виклики
+        deadline = time.monotonic() + (3 if self._stop_event.is_set() else 30)
+        while self._inflight and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if job.state == RUNNING and i >= job.total:
+            job.state = DONE
+        self._save(job)
+        if job.state == RUNNING:
+            logger.info(f"[BROADCAST] Розсилку {job.job_id} призупинено на {job.cursor}/{job.total}")
+            return
+        logger.info(f"[BROADCAST] Розсилка {job.job_id} завершена: {job.summary()}")
+        if self.on_finish is not None:
+            try:
+                self.on_finish(job)
+            except Exception as e:
+                logger.error(f"[BROADCAST] Помилка on_finish: {e}", exc_info=True)
+
+    def _done(self, job, i, result):
+        error = result.error
+        if error is None:
+            status = SENT
+        elif isinstance(error, TelegramAPIError) and error.error_code == 403:
+            status = BLOCKED
+            self.registry.discard(job.recipients[i])
+        else:
+            status = FAILED
+        with self._lock:
+            job.statuses.set(i, status)
+            self._inflight.discard(i)
+        self._slots.release()
+
+    def _save(self, job):
+        with self._lock:
+            job.cursor = min(self._inflight) if self._inflight else self._next
+            self.jobs[job.job_id] = job.to_dict()
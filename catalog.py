@@ -0,0 +1,166 @@
+import logging
+import re
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# t.me/elfbar202405/123, https://t.me/s/elfbar202405/123?single
+_LINK = re.compile(r"(?:https?://)?t(?:elegram)?\.me/(?:s/)?([A-Za-z0-9_]{4,})/(\d+)", re.I)
+_PRICE = re.compile(r"(\d[\d\s]{0,6}(?:[.,]\d{1,2})?)\s*(?:грн|₴|uah)", re.I)
+_STOCK = re.compile(r"наявн|залиш|немає|нема\b|закінч|під замовлення|sold out|in stock", re.I)
+_WORD = re.compile(r"\w+")
+
+
+def trigrams(text):
+    """Множина триграм слів тексту в нижньому регістрі ("elf" → {" el", "elf", "lf "})"""
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class Product:
+    """Товар з одного поста каналу"""
+
+    __slots__ = ("post_id", "title", "price", "stock")
+
+    def __init__(self, post_id, title, price=None, stock=None):
+        self.post_id = post_id
+        self.title = title
+        self.price = price
+        self.stock = stock
+
+    def summary(self):
+        parts = [self.title]
+        if self.price:
+            parts.append(self.price)
+        if self.stock:
+            parts.append(self.stock)
+        return " · ".join(parts)
+
+    def to_dict(self):
+        return {"title": self.title, "price": self.price, "stock": self.stock}
+
+    @classmethod
+    def from_dict(cls, post_id, data):
+        return cls(post_id, data["title"], data.get("price"), data.get("stock"))
+
+
+def parse_post(post_id, text):
+    """Товар з тексту поста: назва - перший непорожній рядок; None для порожнього поста"""
+    lines = [line.strip() for line in (text or "").splitlines() if line.strip()]
+    if not lines:
+        return None
+    price = _PRICE.search(text)
+    stock = next((line for line in lines[1:] if _STOCK.search(line)), None)
+    return Product(
+        post_id,
+        lines[0][:200],
+        price=" ".join(price.group(0).split()) if price else None,
+        stock=stock[:100] if stock else None,
+    )
+
+
+class Catalog:
+    """Локальний каталог товарів з постів каналу.
+
+    Пости (channel_post / edited_channel_post) розбираються в Product і
+    зберігаються в StateStore (namespace, ключ - id поста), тож після
+    перезапуску load() відновлює каталог без запитів до Telegram.
+    Посилання t.me/<канал>/<id> знаходяться словником за id, довільна
+    назва - інвертованим індексом триграм: спершу за часткою триграм
+    запиту, знайдених у назві, при рівності - за схожістю Жаккара.
+    """
+
+    def __init__(self, channel, store=None, namespace="catalog", min_score=0.5):
+        self.channel = channel.lstrip("@").lower()
+        self.store = store
+        self.namespace = namespace
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._products = {}
+        self._grams = {}
+        self._index = {}
+
+    def __len__(self):
+        return len(self._products)
+
+    def load(self):
+        if self.store is None:
+            return
+        for post_id, data in self.store.items(self.namespace):
+            self._add(Product.from_dict(post_id, data))
+        logger.info(f"[CATALOG] Завантажено {len(self._products)} товарів")
+
+    # ======= Оновлення з каналу =======
+    def update(self, post):
+        """Додає або оновлює товар з поста; None, якщо пост не з нашого каналу або без тексту"""
+        chat = post.get("chat") or {}
+        if (chat.get("username") or "").lower() != self.channel:
+            return None
+        product = parse_post(post["message_id"], post.get("text") or post.get("caption"))
+        if product is None:
+            return None
+        self._add(product)
+        if self.store is not None:
+            self.store.put(self.namespace, product.post_id, product.to_dict())
+        return product
+
+    def _add(self, product):
+        grams = trigrams(product.title)
+        with self._lock:
+            self._unindex(product.post_id)
+            self._products[product.post_id] = product
+            self._grams[product.post_id] = len(grams)
+            for gram in grams:
+                self._index.setdefault(gram, set()).add(product.post_id)
+
+    def _unindex(self, post_id):
+        old = self._products.get(post_id)
+        if old is None:
+            return
+        for gram in trigrams(old.title):
+            ids = self._index.get(gram)
+            if ids is not None:
+                ids.discard(post_id)
+                if not ids:
+                    del self._index[gram]
+
+    # ======= Пошук =======
+    def get(self, post_id):
+        return self._products.get(post_id)
+
+    def resolve_link(self, text):
+        """Товар за посиланням на пост нашого каналу в тексті або None"""
+        for channel, post_id in _LINK.findall(text or ""):
+            if channel.lower() == self.channel:
+                return self._products.get(int(post_id))
+        return None
+
+    def search(self, query, limit=3):
+        """[(частка збігу, Product)] від найкращого, не нижче min_score"""
+        grams = trigrams(query)
+        if not grams:
+            return []
+        with self._lock:
+            hits = Counter()
+            for gram in grams:
+                hits.update(self._index.get(gram, ()))
+            scored = []
+            for post_id, common in hits.items():
+                coverage = common / len(grams)
+                if coverage >= self.min_score:
+                    jaccard = common / (len(grams) + self._grams[post_id] - common)
+                    scored.append((coverage, jaccard, self._products[post_id]))
+        scored.sort(key=lambda item: (-item[0], -item[1], -item[2].post_id))
+        return [(coverage, product) for coverage, _, product in scored[:limit]]
+
+    def lookup(self, text):
+        """Посилання або назва → найкращий Product чи None"""
+        product = self.resolve_link(text)
+        if product is not None or _LINK.search(text or ""):
+            return product
+        found = self.search(text, limit=1)
+        return found[0][1] if found else None
@@ -0,0 +1,163 @@
+import csv
+import gzip
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class CsvLogWriter:
+    """Буферизований CSV-лог з окремим потоком запису і ротацією.
+
+    write() лише кладе рядок у чергу. Потік запису скидає рядки пачками,
+    коли набирається batch_size або минає flush_interval. Файл ротується за
+    розміром (max_bytes) та/або при зміні дня, старі сегменти можна стискати.
+    on_write(rows) викликається в потоці запису після кожної записаної пачки.
+    """
+
+    def __init__(self, path, header, batch_size=100, flush_interval=1.0,
+                 max_bytes=0, rotate_daily=False, compress=False, on_write=None):
+        self.path = path
+        self.header = header
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+        self.on_write = on_write
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._writer = None
+        self._opened_day = None
+
+    def write(self, row):
+        """Ставить рядок у чергу на запис; не блокує"""
+        if self._thread is None:
+            self.start()
+        self._queue.put(row)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="csv-log-writer", daemon=True)
+            self._thread.start()
+
+    def flush(self, timeout=5):
+        """Блокує, доки все поставлене до цього моменту не буде записано"""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def stop(self, timeout=5):
+        """Скидає залишок черги на диск і зупиняє потік запису"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    # ======= Потік запису =======
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP or isinstance(item, threading.Event) or item is None:
+                self._write_batch(batch)
+                batch = []
+                deadline = None
+                if item is _STOP:
+                    self._close()
+                    return
+                if item is not None:
+                    item.set()
+                continue
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch)
+                batch = []
+                deadline = None
+
+    def _write_batch(self, batch):
+        if not batch:
+            return
+        try:
+            for row in batch:
+                self._maybe_rotate()
+                self._writer.writerow(row)
+            self._file.flush()
+        except Exception as e:
+            logger.error(f"[CSV LOG] Помилка запису {len(batch)} рядків у {self.path}: {e}")
+            self._close()
+            return
+        if self.on_write is not None:
+            try:
+                self.on_write(batch)
+            except Exception as e:
+                logger.error(f"[CSV LOG] Помилка обробки записаних рядків: {e}")
+
+    def _open(self):
+        exists = os.path.isfile(self.path) and os.path.getsize(self.path) > 0
+        self._file = open(self.path, "a", encoding="utf-8", newline='')
+        self._writer = csv.writer(self._file, delimiter=',', quoting=csv.QUOTE_ALL)
+        if exists:
+            self._opened_day = datetime.fromtimestamp(os.path.getmtime(self.path)).date()
+        else:
+            self._opened_day = datetime.now().date()
+            self._writer.writerow(self.header)
+
+    def _close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception as e:
+                logger.error(f"[CSV LOG] Помилка закриття {self.path}: {e}")
+        self._file = None
+        self._writer = None
+
+    def _maybe_rotate(self):
+        if self._file is None:
+            self._open()
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._rotate()
+        elif self.rotate_daily and self._opened_day != datetime.now().date():
+            self._rotate()
+
+    def _rotate(self):
+        self._close()
+        root, ext = os.path.splitext(self.path)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        target = f"{root}.{stamp}{ext}"
+        n = 1
+        while os.path.exists(target) or os.path.exists(target + ".gz"):
+            target = f"{root}.{stamp}-{n}{ext}"
+            n += 1
+        os.replace(self.path, target)
+        logger.info(f"[CSV LOG] Ротація: {self.path} → {target}")
+        if self.compress:
+            try:
+                with open(target, "rb") as src, gzip.open(target + ".gz", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(target)
+            except Exception as e:
+                logger.error(f"[CSV LOG] Не вдалося стиснути {target}: {e}")
+        self._open()
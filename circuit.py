@@ -0,0 +1,95 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from telegram_api import TelegramAPIError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Виклик не відправлявся: запобіжник розімкнено"""
+
+
+def is_outage(error):
+    """Збій самого Bot API (мережа, таймаут, 5xx), а не помилка конкретного запиту"""
+    if isinstance(error, TelegramAPIError):
+        return (error.error_code or 0) >= 500
+    return error is not None
+
+
+class CircuitBreaker:
+    """Запобіжник для викликів Bot API.
+
+    Рахує частку збоїв серед останніх window викликів; якщо вона досягла
+    threshold (і викликів не менше min_calls), розмикається на
+    reset_after секунд - виклики відхиляються одразу, без очікування
+    таймаутів. Потім пропускає один пробний виклик: успіх замикає ланцюг,
+    збій розмикає знову на подвоєний час (не більше max_reset_after).
+    """
+
+    def __init__(self, window=20, threshold=0.5, min_calls=5, reset_after=5.0, max_reset_after=120.0):
+        self.threshold = threshold
+        self.min_calls = min_calls
+        self.reset_after = reset_after
+        self.max_reset_after = max_reset_after
+        self.state = CLOSED
+        self.opens = 0
+        self._lock = threading.Lock()
+        self._results = deque(maxlen=window)
+        self._cooldown = reset_after
+        self._retry_at = 0.0
+        self._probing = False
+
+    def allow(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and now >= self._retry_at:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def retry_in(self, now=None):
+        """Через скільки секунд варто знову спитати allow()"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.state == OPEN:
+                return max(self._retry_at - now, 0.0)
+            return 0.0 if self.state == CLOSED else 0.5
+
+    def record(self, ok, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.state == HALF_OPEN and self._probing:
+                self._probing = False
+                if ok:
+                    self.state = CLOSED
+                    self._results.clear()
+                    self._cooldown = self.reset_after
+                    logger.info("[CIRCUIT] Bot API знову доступний, запобіжник замкнено")
+                else:
+                    self._open(now, min(self._cooldown * 2, self.max_reset_after))
+                return
+            if self.state != CLOSED:
+                return
+            self._results.append(ok)
+            failures = self._results.count(False)
+            if len(self._results) >= self.min_calls and failures / len(self._results) >= self.threshold:
+                self._open(now, self.reset_after)
+
+    def _open(self, now, cooldown):
+        self.state = OPEN
+        self.opens += 1
+        self._cooldown = cooldown
+        self._retry_at = now + cooldown
+        logger.warning(f"[CIRCUIT] Запобіжник розімкнено на {cooldown:.0f} с")
@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Ліміт Telegram на довжину тексту повідомлення
+MAX_MESSAGE_LENGTH = 4096
+
+
+class _Notice:
+    __slots__ = ("text", "message_id", "expires", "editing", "dirty")
+
+    def __init__(self, text, expires):
+        self.text = text
+        self.message_id = None
+        self.expires = expires
+        self.editing = True
+        self.dirty = False
+
+
+class NoticeCoalescer:
+    """Склеює серію коротких повідомлень в одне сповіщення, яке оновлюється.
+
+    Перше повідомлення для ключа надсилається через send(key, text), наступні
+    протягом window секунд після попереднього дописуються рядком і
+    відправляються через edit(key, message_id, text). Обидві функції
+    повертають OutboundJob і приймають callback. Поки попереднє надсилання
+    чи редагування не завершилось, зміни лише накопичуються, тож на серію
+    з будь-якої кількості повідомлень в черзі чату не більше одного виклику.
+    Якщо текст перевищив би max_length, починається нове сповіщення.
+    Якщо редагування не вдалось (наприклад, під час збою Bot API), увесь
+    текст надсилається заново новим сповіщенням, тож рядки не губляться.
+    """
+
+    def __init__(self, send, edit, window=5.0, max_length=MAX_MESSAGE_LENGTH):
+        self.send = send
+        self.edit = edit
+        self.window = window
+        self.max_length = max_length
+        self.merged = 0
+        self._lock = threading.Lock()
+        self._notices = {}
+        self._last_prune = time.monotonic()
+
+    def add(self, key, header, line):
+        """Додає рядок до сповіщення key; header - лише для нового сповіщення"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_prune > 60:
+                self._prune(now)
+            notice = self._notices.get(key)
+            if (notice is None or now > notice.expires
+                    or len(notice.text) + 1 + len(line) > self.max_length):
+                notice = self._notices[key] = _Notice(f"{header}\n{line}", now + self.window)
+                text = notice.text
+            else:
+                notice.text = f"{notice.text}\n{line}"
+                notice.expires = now + self.window
+                self.merged += 1
+                if notice.editing:
+                    notice.dirty = True
+                    return
+                notice.editing = True
+                self._edit(key, notice)
+                return
+        self.send(key, text, callback=lambda job: self._sent(key, notice, job))
+
+    def reset(self, key):
+        """Наступне повідомлення для key почне нове сповіщення"""
+        with self._lock:
+            self._notices.pop(key, None)
+
+    def _prune(self, now):
+        self._last_prune = now
+        for key in [k for k, n in self._notices.items() if now > n.expires and not n.editing]:
+            del self._notices[key]
+
+    def _edit(self, key, notice):
+        """Під замком: надсилає поточний текст сповіщення"""
+        notice.dirty = False
+        self.edit(key, notice.message_id, notice.text, callback=lambda job: self._edited(key, notice, job))
+
+    def _sent(self, key, notice, job):
+        with self._lock:
+            if job.error is not None or not isinstance(job.result, dict):
+                # Редагувати нічого - наступне повідомлення почне нове сповіщення
+                self._forget(key, notice)
+                return
+            notice.message_id = job.result.get("message_id")
+            self._continue(key, notice)
+
+    def _edited(self, key, notice, job):
+        with self._lock:
+            if job.error is None:
+                self._continue(key, notice)
+                return
+            # Старе сповіщення вже не оновити - увесь текст іде новим повідомленням
+            logger.warning(f"[COALESCE] Не вдалося оновити сповіщення {key}, надсилаю заново: {job.error}")
+            notice.message_id = None
+            notice.dirty = False
+            text = notice.text
+        self.send(key, text, callback=lambda j: self._sent(key, notice, j))
+
+    def _continue(self, key, notice):
+        if notice.dirty:
+            self._edit(key, notice)
+        else:
+            notice.editing = False
+
+    def _forget(self, key, notice):
+        notice.editing = False
+        if self._notices.get(key) is notice:
+            del self._notices[key]
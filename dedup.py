@@ -0,0 +1,73 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class RecentKeys:
+    """Обмежений індекс нещодавно оброблених ключів: кільцевий буфер + множина.
+
+    seen() за O(1) перевіряє і запам'ятовує ключ. Найстаріші ключі
+    витісняються після capacity записів. Якщо задано спільне сховище
+    (StateStore), ключ додатково реєструється там, щоб дублікат,
+    що потрапив в інший воркер або прийшов після перезапуску, теж
+    відкидався.
+    """
+
+    def __init__(self, capacity=10000, shared=None, shared_ttl=86400):
+        self.capacity = capacity
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.duplicates = 0
+        self._lock = threading.Lock()
+        self._ring = deque()
+        self._set = set()
+        self._claims = 0
+
+    def seen(self, key):
+        """True, якщо ключ уже траплявся (дублікат); інакше запам'ятовує його"""
+        with self._lock:
+            if key in self._set:
+                self.duplicates += 1
+                return True
+            if len(self._ring) >= self.capacity:
+                self._set.discard(self._ring.popleft())
+            self._ring.append(key)
+            self._set.add(key)
+        if self.shared is not None and not self._claim_shared(key):
+            with self._lock:
+                self.duplicates += 1
+            return True
+        return False
+
+    def forget(self, key):
+        """Знімає ключ, щоб повтор знову вважався новим (задачу не прийнято)"""
+        with self._lock:
+            if key in self._set:
+                self._set.discard(key)
+                self._ring.remove(key)
+        if self.shared is not None:
+            try:
+                self.shared.release(str(key))
+            except Exception as e:
+                logger.error(f"[DEDUP] Помилка спільного індексу: {e}")
+
+    def __len__(self):
+        return len(self._ring)
+
+    def _claim_shared(self, key):
+        try:
+            claimed = self.shared.claim(str(key))
+        except Exception as e:
+            # Спільне сховище недоступне - покладаємось лише на локальний індекс
+            logger.error(f"[DEDUP] Помилка спільного індексу: {e}")
+            return True
+        self._claims += 1
+        if self._claims % 1000 == 0:
+            try:
+                self.shared.expire_claims(time.time() - self.shared_ttl)
+            except Exception as e:
+                logger.error(f"[DEDUP] Помилка прибирання спільного індексу: {e}")
+        return claimed
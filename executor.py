@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+POLICY_REJECT = "reject"
+POLICY_BLOCK = "block"
+POLICY_CALLER_RUNS = "caller_runs"
+POLICIES = (POLICY_REJECT, POLICY_BLOCK, POLICY_CALLER_RUNS)
+
+
+class ChatExecutor:
+    """Обмежений пул потоків зі збереженням порядку в межах одного ключа.
+
+    Задачі з однаковим ключем (chat_id) виконуються послідовно, задачі різних
+    ключів - паралельно. Коли в черзі вже max_pending задач, спрацьовує
+    політика: reject - відхилити, block - чекати до block_timeout,
+    caller_runs - виконати в потоці, що викликає submit, якщо для ключа
+    нічого не чекає і не виконується (інакше відхилити, щоб не порушити
+    порядок).
+    """
+
+    def __init__(self, workers=8, max_pending=1000, policy=POLICY_REJECT,
+                 block_timeout=1.0, name="chat-exec"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.name = name
+        lock = threading.Lock()
+        self._cond = threading.Condition(lock)
+        self._not_full = threading.Condition(lock)
+        self._queues = {}
+        self._ready = deque()
+        self._pending = 0
+        self._rejected = 0
+        self._threads = []
+        self._started = False
+        self._stopping = False
+
+    def submit(self, key, fn, *args):
+        """Ставить fn(*args) у чергу ключа; False, якщо задачу відхилено"""
+        if not self._started:
+            self.start()
+        with self._cond:
+            if self._pending >= self.max_pending and self.policy == POLICY_BLOCK:
+                deadline = time.monotonic() + self.block_timeout
+                while self._pending >= self.max_pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._not_full.wait(remaining)
+            if self._pending < self.max_pending:
+                queue = self._queues.get(key)
+                if queue is None:
+                    self._queues[key] = deque(((fn, args),))
+                    self._ready.append(key)
+                    self._cond.notify()
+                else:
+                    queue.append((fn, args))
+                self._pending += 1
+                return True
+            if self.policy != POLICY_CALLER_RUNS or key in self._queues:
+                self._rejected += 1
+                logger.warning(f"[{self.name}] Черга переповнена, задачу для {key} відхилено")
+                return False
+            # Порожня черга позначає ключ зайнятим: наступні задачі ключа стануть за цією
+            self._queues[key] = deque()
+        self._run(key, fn, args)
+        with self._cond:
+            if self._queues[key]:
+                self._ready.append(key)
+                self._cond.notify()
+            else:
+                del self._queues[key]
+        return True
+
+    def pending(self):
+        return self._pending
+
+    def rejected(self):
+        return self._rejected
+
+    def start(self):
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+            self._stopping = False
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info(f"[{self.name}] Запущено {self.workers} потоків обробки")
+
+    def stop(self, timeout=5):
+        """Дочікується виконання поставлених задач (не довше timeout)"""
+        with self._cond:
+            if not self._started:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0, deadline - time.monotonic()))
+        self._threads = []
+        self._started = False
+
+    def _run(self, key, fn, args):
+        try:
+            fn(*args)
+        except Exception as e:
+            logger.error(f"[{self.name}] Помилка задачі для {key}: {e}", exc_info=True)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._ready:
+                    if self._stopping:
+                        return
+                    self._cond.wait()
+                key = self._ready.popleft()
+                fn, args = self._queues[key].popleft()
+            self._run(key, fn, args)
+            with self._cond:
+                self._pending -= 1
+                self._not_full.notify()
+                if self._queues[key]:
+                    # Ключ повертається в кінець, щоб інші чати не голодували
+                    self._ready.append(key)
+                    self._cond.notify()
+                else:
+                    del self._queues[key]
@@ -0,0 +1,110 @@
+import csv
+import glob
+import gzip
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    ts TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_user ON history (user_id, id);
+"""
+
+
+def log_segments(path):
+    """Сегменти CSV-логу від найстарішого: ротовані (.csv/.csv.gz), потім поточний файл"""
+    root, ext = os.path.splitext(path)
+    rotated = glob.glob(glob.escape(root) + ".*" + ext) + glob.glob(glob.escape(root) + ".*" + ext + ".gz")
+    # Мітка часу в імені сегмента сортується хронологічно
+    segments = sorted(rotated, key=lambda p: p[:-3] if p.endswith(".gz") else p)
+    if os.path.isfile(path):
+        segments.append(path)
+    return segments
+
+
+def read_segment(path):
+    """Рядки [timestamp, sender, user_id, text] одного сегмента, потоково"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", newline="") as f:
+        for row in csv.reader(f):
+            if len(row) >= 4 and row[0] != "timestamp":
+                yield row
+
+
+class HistoryIndex:
+    """Історія листування по user_id в окремій SQLite-базі.
+
+    Рядки потрапляють сюди з потоку запису CSV-логу пачками (add_rows),
+    тож індекс росте разом з логом і не торкається обробників оновлень.
+    Вибірка останніх повідомлень клієнта - пошук по індексу
+    (user_id, id) без читання решти історії. rebuild() заново заповнює
+    базу, потоково читаючи всі сегменти CSV-логу.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def add_rows(self, rows):
+        records = []
+        for row in rows:
+            try:
+                records.append((int(row[2]), str(row[0]), str(row[1]), str(row[3])))
+            except (ValueError, IndexError):
+                continue
+        if records:
+            with self._lock, self._conn:
+                self._conn.executemany("INSERT INTO history (user_id, ts, sender, text) VALUES (?, ?, ?, ?)", records)
+        return len(records)
+
+    def rebuild(self, log_path, chunk=5000):
+        """Перебудовує індекс з CSV-логу і всіх його сегментів; повертає кількість рядків"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM history")
+        total = 0
+        for segment in log_segments(log_path):
+            batch = []
+            try:
+                for row in read_segment(segment):
+                    batch.append(row)
+                    if len(batch) >= chunk:
+                        total += self.add_rows(batch)
+                        batch = []
+            except (OSError, EOFError, csv.Error) as e:
+                logger.error(f"[HISTORY] Не вдалося дочитати {segment}: {e}")
+            total += self.add_rows(batch)
+        logger.info(f"[HISTORY] Індекс перебудовано: {total} рядків")
+        return total
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM history LIMIT 1").fetchone() is None
+
+    def count(self, user_id):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM history WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def last(self, user_id, limit=10, offset=0):
+        """[(ts, sender, text)] - limit повідомлень перед offset останніми, від старих до нових"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ts, sender, text FROM history WHERE user_id = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (user_id, limit, offset),
+            ).fetchall()
+        rows.reverse()
+        return rows
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,109 @@
+import json
+import logging
+import threading
+
+from outbound import OutboundJob
+
+logger = logging.getLogger(__name__)
+
+# Методи, які Telegram дозволяє повернути в тілі відповіді на вебхук
+INLINE_METHODS = frozenset(("sendMessage", "editMessageText", "answerCallbackQuery"))
+
+_local = threading.local()
+
+
+def current():
+    """Слот відповіді оновлення, яке обробляє цей потік (або None)"""
+    return getattr(_local, "slot", None)
+
+
+class InlineReply:
+    """Збирає виклики обробника одного оновлення, щоб один з них віддати у відповіді на вебхук.
+
+    Поки обробник працює, виклики буферизуються. Після завершення перший
+    допустимий виклик повертається у тілі відповіді, решта йде у звичайну
+    чергу. Допустимий - метод з INLINE_METHODS без callback, адресований
+    самому оновленню (targets: його чат і callback query), єдиний для свого
+    чату і без викликів цього чату в черзі чи журналі недоставлених.
+    Сповіщення операторам і адміну завжди йдуть через чергу: там повтори,
+    запобіжник і журнал. Якщо вебхук перестав чекати,
+    усі виклики йдуть у чергу. on_finish() викликається в потоці обробника,
+    коли тіло відповіді готове (для вебхука на asyncio).
+    """
+
+    __slots__ = ("outbound", "targets", "on_finish", "_lock", "_event", "_jobs", "_body", "_finished", "_abandoned")
+
+    def __init__(self, outbound, targets=(), on_finish=None):
+        self.outbound = outbound
+        self.targets = frozenset(targets)
+        self.on_finish = on_finish
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._jobs = []
+        self._body = None
+        self._finished = False
+        self._abandoned = False
+
+    # ======= Потік обробника =======
+    def activate(self):
+        _local.slot = self
+
+    def capture(self, chat_id, method, payload, callback=None, spoolable=False):
+        """Буферизує виклик; None, якщо слот уже не приймає викликів"""
+        with self._lock:
+            if self._finished or self._abandoned:
+                return None
+            job = OutboundJob(chat_id, method, payload, callback, spoolable)
+            self._jobs.append(job)
+            return job
+
+    def finish(self):
+        """Вибирає виклик для відповіді на вебхук, решту ставить у чергу"""
+        _local.slot = None
+        with self._lock:
+            self._finished = True
+            jobs, self._jobs = self._jobs, []
+            inline = None if self._abandoned else self._pick(jobs)
+            if inline is not None:
+                self._body = self._encode(inline)
+        for job in jobs:
+            if job is inline:
+                job.resolve()
+            else:
+                self.outbound.submit_job(job)
+        self._event.set()
+        if self.on_finish is not None:
+            self.on_finish()
+
+    def _pick(self, jobs):
+        per_chat = {}
+        for job in jobs:
+            per_chat[job.chat_id] = per_chat.get(job.chat_id, 0) + 1
+        for job in jobs:
+            if (job.chat_id in self.targets and job.method in INLINE_METHODS and job.callback is None
+                    and per_chat[job.chat_id] == 1 and self.outbound.can_bypass(job.chat_id)):
+                return job
+        return None
+
+    @staticmethod
+    def _encode(job):
+        head = b'{"method":"' + job.method.encode("ascii") + b'"'
+        if isinstance(job.payload, bytes):
+            rest = job.payload[1:]
+            return head + (b"," + rest if rest != b"}" else rest)
+        payload = dict(job.payload, method=job.method)
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    # ======= Потік вебхука =======
+    def wait(self, timeout):
+        """Тіло відповіді на вебхук або None, якщо обробник не встиг"""
+        if not self._event.wait(timeout):
+            with self._lock:
+                if not self._finished:
+                    # Вже зібране йде в чергу під замком, щоб не обігнати наступні виклики
+                    self._abandoned = True
+                    for job in self._jobs:
+                        self.outbound.submit_job(job)
+                    self._jobs = []
+                    return None
+        return self._body
@@ -0,0 +1,177 @@
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+_correlation = contextvars.ContextVar("correlation_id", default=None)
+
+# Категорія - тег на початку повідомлення: "[WEBHOOK] ..." → WEBHOOK
+_CATEGORY = re.compile(r"^\[([A-Z_]+)")
+
+# Дані клієнтів, які не мають потрапляти в логи
+_REDACTIONS = (
+    (re.compile(r"(?<!\d)(\+?380\d{9}|\+\d{10,14})(?!\d)"), "<phone>"),
+    (re.compile(r"(text|caption)=(['\"]).*?\2", re.S), r"\1=<redacted>"),
+)
+
+
+@contextmanager
+def correlation(value):
+    """Прив'язує id кореляції (наприклад update_id) до всіх записів цього потоку"""
+    token = _correlation.set(value)
+    try:
+        yield
+    finally:
+        _correlation.reset(token)
+
+
+def redact(text):
+    for pattern, replacement in _REDACTIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def category_of(record):
+    match = _CATEGORY.match(record.msg) if isinstance(record.msg, str) else None
+    return match.group(1) if match else record.name
+
+
+class SamplingFilter(logging.Filter):
+    """Рівень і частка записів по категоріях; працює в потоці, що логує.
+
+    Записи WARNING і вище не семплюються, тільки фільтруються рівнем.
+    Налаштування можна змінювати на льоту.
+    """
+
+    def __init__(self, levels=None, sample=None):
+        super().__init__()
+        self.levels = dict(levels or {})
+        self.sample = dict(sample or {})
+
+    def filter(self, record):
+        category = category_of(record)
+        record.category = category
+        record.correlation_id = _correlation.get()
+        if record.levelno < self.levels.get(category, logging.NOTSET):
+            return False
+        rate = self.sample.get(category)
+        if rate is not None and record.levelno < logging.WARNING and random.random() >= rate:
+            return False
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Один JSON-об'єкт на рядок з уже очищеним текстом"""
+
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "category": getattr(record, "category", None),
+            "cid": getattr(record, "correlation_id", None),
+            "thread": record.threadName,
+            "msg": redact(record.getMessage()),
+        }
+        if record.exc_info:
+            data["exc"] = redact(self.formatException(record.exc_info))
+        return json.dumps(data, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Звичний текстовий формат, теж з очищенням і id кореляції"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s [%(levelname)s] %(message)s", "%Y-%m-%d %H:%M:%S")
+
+    def format(self, record):
+        text = redact(super().format(record))
+        cid = getattr(record, "correlation_id", None)
+        return f"{text} cid={cid}" if cid is not None else text
+
+
+class LogPipeline:
+    """Логи через чергу: потік, що логує, лише кладе запис у чергу,
+    а форматування, очищення і запис у потік виводу робить фоновий потік.
+    """
+
+    def __init__(self, level=logging.INFO, fmt="json", levels=None, sample=None, stream=None):
+        self.filter = SamplingFilter(levels, sample)
+        self._queue = queue.SimpleQueue()
+        target = logging.StreamHandler(stream or sys.stderr)
+        target.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+        self.handler = logging.handlers.QueueHandler(self._queue)
+        self.handler.addFilter(self.filter)
+        self.listener = logging.handlers.QueueListener(self._queue, target, respect_handler_level=False)
+        self.level = level
+        self._lock = threading.Lock()
+        self._started = False
+
+    def install(self):
+        """Замінює обробники кореневого логера на чергу і запускає фоновий потік"""
+        with self._lock:
+            if self._started:
+                return self
+            root = logging.getLogger()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            root.addHandler(self.handler)
+            root.setLevel(self.level)
+            self.listener.start()
+            self._started = True
+        return self
+
+    def stop(self):
+        """Дописує чергу і зупиняє фоновий потік"""
+        with self._lock:
+            if not self._started:
+                return
+            self._started = False
+            self.listener.stop()
+
+    # ======= Налаштування на льоту =======
+    def set_level(self, category, level):
+        self.filter.levels[category] = level_value(level) if isinstance(level, str) else level
+
+    def set_sample(self, category, rate):
+        rate = float(rate)
+        if not 0 <= rate <= 1:
+            raise ValueError("Sample rate must be between 0 and 1")
+        if rate == 1:
+            self.filter.sample.pop(category, None)
+        else:
+            self.filter.sample[category] = rate
+
+    def settings(self):
+        return {
+            "levels": {c: logging.getLevelName(l) for c, l in self.filter.levels.items()},
+            "sample": dict(self.filter.sample),
+        }
+
+
+def parse_pairs(value, convert):
+    """'WEBHOOK=0.1,OUTBOUND=1' → {"WEBHOOK": 0.1, "OUTBOUND": 1.0}; некоректні пари пропускаються"""
+    result = {}
+    for item in (value or "").split(","):
+        name, sep, raw = item.partition("=")
+        if not sep:
+            continue
+        try:
+            result[name.strip()] = convert(raw.strip())
+        except ValueError:
+            continue
+    return result
+
+
+def level_value(name):
+    level = logging.getLevelName(name.upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level: {name}")
+    return level
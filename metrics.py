@@ -0,0 +1,245 @@
+import bisect
+import threading
+import weakref
+
+# Межі бакетів за замовчуванням, секунди
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _ShardOwner:
+    """Живе в threading.local потоку; зникає разом з потоком"""
+
+    __slots__ = ("__weakref__",)
+
+
+class _Sharded:
+    """Масив лічильників, розбитий по потоках.
+
+    Кожен потік пише тільки у свій шард, тому запис не бере замок;
+    замок потрібен лише один раз, коли потік створює свій шард, і при читанні.
+    Коли потік завершується (threaded-сервер створює потік на кожен запит),
+    його шард додається до базових сум і прибирається.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        self._base = [0] * size
+        self._shards = {}
+        self._lock = threading.Lock()
+
+    def shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = [0] * self._size
+            owner = _ShardOwner()
+            with self._lock:
+                self._shards[id(shard)] = shard
+            weakref.finalize(owner, self._retire, shard)
+            self._local.owner = owner
+            self._local.shard = shard
+        return shard
+
+    def _retire(self, shard):
+        with self._lock:
+            del self._shards[id(shard)]
+            for i, value in enumerate(shard):
+                self._base[i] += value
+
+    def __len__(self):
+        with self._lock:
+            return len(self._shards)
+
+    def totals(self):
+        with self._lock:
+            result = list(self._base)
+            shards = list(self._shards.values())
+        for shard in shards:
+            for i, value in enumerate(shard):
+                result[i] += value
+        return result
+
+
+class _Family:
+    """Метрика з набором міток; дочірні серії створюються при першому зверненні"""
+
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._collector = None
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._children.items(), key=lambda kv: tuple(map(str, kv[0])))
+
+    def set_collector(self, fn):
+        """fn() -> {значення міток: число}: серії, які веде інший модуль, читаються під час /metrics"""
+        self._collector = fn
+
+    def _collected(self):
+        if self._collector is None:
+            return []
+        try:
+            series = self._collector()
+        except Exception:
+            return []
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(value)}"
+                for values, value in sorted(series.items(), key=lambda kv: tuple(map(str, kv[0])))]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._items():
+            lines.extend(self._render_child(_labels(self.labelnames, values), values, child))
+        lines.extend(self._collected())
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("_data",)
+
+    def __init__(self):
+        self._data = _Sharded(1)
+
+    def inc(self, amount=1):
+        self._data.shard()[0] += amount
+
+    def value(self):
+        return self._data.totals()[0]
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def set_function(self, fn, *values):
+        """Серія, яку рахує інший модуль: fn() повертає поточне (лише зростаюче) значення"""
+        with self._lock:
+            self._children[values] = fn
+
+    def _render_child(self, labels, values, child):
+        try:
+            value = child() if callable(child) else child.value()
+        except Exception:
+            return []
+        return [f"{self.name}{labels} {_number(value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_data")
+
+    def __init__(self, bounds):
+        self._bounds = bounds
+        # Бакети, потім сума і кількість
+        self._data = _Sharded(len(bounds) + 3)
+
+    def observe(self, value):
+        shard = self._data.shard()
+        shard[bisect.bisect_left(self._bounds, value)] += 1
+        shard[-2] += value
+        shard[-1] += 1
+
+    def snapshot(self):
+        return self._data.totals()
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_child(self, labels, values, child):
+        data = child.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), data):
+            cumulative += count
+            le = _labels(self.labelnames + ("le",), values + (_number(bound),))
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        lines.append(f"{self.name}_sum{labels} {_number(data[-2])}")
+        lines.append(f"{self.name}_count{labels} {data[-1]}")
+        return lines
+
+
+class Gauge(_Family):
+    """Значення, яке зчитується функцією в момент запиту /metrics"""
+
+    kind = "gauge"
+
+    def set_function(self, fn, *values):
+        with self._lock:
+            self._children[values] = fn
+
+    def _render_child(self, labels, values, fn):
+        try:
+            value = fn()
+        except Exception:
+            return []
+        return [f"{self.name}{labels} {_number(value)}"]
+
+
+class MetricsRegistry:
+    """Набір метрик, що віддаються у текстовому форматі Prometheus"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._add(Gauge(name, help_text, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,316 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+from circuit import CLOSED, CircuitOpenError, is_outage
+from telegram_api import TelegramAPIError
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Класичний token bucket; не потокобезпечний, захищається замком черги"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now):
+        """Скільки секунд чекати до наступного токена (0 - можна одразу)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+    def is_full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class OutboundJob:
+    """Один виклик Bot API, що чекає в черзі на відправку"""
+
+    __slots__ = ("chat_id", "method", "payload", "callback", "spoolable", "attempts", "replay",
+                 "result", "error", "_done")
+
+    def __init__(self, chat_id, method, payload, callback=None, spoolable=False):
+        self.chat_id = chat_id
+        self.method = method
+        self.payload = payload
+        self.callback = callback
+        # Виклик з callback, який усе одно стає в чергу журналу недоставлених (див. OutboundSpool)
+        self.spoolable = spoolable
+        self.attempts = 0
+        # Повтор запису з журналу недоставлених
+        self.replay = False
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Чекає на завершення і повертає result (None при помилці або таймауті)"""
+        self._done.wait(timeout)
+        return self.result
+
+    def resolve(self, result=None, error=None):
+        """Завершує виклик і викликає callback"""
+        self.result = result
+        self.error = error
+        self._done.set()
+        if self.callback is not None:
+            try:
+                self.callback(self)
+            except Exception as e:
+                logger.error(f"[OUTBOUND] Помилка callback для {self.method}: {e}", exc_info=True)
+
+
+class OutboundQueue:
+    """Черга вихідних викликів з лімітами на чат і глобально.
+
+    Виклики для одного chat_id відправляються строго по черзі, різні чати -
+    паралельно фоновими потоками. Відповідь 429 повертає виклик на початок
+    черги чату з затримкою retry_after.
+
+    breaker (CircuitBreaker) відхиляє виклики одразу, поки Bot API
+    недоступний; spool (OutboundSpool) приймає повідомлення, не доставлені
+    через збій, а також наступні повідомлення тих самих чатів, щоб вони не
+    обігнали відкладені. Решта викликів при розімкненому запобіжнику чекає
+    в черзі до пробного виклику. Потоки запускає start(); з workers=0
+    чергу натомість вичерпує зовнішній цикл (asyncio) через take_ready() і
+    complete(), а on_ready() викликається щоразу, коли з'являється робота.
+    """
+
+    def __init__(self, client, workers=8, global_rate=30.0, global_burst=30,
+                 chat_rate=1.0, chat_burst=3, max_retries=3, breaker=None, spool=None):
+        self.client = client
+        self.breaker = breaker
+        self.spool = spool
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._cond = threading.Condition(threading.Lock())
+        self._queues = {}
+        self._ready = []
+        self._seq = itertools.count()
+        self._global = TokenBucket(global_rate, global_burst, time.monotonic())
+        self._buckets = {}
+        self._pending = 0
+        self._threads = []
+        self._started = False
+        self._stopping = False
+        self._last_prune = time.monotonic()
+        self.on_ready = None
+
+    # ======= Публічний API =======
+    def submit(self, chat_id, method, payload, callback=None, spoolable=False):
+        """Ставить виклик у чергу і одразу повертає OutboundJob"""
+        return self.submit_job(OutboundJob(chat_id, method, payload, callback, spoolable))
+
+    def submit_job(self, job):
+        chat_id = job.chat_id
+        with self._cond:
+            queue = self._queues.get(chat_id)
+            if queue is None:
+                self._queues[chat_id] = deque((job,))
+                self._schedule(chat_id, time.monotonic())
+            else:
+                queue.append(job)
+            self._pending += 1
+        return job
+
+    def pending(self):
+        return self._pending
+
+    def can_bypass(self, chat_id):
+        """Чи може виклик для чату піти повз чергу, не обігнавши інших.
+
+        Так лише коли для чату нічого не чекає, не відправляється і не
+        лежить у журналі, а запобіжник замкнено.
+        """
+        if self.breaker is not None and self.breaker.state != CLOSED:
+            return False
+        if self.spool is not None and self.spool.pending_for(chat_id):
+            return False
+        with self._cond:
+            return chat_id not in self._queues
+
+    def start(self):
+        """Запускає workers потоків відправки; workers=0 - чергу вичерпує зовнішній цикл.
+
+        Виклики, поставлені до start(), чекають у черзі.
+        """
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+            self._stopping = False
+        workers = self.workers
+        for i in range(workers):
+            t = threading.Thread(target=self._worker, name=f"outbound-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        if workers:
+            logger.info(f"[OUTBOUND] Запущено {workers} потоків відправки")
+
+    def take_ready(self):
+        """Неблокуючий варіант _take: (job, None) або (None, скільки чекати; None - черга порожня)"""
+        with self._cond:
+            return self._next(time.monotonic())
+
+    def admit(self, job):
+        """Чи відправляти взятий виклик; False - його вже відкладено в журнал чи чергу"""
+        held = self.spool.hold(job) if self.spool is not None else None
+        if held is not None:
+            self._complete(job, error=held, sent=False)
+            return False
+        if self.breaker is None or self.breaker.allow():
+            return True
+        if self.spool is not None and self.spool.accepts(job):
+            self._complete(job, error=CircuitOpenError(job.method), sent=False)
+        else:
+            self._defer(job, max(self.breaker.retry_in(), 0.05))
+        return False
+
+    def complete(self, job, result=None, error=None):
+        """Завершує виклик, взятий через take_ready() і допущений admit()"""
+        self._complete(job, result, error)
+
+    def stop(self, timeout=5):
+        """Дочікується відправки залишку черги (не довше timeout) і зупиняє потоки"""
+        with self._cond:
+            if not self._started:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0, deadline - time.monotonic()))
+        self._threads = []
+        self._started = False
+        if self._pending:
+            logger.warning(f"[OUTBOUND] Зупинка з {self._pending} невідправленими викликами")
+
+    # ======= Планування =======
+    def _schedule(self, chat_id, ready_at):
+        heapq.heappush(self._ready, (ready_at, next(self._seq), chat_id))
+        self._cond.notify()
+        if self.on_ready is not None:
+            self.on_ready()
+
+    def _bucket(self, chat_id, now):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        return bucket
+
+    def _prune_buckets(self, now):
+        """Прибирає бакети чатів без черги, що вже повністю відновились"""
+        self._last_prune = now
+        for chat_id in [c for c, b in self._buckets.items() if c not in self._queues and b.is_full(now)]:
+            del self._buckets[chat_id]
+
+    def _take(self):
+        """Блокує до появи виклику, який дозволяють ліміти; None - зупинка"""
+        with self._cond:
+            while True:
+                job, wait = self._next(time.monotonic())
+                if job is not None:
+                    return job
+                if wait is None:
+                    if self._stopping:
+                        return None
+                    self._cond.wait()
+                else:
+                    self._cond.wait(wait)
+
+    def _next(self, now):
+        """Під замком: виклик, який дозволяють ліміти, або скільки до нього чекати"""
+        if now - self._last_prune > 60:
+            self._prune_buckets(now)
+        while self._ready:
+            ready_at, _, chat_id = self._ready[0]
+            if ready_at > now:
+                return None, ready_at - now
+            heapq.heappop(self._ready)
+            bucket = self._bucket(chat_id, now)
+            wait = max(bucket.delay(now), self._global.delay(now))
+            if wait > 0:
+                self._schedule(chat_id, now + wait)
+                continue
+            bucket.consume()
+            self._global.consume()
+            return self._queues[chat_id].popleft(), None
+        return None, None
+
+    def _defer(self, job, delay):
+        """Повертає виклик на початок черги чату"""
+        with self._cond:
+            self._queues[job.chat_id].appendleft(job)
+            self._schedule(job.chat_id, time.monotonic() + delay)
+
+    def _complete(self, job, result=None, error=None, sent=True):
+        now = time.monotonic()
+        # 429 - теж відповідь Bot API: пробний виклик має звільнити запобіжник до повтору
+        if sent and self.breaker is not None:
+            self.breaker.record(not is_outage(error))
+        if (isinstance(error, TelegramAPIError) and error.error_code == 429
+                and job.attempts < self.max_retries):
+            retry_after = error.retry_after or 1
+            logger.warning(f"[OUTBOUND] 429 для {job.chat_id}, повтор через {retry_after} с")
+            self._defer(job, retry_after)
+            return
+        spooled = False
+        if error is not None and is_outage(error) and self.spool is not None and self.spool.accepts(job):
+            # До журналу - раніше, ніж чат отримає наступний виклик
+            try:
+                self.spool.append(job)
+                spooled = True
+            except Exception as e:
+                logger.error(f"[SPOOL] Не вдалося записати {job.method} → {job.chat_id}: {e}")
+        with self._cond:
+            self._pending -= 1
+            queue = self._queues[job.chat_id]
+            if queue:
+                self._schedule(job.chat_id, now)
+            else:
+                del self._queues[job.chat_id]
+        if spooled:
+            logger.warning(f"[SPOOL] {job.method} → {job.chat_id} відкладено: {error}")
+        elif error is not None:
+            logger.error(f"[OUTBOUND] {job.method} → {job.chat_id}: {error}")
+        job.resolve(result, error)
+
+    def _worker(self):
+        while True:
+            job = self._take()
+            if job is None:
+                return
+            if not self.admit(job):
+                continue
+            job.attempts += 1
+            try:
+                result = self.client.call(job.method, job.payload)
+            except Exception as e:
+                self._complete(job, error=e)
+            else:
+                self._complete(job, result=result)
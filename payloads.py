@@ -0,0 +1,68 @@
+import json
+import re
+
+_OPEN = "\ue000"
+_CLOSE = "\ue001"
+_PLACEHOLDER = re.compile(f'"{_OPEN}(\\w+){_CLOSE}"|{_OPEN}(\\w+){_CLOSE}')
+
+
+def var(name):
+    """Місце для значення, яке підставляється при кожній відправці"""
+    return f"{_OPEN}{name}{_CLOSE}"
+
+
+class PayloadTemplate:
+    """JSON-тіло виклику Bot API, закодоване один раз.
+
+    Значення var(name) на місці цілого поля підставляється як JSON-значення,
+    усередині рядка (наприклад "reply_" + var("user_id")) - як текст.
+    """
+
+    __slots__ = ("method", "_parts")
+
+    def __init__(self, method, payload):
+        self.method = method
+        encoded = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+        parts = []
+        pos = 0
+        for m in _PLACEHOLDER.finditer(encoded):
+            parts.append(encoded[pos:m.start()].encode("utf-8"))
+            if m.group(1) is not None:
+                parts.append((m.group(1), True))
+            else:
+                parts.append((m.group(2), False))
+            pos = m.end()
+        parts.append(encoded[pos:].encode("utf-8"))
+        self._parts = tuple(parts)
+
+    def render(self, **values):
+        out = []
+        for part in self._parts:
+            if isinstance(part, bytes):
+                out.append(part)
+                continue
+            name, whole = part
+            value = values[name]
+            if isinstance(value, int):
+                out.append(str(value).encode("ascii"))
+            elif whole:
+                out.append(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+            else:
+                out.append(json.dumps(str(value), ensure_ascii=False)[1:-1].encode("utf-8"))
+        return b"".join(out)
+
+
+class PayloadRegistry:
+    """Іменовані шаблони статичних відповідей, зібрані при старті"""
+
+    def __init__(self):
+        self._templates = {}
+
+    def add(self, name, method, payload):
+        self._templates[name] = PayloadTemplate(method, payload)
+
+    def __contains__(self, name):
+        return name in self._templates
+
+    def __getitem__(self, name):
+        return self._templates[name]
@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+
+from telegram_api import TelegramAPIError
+
+logger = logging.getLogger(__name__)
+
+
+class _Batch:
+    """Незавершені оновлення однієї пачки getUpdates.
+
+    Коли завершується оновлення, перед яким усі попередні вже оброблені,
+    on_advance(offset) отримує наступний offset - так він зсувається по
+    неперервному обробленому префіксу, а не лише після всієї пачки.
+    """
+
+    def __init__(self, update_ids, on_advance):
+        self._ids = update_ids
+        self._done = [False] * len(update_ids)
+        self._cursor = 0
+        self._on_advance = on_advance
+        self._cond = threading.Condition()
+
+    def done(self, index):
+        with self._cond:
+            self._done[index] = True
+            cursor = self._cursor
+            while cursor < len(self._done) and self._done[cursor]:
+                cursor += 1
+            if cursor == self._cursor:
+                return
+            self._cursor = cursor
+            # Під замком, щоб offset не відкотився через пізніший виклик
+            self._on_advance(self._ids[cursor - 1] + 1)
+            if cursor == len(self._done):
+                self._cond.notify_all()
+
+    def wait(self):
+        with self._cond:
+            while self._cursor < len(self._done):
+                self._cond.wait()
+
+
+class LongPoller:
+    """Отримує оновлення через getUpdates пачками і роздає їх у пул обробки.
+
+    Оновлення пачки обробляються паралельно з порядком у межах чату.
+    Offset зсувається, щойно оброблено неперервний префікс пачки, тому після
+    перезапуску (навіть посеред пачки) Telegram повторно віддасть тільки
+    необроблені оновлення.
+    """
+
+    def __init__(self, client, executor, handler, key_func, offsets, limit=100,
+                 timeout=50, allowed_updates=None):
+        self.client = client
+        self.executor = executor
+        self.handler = handler
+        self.key_func = key_func
+        self.offsets = offsets
+        self.limit = min(max(limit, 1), 100)
+        self.timeout = timeout
+        self.allowed_updates = allowed_updates
+        self._stop_event = threading.Event()
+
+    @property
+    def offset(self):
+        return self.offsets.get(0)
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        logger.info(f"[POLLING] Старт з offset={self.offset}")
+        backoff = 1
+        while not self._stop_event.is_set():
+            try:
+                updates = self._fetch()
+            except TelegramAPIError as e:
+                if e.error_code == 409:
+                    logger.error(f"[POLLING] Конфлікт: активний вебхук або інший поллер ({e.description})")
+                else:
+                    logger.error(f"[POLLING] Помилка getUpdates: {e}")
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            except Exception as e:
+                logger.error(f"[POLLING] Помилка з'єднання: {e}")
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            backoff = 1
+            if updates:
+                self._dispatch(updates)
+        logger.info("[POLLING] Зупинено")
+
+    def _fetch(self):
+        payload = {"limit": self.limit, "timeout": self.timeout}
+        offset = self.offset
+        if offset is not None:
+            payload["offset"] = offset
+        if self.allowed_updates is not None:
+            payload["allowed_updates"] = self.allowed_updates
+        connect_timeout = self.client.timeout[0]
+        return self.client.call("getUpdates", payload, timeout=(connect_timeout, self.timeout + 10))
+
+    def _dispatch(self, updates):
+        batch = _Batch([u["update_id"] for u in updates], self._save_offset)
+
+        def run(index, update):
+            try:
+                self.handler(update)
+            finally:
+                batch.done(index)
+
+        for index, update in enumerate(updates):
+            key = self.key_func(update)
+            # Поллер сам є джерелом навантаження, тому при переповненні просто чекає
+            while not self.executor.submit(key, run, index, update):
+                time.sleep(0.05)
+        batch.wait()
+        logger.info(f"[POLLING] Оброблено пачку з {len(updates)} оновлень")
+
+    def _save_offset(self, offset):
+        self.offsets[0] = offset
@@ -0,0 +1,79 @@
+import cProfile
+import itertools
+import logging
+import os
+import pstats
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """cProfile на кожному every-му виклику run(), статистика - агрегована.
+
+    Профілюється лише потік, що обробляє вибране оновлення. Після
+    flush_every профілів (або за flush()) сумарна статистика пишеться в
+    directory як .pstats, який відкривається pstats/snakeviz.
+    every=0 - вимкнено.
+    """
+
+    def __init__(self, every=0, directory="profiles", flush_every=100):
+        self.every = every
+        self.directory = directory
+        self.flush_every = flush_every
+        self.files = []
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stats = None
+        self._samples = 0
+
+    def run(self, fn, *args):
+        every = self.every
+        if not every or next(self._counter) % every:
+            return fn(*args)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Цей потік уже профілюється
+            return fn(*args)
+        try:
+            return fn(*args)
+        finally:
+            profile.disable()
+            self._add(profile)
+
+    def _add(self, profile):
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self._samples += 1
+            if self._samples >= self.flush_every:
+                self._flush()
+
+    def flush(self):
+        """Записує накопичене; шлях до файлу або None, якщо нічого не було"""
+        with self._lock:
+            return self._flush()
+
+    def _flush(self):
+        stats, samples = self._stats, self._samples
+        self._stats, self._samples = None, 0
+        if stats is None:
+            return None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"profile-{datetime.now():%Y%m%d-%H%M%S}-{samples}.pstats")
+            stats.dump_stats(path)
+        except OSError as e:
+            logger.error(f"[PROFILE] Не вдалося записати профіль: {e}")
+            return None
+        self.files.append(path)
+        logger.info(f"[PROFILE] {samples} профілів → {path}")
+        return path
+
+    def settings(self):
+        return {"every": self.every, "pending": self._samples, "files": self.files[-10:]}
@@ -0,0 +1,127 @@
+import threading
+
+
+class Message:
+    """Вхідне повідомлення в зручному для обробників вигляді"""
+
+    __slots__ = ("raw", "chat_id", "user_id", "text", "command")
+
+    def __init__(self, msg):
+        self.raw = msg
+        self.chat_id = msg.get("chat", {}).get("id")
+        self.user_id = msg.get("from", {}).get("id")
+        self.text = msg.get("text", "") or ""
+        self.command = self.text.strip()
+
+
+class CallbackQuery:
+    """Натискання inline-кнопки; arg - частина callback_data після префікса"""
+
+    __slots__ = ("raw", "id", "data", "arg", "from_id", "message", "chat_id", "message_id")
+
+    def __init__(self, cb):
+        self.raw = cb
+        self.id = cb.get("id")
+        self.data = cb.get("data", "")
+        self.arg = ""
+        self.from_id = cb["from"]["id"]
+        self.message = cb.get("message") or {}
+        self.chat_id = self.message.get("chat", {}).get("id")
+        self.message_id = self.message.get("message_id")
+
+
+class Router:
+    """Декларативна маршрутизація команд, кнопок меню, callback_data і станів.
+
+    Пошук маршруту - звернення до словника: команди за першим словом тексту,
+    кнопки меню за точним текстом, callback_data за точним значенням або
+    префіксом (перевіряється по одному словнику на кожну довжину префікса).
+    """
+
+    def __init__(self):
+        self._commands = {}
+        self._labels = {}
+        self._callbacks = {}
+        self._prefixes = {}
+        self._prefix_lengths = ()
+        self._states = {}
+        self._hits = {}
+        self._hits_lock = threading.Lock()
+
+    # ======= Реєстрація =======
+    def _register(self, table, key, route):
+        def decorator(fn):
+            table[key] = (route, fn)
+            self._hits.setdefault(route, 0)
+            return fn
+        return decorator
+
+    def command(self, name):
+        return self._register(self._commands, name, f"command:{name}")
+
+    def label(self, text):
+        return self._register(self._labels, text, f"label:{text}")
+
+    def callback(self, data):
+        return self._register(self._callbacks, data, f"callback:{data}")
+
+    def callback_prefix(self, prefix):
+        decorator = self._register(self._prefixes, prefix, f"callback:{prefix}*")
+        self._prefix_lengths = tuple(sorted({len(p) for p in self._prefixes} | {len(prefix)}, reverse=True))
+        return decorator
+
+    def state(self, status):
+        """Обробник повідомлення в стані замовлення; False - передати далі"""
+        return self._register(self._states, status, f"state:{getattr(status, 'value', status)}")
+
+    # ======= Диспетчеризація =======
+    def _hit(self, route):
+        with self._hits_lock:
+            self._hits[route] = self._hits.get(route, 0) + 1
+
+    def hits(self):
+        """Лічильники спрацювань по кожному маршруту"""
+        with self._hits_lock:
+            return dict(self._hits)
+
+    def dispatch_state(self, status, message, *args):
+        entry = self._states.get(status)
+        if entry is None:
+            return False
+        route, fn = entry
+        if fn(message, *args) is False:
+            return False
+        self._hit(route)
+        return True
+
+    def dispatch_text(self, message):
+        """Команда або кнопка меню; False, якщо текст не є жодною з них"""
+        text = message.command
+        if not text:
+            return False
+        entry = self._labels.get(text)
+        if entry is None and text.startswith("/"):
+            entry = self._commands.get(text.split(maxsplit=1)[0])
+        if entry is None:
+            return False
+        route, fn = entry
+        self._hit(route)
+        fn(message)
+        return True
+
+    def dispatch_callback(self, query):
+        data = query.data
+        entry = self._callbacks.get(data)
+        if entry is None:
+            for length in self._prefix_lengths:
+                entry = self._prefixes.get(data[:length])
+                if entry is not None:
+                    query.arg = data[length:]
+                    break
+        if entry is None:
+            self._hit("callback:unmatched")
+            return False
+        route, fn = entry
+        self._hit(route)
+        fn(query)
+        return True
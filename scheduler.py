@@ -0,0 +1,144 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledJob:
+    """Запланований виклик; cancel() скасовує наступні запуски"""
+
+    __slots__ = ("name", "fn", "args", "interval", "jitter", "when", "runs", "cancelled")
+
+    def __init__(self, name, fn, args, interval, jitter, when):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.interval = interval
+        self.jitter = jitter
+        self.when = when
+        self.runs = 0
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _next_delay(self):
+        if not self.jitter:
+            return self.interval
+        return max(0.0, self.interval + random.uniform(-self.jitter, self.jitter))
+
+
+class Scheduler:
+    """Таймери на одному потоці: купа (час, порядковий номер, задача).
+
+    call_later - одноразовий виклик, call_every - повторюваний з jitter.
+    Задачі виконуються прямо в потоці планувальника, тому мають бути
+    короткими; довгу роботу слід передати в пул. Скасовані задачі
+    лишаються в купі до свого часу і просто пропускаються. lag - наскільки
+    пізніше запланованого задача реально стартувала.
+    """
+
+    def __init__(self, name="scheduler"):
+        self.name = name
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._thread = None
+        self._stopping = False
+        self.runs = 0
+        self.errors = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    # ======= Публічний API =======
+    def call_later(self, delay, fn, *args, name=None):
+        return self._add(ScheduledJob(name or fn.__name__, fn, args, None, 0, time.monotonic() + delay))
+
+    def call_every(self, interval, fn, *args, jitter=0, first=None, name=None):
+        """Повторює fn кожні interval ± jitter секунд; перший раз через first (або один інтервал)"""
+        job = ScheduledJob(name or fn.__name__, fn, args, interval, jitter, 0)
+        job.when = time.monotonic() + (job._next_delay() if first is None else first)
+        return self._add(job)
+
+    def pending(self):
+        with self._cond:
+            return sum(1 for _, _, job in self._heap if not job.cancelled)
+
+    def stats(self):
+        return {
+            "pending": self.pending(),
+            "runs": self.runs,
+            "errors": self.errors,
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+        }
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=2):
+        with self._cond:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._stopping = True
+            self._cond.notify()
+        thread.join(timeout)
+
+    # ======= Потік планувальника =======
+    def _add(self, job):
+        if self._thread is None:
+            self.start()
+        with self._cond:
+            heapq.heappush(self._heap, (job.when, next(self._seq), job))
+            if self._heap[0][2] is job:
+                self._cond.notify()
+        return job
+
+    def _take(self):
+        """Блокує до настання часу найближчої задачі; None - зупинка"""
+        with self._cond:
+            while not self._stopping:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                when, _, job = self._heap[0]
+                if job.cancelled:
+                    heapq.heappop(self._heap)
+                    continue
+                now = time.monotonic()
+                if when > now:
+                    self._cond.wait(when - now)
+                    continue
+                heapq.heappop(self._heap)
+                return job, now - when
+            return None
+
+    def _run(self):
+        while True:
+            taken = self._take()
+            if taken is None:
+                return
+            job, lag = taken
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            try:
+                job.fn(*job.args)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"[SCHEDULER] Помилка задачі {job.name}: {e}", exc_info=True)
+            job.runs += 1
+            self.runs += 1
+            if job.interval is not None and not job.cancelled:
+                job.when = time.monotonic() + job._next_delay()
+                with self._cond:
+                    heapq.heappush(self._heap, (job.when, next(self._seq), job))
@@ -0,0 +1,124 @@
+import logging
+import uuid
+from enum import Enum
+
+logger = logging.getLogger(__name__)
+
+
+class OrderStatus(str, Enum):
+    WAITING_LINK = "waiting_link"
+    WAITING_DELIVERY = "waiting_delivery"
+    WAITING_PHONE = "waiting_phone"
+    WAITING_CONFIRMATION = "waiting_confirmation"
+
+
+class ChatStatus(str, Enum):
+    PENDING = "pending"
+    ACTIVE = "active"
+
+
+class OrderSession:
+    """Замовлення, яке клієнт оформлює зараз"""
+
+    __slots__ = ("order_id", "status", "link", "product", "delivery", "phone", "username")
+
+    # Ключі, з якими замовлення зберігались раніше (dict з українськими ключами)
+    _LEGACY_KEYS = {"посилання": "link", "доставка": "delivery", "номер телефону": "phone"}
+
+    def __init__(self, status=OrderStatus.WAITING_LINK, link=None, delivery=None,
+                 phone=None, username=None, order_id=None, product=None):
+        # Ключ ідемпотентності для підтвердження замовлення
+        self.order_id = order_id or uuid.uuid4().hex[:12]
+        self.status = status
+        self.link = link
+        # Товар з каталогу, знайдений за посиланням чи назвою (текст для адміна)
+        self.product = product
+        self.delivery = delivery
+        self.phone = phone
+        self.username = username
+
+    def to_dict(self):
+        return {
+            "order_id": self.order_id,
+            "status": self.status.value,
+            "link": self.link,
+            "product": self.product,
+            "delivery": self.delivery,
+            "phone": self.phone,
+            "username": self.username,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        for old, new in cls._LEGACY_KEYS.items():
+            if old in data:
+                data[new] = data.pop(old)
+        return cls(
+            status=OrderStatus(data.get("status", OrderStatus.WAITING_LINK)),
+            link=data.get("link"),
+            delivery=data.get("delivery"),
+            phone=data.get("phone"),
+            username=data.get("username"),
+            order_id=data.get("order_id"),
+            product=data.get("product"),
+        )
+
+
+class ChatSession:
+    """Звернення клієнта до адміністратора"""
+
+    __slots__ = ("status", "operator")
+
+    def __init__(self, status=ChatStatus.PENDING, operator=None):
+        self.status = status
+        self.operator = operator
+
+    @property
+    def is_active(self):
+        return self.status is ChatStatus.ACTIVE
+
+    def to_dict(self):
+        return {"status": self.status.value, "operator": self.operator}
+
+    @classmethod
+    def from_dict(cls, data):
+        # Раніше статус зберігався просто рядком
+        if isinstance(data, str):
+            return cls(ChatStatus(data))
+        return cls(ChatStatus(data["status"]), data.get("operator"))
+
+
+class SessionSweeper:
+    """Прибирає сесії, які простоювали довше TTL; sweep() викликає планувальник"""
+
+    def __init__(self):
+        self._registries = []
+        self.expired = {}
+
+    def register(self, name, mapping, idle_ttl):
+        self._registries.append((name, mapping, idle_ttl))
+        self.expired[name] = 0
+
+    def sweep(self):
+        for name, mapping, idle_ttl in self._registries:
+            try:
+                removed = mapping.expire(idle_ttl)
+            except Exception as e:
+                logger.error(f"[SESSIONS] Помилка прибирання {name}: {e}")
+                continue
+            if removed:
+                self.expired[name] += removed
+                logger.info(f"[SESSIONS] {name}: видалено {removed} неактивних сесій")
+
+    def stats(self):
+        """Лічильники по кожному реєстру: live, cached, evicted, expired"""
+        return {
+            name: {
+                "live": len(mapping),
+                "cached": mapping.cached(),
+                "evicted": mapping.evicted,
+                "expired": self.expired[name],
+            }
+            for name, mapping, _ in self._registries
+        }
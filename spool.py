@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import threading
+from collections import Counter, deque
+
+from outbound import OutboundJob
+from telegram_api import TelegramAPIError
+
+logger = logging.getLogger(__name__)
+
+# Відповіді, після яких повторювати запис немає сенсу (чат видалено, бота заблоковано)
+REJECT_CODES = frozenset((400, 403))
+
+# Методи, які має сенс доставити пізніше; відповіді на кнопки і редагування застарівають
+SPOOL_METHODS = frozenset((
+    "sendMessage", "copyMessage", "sendMediaGroup",
+    "sendPhoto", "sendDocument", "sendVideo", "sendAudio", "sendVoice",
+))
+
+
+class SpooledError(Exception):
+    """Виклик записано в журнал: для цього чату вже є недоставлені повідомлення"""
+
+
+class SpoolEntry:
+    __slots__ = ("chat_id", "method", "payload", "end")
+
+    def __init__(self, chat_id, method, payload, end):
+        self.chat_id = chat_id
+        self.method = method
+        self.payload = payload
+        self.end = end
+
+
+class OutboundSpool:
+    """Журнал недоставлених викликів на диску: JSON-рядки, лише дописування.
+
+    Кожен запис скидається на диск (fsync) до того, як виклик вважається
+    відкладеним. Позиція першого недоставленого запису зберігається в
+    <path>.pos; коли журнал повністю доставлено, обидва файли обнуляються.
+    Після перезапуску load() підхоплює недоставлений хвіст.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pos_path = path + ".pos"
+        self.on_append = None
+        self._lock = threading.Lock()
+        self._entries = deque()
+        self._chats = Counter()
+        self._file = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def pending_for(self, chat_id):
+        return self._chats.get(chat_id, 0)
+
+    def accepts(self, job):
+        """Чи можна відкласти виклик у журнал (повтори з журналу - ні).
+
+        Виклик з callback - лише позначений spoolable: callback отримає
+        помилку одразу, а сам виклик буде доставлено з журналу пізніше.
+        """
+        return (not job.replay and (job.callback is None or job.spoolable)
+                and job.method in SPOOL_METHODS)
+
+    def hold(self, job):
+        """SpooledError, якщо для чату вже є недоставлені записи - виклик має стати за ними.
+
+        spoolable-виклик, який не можна записати в журнал (редагування),
+        теж відхиляється, щоб не обігнати відкладене.
+        """
+        if self._chats and self._chats[job.chat_id] > 0 and (self.accepts(job) or job.spoolable):
+            return SpooledError(f"{job.method} → {job.chat_id}: чекає на доставку журналу")
+        return None
+
+    def load(self):
+        try:
+            with open(self.pos_path, encoding="utf-8") as f:
+                cursor = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            cursor = 0
+        entries = deque()
+        try:
+            with open(self.path, "r+b") as f:
+                f.seek(cursor)
+                good = cursor
+                for line in iter(f.readline, b""):
+                    if not line.endswith(b"\n"):
+                        break
+                    good = f.tell()
+                    try:
+                        data = json.loads(line)
+                    except ValueError:
+                        continue
+                    entries.append(SpoolEntry(data["chat_id"], data["method"], data["payload"], good))
+                # Недописаний після аварії рядок не має склеїтись з наступним записом
+                f.truncate(good)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._entries = entries
+            self._chats = Counter(e.chat_id for e in entries)
+        if entries:
+            logger.warning(f"[SPOOL] Недоставлених викликів у журналі: {len(entries)}")
+
+    def append(self, job):
+        payload = json.loads(job.payload) if isinstance(job.payload, bytes) else job.payload
+        line = json.dumps({"chat_id": job.chat_id, "method": job.method, "payload": payload},
+                          ensure_ascii=False).encode("utf-8") + b"\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "ab")
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._entries.append(SpoolEntry(job.chat_id, job.method, payload, self._file.tell()))
+            self._chats[job.chat_id] += 1
+        if self.on_append is not None:
+            self.on_append()
+
+    def peek(self):
+        with self._lock:
+            return self._entries[0] if self._entries else None
+
+    def ack(self, entry):
+        """Запис доставлено (або відкинуто) - зсуває позицію журналу"""
+        with self._lock:
+            if not self._entries or self._entries[0] is not entry:
+                return
+            self._entries.popleft()
+            self._chats[entry.chat_id] -= 1
+            if self._chats[entry.chat_id] <= 0:
+                del self._chats[entry.chat_id]
+            if self._entries:
+                self._write_pos(entry.end)
+                return
+            # Усе доставлено - журнал починається заново
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            open(self.path, "wb").close()
+            self._write_pos(0)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write_pos(self, cursor):
+        tmp = self.pos_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(str(cursor))
+        os.replace(tmp, self.pos_path)
+
+
+class SpoolReplayer:
+    """Доставляє журнал по одному запису строго по порядку.
+
+    Кожен запис іде через звичайну чергу відправки (ліміти, запобіжник);
+    при збої Bot API наступна спроба - через backoff, що подвоюється до
+    max_backoff, після 429 - через retry_after. Відкидається лише запис,
+    який Telegram відхилив (400, 403).
+    Кроки плануються в спільному планувальнику.
+    """
+
+    def __init__(self, spool, outbound, scheduler, backoff=1.0, max_backoff=60.0):
+        self.spool = spool
+        self.outbound = outbound
+        self.scheduler = scheduler
+        self.initial_backoff = backoff
+        self.max_backoff = max_backoff
+        self.delivered = 0
+        self.dropped = 0
+        self._backoff = backoff
+        self._lock = threading.Lock()
+        self._active = False
+
+    def kick(self):
+        """Запускає доставку, якщо вона ще не йде"""
+        with self._lock:
+            if self._active:
+                return
+            self._active = True
+        self.scheduler.call_later(0, self._step, name="spool-replay")
+
+    def _step(self):
+        with self._lock:
+            entry = self.spool.peek()
+            if entry is None:
+                self._active = False
+                return
+        job = OutboundJob(entry.chat_id, entry.method, entry.payload, callback=lambda j: self._done(entry, j))
+        job.replay = True
+        self.outbound.submit_job(job)
+
+    def _done(self, entry, job):
+        error = job.error
+        code = error.error_code if isinstance(error, TelegramAPIError) else None
+        if error is not None and code not in REJECT_CODES:
+            if code == 429:
+                # Після відновлення Telegram обмежує сплеск - запис лишається в журналі
+                delay = error.retry_after or 1
+            else:
+                delay, self._backoff = self._backoff, min(self._backoff * 2, self.max_backoff)
+            logger.warning(f"[SPOOL] Повтор через {delay:.0f} с: {error}")
+            self.scheduler.call_later(delay, self._step, name="spool-replay")
+            return
+        self._backoff = self.initial_backoff
+        if error is None:
+            self.delivered += 1
+        else:
+            self.dropped += 1
+            logger.error(f"[SPOOL] {entry.method} → {entry.chat_id} відкинуто: {error}")
+        self.spool.ack(entry)
+        self._step()
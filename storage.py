@@ -0,0 +1,305 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from sqlalchemy import (
+    BigInteger, Column, Float, MetaData, String, Table, Text, and_, create_engine, func, select,
+)
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+_DELETED = object()
+
+metadata = MetaData()
+
+# Один рядок на (простір імен, chat_id); первинний ключ дає індексований пошук
+state_table = Table(
+    "bot_state",
+    metadata,
+    Column("namespace", String(32), primary_key=True),
+    Column("key", BigInteger, primary_key=True, autoincrement=False),
+    Column("value", Text, nullable=False),
+    Column("updated_at", Float, nullable=False, index=True),
+)
+
+# Оброблені update_id та ключі ідемпотентності; переживають перезапуск
+claims_table = Table(
+    "processed_keys",
+    metadata,
+    Column("key", String(128), primary_key=True),
+    Column("created_at", Float, nullable=False, index=True),
+)
+
+
+def normalize_database_url(url):
+    """Heroku віддає postgres://, а SQLAlchemy 1.4 чекає postgresql://"""
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+class StateStore:
+    """Сховище стану бота в Postgres/SQLite з пакетними комітами.
+
+    Записи накопичуються в пам'яті і комітяться фоновим потоком раз на
+    flush_interval (або одразу після batch_size змін), тому обробник
+    оновлення не чекає на базу. Незакомічені записи видно читанням
+    цього ж процесу.
+    """
+
+    def __init__(self, url, flush_interval=0.05, batch_size=200):
+        url = normalize_database_url(url)
+        kwargs = {"pool_pre_ping": True}
+        if url.startswith("sqlite"):
+            kwargs["connect_args"] = {"check_same_thread": False}
+        self.engine = create_engine(url, **kwargs)
+        metadata.create_all(self.engine)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self._pending = {}
+        self._inflight = {}
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    # ======= Читання =======
+    def get(self, namespace, key):
+        """Повертає десеріалізоване значення або _DELETED, якщо запису немає"""
+        ident = (namespace, key)
+        with self._lock:
+            for buf in (self._pending, self._inflight):
+                if ident in buf:
+                    return buf[ident]
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(state_table.c.value).where(and_(
+                    state_table.c.namespace == namespace,
+                    state_table.c.key == key,
+                ))
+            ).first()
+        return _DELETED if row is None else json.loads(row[0])
+
+    def keys(self, namespace):
+        self.flush()
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(state_table.c.key).where(state_table.c.namespace == namespace)
+            )
+            return [r[0] for r in rows]
+
+    def items(self, namespace):
+        """[(key, значення)] усього простору імен"""
+        self.flush()
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(state_table.c.key, state_table.c.value).where(state_table.c.namespace == namespace)
+            )
+            return [(r[0], json.loads(r[1])) for r in rows]
+
+    def count(self, namespace):
+        self.flush()
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(func.count()).select_from(state_table).where(state_table.c.namespace == namespace)
+            ).scalar()
+
+    def expire(self, namespace, cutoff):
+        """Видаляє записи простору імен, змінені раніше за cutoff (unix time)"""
+        self.flush()
+        with self.engine.begin() as conn:
+            result = conn.execute(state_table.delete().where(and_(
+                state_table.c.namespace == namespace,
+                state_table.c.updated_at < cutoff,
+            )))
+            return result.rowcount
+
+    # ======= Ключі ідемпотентності =======
+    def claim(self, key):
+        """Атомарно реєструє ключ; False, якщо його вже зареєстровано раніше"""
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(claims_table.insert(), {"key": key, "created_at": time.time()})
+            return True
+        except IntegrityError:
+            return False
+
+    def release(self, key):
+        with self.engine.begin() as conn:
+            conn.execute(claims_table.delete().where(claims_table.c.key == key))
+
+    def expire_claims(self, cutoff):
+        with self.engine.begin() as conn:
+            return conn.execute(claims_table.delete().where(claims_table.c.created_at < cutoff)).rowcount
+
+    # ======= Запис =======
+    def put(self, namespace, key, value):
+        self._enqueue((namespace, key), value)
+
+    def delete(self, namespace, key):
+        self._enqueue((namespace, key), _DELETED)
+
+    def _enqueue(self, ident, value):
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            self._pending[ident] = value
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Синхронно комітить усе накопичене"""
+        with self._commit_lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._inflight.update(batch)
+        if not batch:
+            return
+        try:
+            self._commit(batch)
+        except Exception as e:
+            logger.error(f"[STORE] Помилка коміту {len(batch)} змін: {e}")
+            with self._lock:
+                for ident, value in batch.items():
+                    self._pending.setdefault(ident, value)
+        finally:
+            with self._lock:
+                for ident, value in batch.items():
+                    if self._inflight.get(ident) is value:
+                        del self._inflight[ident]
+
+    def _commit(self, batch):
+        now = time.time()
+        rows = []
+        with self.engine.begin() as conn:
+            by_namespace = {}
+            for (namespace, key), value in batch.items():
+                by_namespace.setdefault(namespace, []).append(key)
+                if value is not _DELETED:
+                    rows.append({
+                        "namespace": namespace,
+                        "key": key,
+                        "value": json.dumps(value, ensure_ascii=False),
+                        "updated_at": now,
+                    })
+            for namespace, keys in by_namespace.items():
+                conn.execute(state_table.delete().where(and_(
+                    state_table.c.namespace == namespace,
+                    state_table.c.key.in_(keys),
+                )))
+            if rows:
+                conn.execute(state_table.insert(), rows)
+
+    # ======= Фоновий потік =======
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="state-store", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        thread.join(timeout)
+        self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+class StoreMapping(MutableMapping):
+    """Словник поверх StateStore з write-through LRU-кешем у процесі.
+
+    Бот працює одним процесом, тож кеш точний: значення (і відсутність
+    ключа) читається з бази один раз, а далі його змінюють лише записи
+    через цей словник і expire(). Кеш обмежений max_cached записами,
+    найдавніше використані витісняються. encode/decode перетворюють
+    значення в JSON-сумісний вигляд і назад; змінене значення треба
+    записати назад через [] =.
+    """
+
+    def __init__(self, store, namespace, max_cached=10000, encode=None, decode=None):
+        self.store = store
+        self.namespace = namespace
+        self.max_cached = max_cached
+        self.encode = encode
+        self.decode = decode
+        self.evicted = 0
+        self._lock = threading.Lock()
+        # key -> (значення або _DELETED, час запису; None - прочитано з бази)
+        self._cache = OrderedDict()
+
+    def __getitem__(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+        if entry is None:
+            value = self.store.get(self.namespace, key)
+            if value is not _DELETED and self.decode is not None:
+                value = self.decode(value)
+            entry = self._remember(key, (value, None), loaded=True)
+        if entry[0] is _DELETED:
+            raise KeyError(key)
+        return entry[0]
+
+    def __setitem__(self, key, value):
+        self._remember(key, (value, time.time()))
+        self.store.put(self.namespace, key, value if self.encode is None else self.encode(value))
+
+    def __delitem__(self, key):
+        self[key]
+        self._remember(key, (_DELETED, time.time()))
+        self.store.delete(self.namespace, key)
+
+    def __iter__(self):
+        return iter(self.store.keys(self.namespace))
+
+    def __len__(self):
+        return self.store.count(self.namespace)
+
+    def cached(self):
+        return len(self._cache)
+
+    def _remember(self, key, entry, loaded=False):
+        with self._lock:
+            if loaded and key in self._cache:
+                # Поки читали базу, ключ записали - прочитане вже застаріло
+                return self._cache[key]
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+                self.evicted += 1
+        return entry
+
+    def expire(self, idle_ttl):
+        """Видаляє записи, що не змінювались idle_ttl секунд; повертає їх кількість"""
+        cutoff = time.time() - idle_ttl
+        removed = self.store.expire(self.namespace, cutoff)
+        if removed:
+            # Видалені рядки могли лежати в кеші; прочитані з бази без часу запису перечитаються
+            with self._lock:
+                stale = [k for k, (value, written) in self._cache.items()
+                         if value is not _DELETED and (written is None or written < cutoff)]
+                for key in stale:
+                    del self._cache[key]
+        return removed
@@ -0,0 +1,246 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from sessions import ChatSession, ChatStatus
+
+logger = logging.getLogger(__name__)
+
+
+class SupportDesk:
+    """Черга звернень клієнтів і розподіл чатів між операторами.
+
+    Звернення чекають у черзі за пріоритетом (менше - раніше, в межах одного
+    пріоритету FIFO) і призначаються найменш завантаженому оператору, поки
+    в нього менше max_chats чатів. Маршрути клієнт → оператор і
+    оператор → клієнт, якому він зараз відповідає, - звичайні словники,
+    тож пересилання в обидва боки коштує O(1).
+
+    Таблиці живуть у пам'яті процесу, тож бот працює одним процесом
+    (один воркер gunicorn або python bot.py); sessions (клієнт → ChatSession) і focus
+    (оператор → клієнт) лише дублюють їх, щоб restore() відновив розподіл
+    після перезапуску. on_assign(client_id, operator_id)
+    викликається поза замком для кожного нового призначення.
+    """
+
+    def __init__(self, operators, max_chats, sessions, focus, on_assign=None, queue_ttl=None):
+        self.operators = tuple(dict.fromkeys(operators))
+        self.max_chats = max(1, max_chats)
+        self.queue_ttl = queue_ttl
+        self.sessions = sessions
+        self.focus_map = focus
+        self.on_assign = on_assign
+        self.paused = False
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._queue = []
+        self._queued = {}
+        self._seq = itertools.count()
+        self._route = {}
+        self._clients = {op: set() for op in self.operators}
+        self._focus = {}
+        self._touched = {}
+
+    # ======= Запити =======
+    def is_operator(self, user_id):
+        return user_id in self._clients
+
+    def __contains__(self, client_id):
+        return client_id in self._route or client_id in self._queued
+
+    def __len__(self):
+        return len(self._route) + len(self._queued)
+
+    def cached(self):
+        return len(self._touched)
+
+    def operator_of(self, client_id):
+        """Оператор активного чату клієнта або None"""
+        operator_id = self._route.get(client_id)
+        if operator_id is not None:
+            self._touched[client_id] = time.monotonic()
+        return operator_id
+
+    def target_of(self, operator_id):
+        """Клієнт, якому оператор зараз відповідає, або None"""
+        client_id = self._focus.get(operator_id)
+        if client_id is not None:
+            self._touched[client_id] = time.monotonic()
+        return client_id
+
+    def load(self, operator_id):
+        return len(self._clients.get(operator_id, ()))
+
+    def pending_clients(self):
+        """Клієнти в черзі в порядку призначення"""
+        with self._lock:
+            return [c for _, seq, c in sorted(self._queue) if self._queued.get(c) == seq]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._queued),
+                "active": len(self._route),
+                "operators": {op: len(c) for op, c in self._clients.items()},
+            }
+
+    # ======= Зміни =======
+    def request(self, client_id, priority=0):
+        """Ставить звернення в чергу; False, якщо клієнт уже чекає або в чаті"""
+        with self._lock:
+            if client_id in self._route or client_id in self._queued:
+                return False
+            self._enqueue(client_id, priority)
+            self.sessions[client_id] = ChatSession(ChatStatus.PENDING)
+            assigned = self._assign_pending()
+        self._announce(assigned)
+        return True
+
+    def focus(self, operator_id, client_id):
+        """Перемикає оператора на клієнта; клієнта з черги оператор забирає собі"""
+        with self._lock:
+            if client_id in self._queued:
+                del self._queued[client_id]
+                self._assign(client_id, operator_id)
+            elif self._route.get(client_id) != operator_id:
+                return False
+            self._set_focus(operator_id, client_id)
+            return True
+
+    def pause(self):
+        """Нові звернення лише стають у чергу (наприклад, поза робочим часом)"""
+        with self._lock:
+            self.paused = True
+
+    def resume(self):
+        with self._lock:
+            self.paused = False
+            assigned = self._assign_pending()
+        self._announce(assigned)
+
+    def unfocus(self, operator_id):
+        with self._lock:
+            if self._focus.pop(operator_id, None) is not None:
+                self.focus_map.pop(operator_id, None)
+
+    def close(self, client_id):
+        """Завершує звернення; повертає оператора чату (None, якщо ще чекало)"""
+        with self._lock:
+            operator_id = self._drop(client_id)
+            assigned = self._assign_pending() if operator_id is not None else ()
+        self._announce(assigned)
+        return operator_id
+
+    def expire(self, idle_ttl):
+        """Закриває чати без активності довше idle_ttl секунд.
+
+        Звернення в черзі мають власний queue_ttl: поза робочим часом вони
+        чекають до відкриття (з п'ятниці до понеділка - довше за добу), але
+        не вічно, щоб давно покинуті не займали місця операторів.
+        None - звернення в черзі не застарівають.
+        """
+        now = time.monotonic()
+        cutoff = now - idle_ttl
+        queue_cutoff = None if self.queue_ttl is None else now - self.queue_ttl
+        with self._lock:
+            stale = [c for c, t in self._touched.items()
+                     if (queue_cutoff is not None and t < queue_cutoff if c in self._queued else t < cutoff)]
+            for client_id in stale:
+                self._drop(client_id)
+            assigned = self._assign_pending()
+        self._announce(assigned)
+        return len(stale)
+
+    def restore(self):
+        """Відновлює черги і маршрути зі збережених сесій"""
+        with self._lock:
+            for client_id in list(self.sessions):
+                session = self.sessions.get(client_id)
+                if session is None:
+                    continue
+                operator_id = session.operator if session.is_active else None
+                if operator_id in self._clients:
+                    self._route[client_id] = operator_id
+                    self._clients[operator_id].add(client_id)
+                    self._touched[client_id] = time.monotonic()
+                else:
+                    # Оператора прибрали з конфігурації - чат повертається в чергу
+                    self._enqueue(client_id, 0)
+                    self.sessions[client_id] = ChatSession(ChatStatus.PENDING)
+            for operator_id in self.operators:
+                client_id = self.focus_map.get(operator_id)
+                if client_id is not None and self._route.get(client_id) == operator_id:
+                    self._focus[operator_id] = client_id
+            assigned = self._assign_pending()
+        logger.info(f"[DESK] Відновлено {len(self._route)} чатів, у черзі {len(self._queued)}")
+        self._announce(assigned)
+
+    # ======= Внутрішнє (під замком) =======
+    def _enqueue(self, client_id, priority):
+        seq = next(self._seq)
+        self._queued[client_id] = seq
+        self._touched[client_id] = time.monotonic()
+        heapq.heappush(self._queue, (priority, seq, client_id))
+
+    def _drop(self, client_id):
+        self._touched.pop(client_id, None)
+        self.sessions.pop(client_id, None)
+        if self._queued.pop(client_id, None) is not None:
+            return None
+        operator_id = self._route.pop(client_id, None)
+        if operator_id is None:
+            return None
+        self._clients[operator_id].discard(client_id)
+        if self._focus.get(operator_id) == client_id:
+            del self._focus[operator_id]
+            self.focus_map.pop(operator_id, None)
+        return operator_id
+
+    def _least_loaded(self):
+        best = None
+        for operator_id, clients in self._clients.items():
+            if len(clients) < self.max_chats and (best is None or len(clients) < len(self._clients[best])):
+                best = operator_id
+        return best
+
+    def _assign(self, client_id, operator_id):
+        self._route[client_id] = operator_id
+        self._clients[operator_id].add(client_id)
+        self._touched[client_id] = time.monotonic()
+        self.sessions[client_id] = ChatSession(ChatStatus.ACTIVE, operator_id)
+        if operator_id not in self._focus:
+            self._set_focus(operator_id, client_id)
+
+    def _set_focus(self, operator_id, client_id):
+        self._focus[operator_id] = client_id
+        self.focus_map[operator_id] = client_id
+
+    def _assign_pending(self):
+        assigned = []
+        if self.paused:
+            return assigned
+        while self._queue:
+            priority, seq, client_id = self._queue[0]
+            if self._queued.get(client_id) != seq:
+                # Звернення вже закрите або забране оператором вручну
+                heapq.heappop(self._queue)
+                continue
+            operator_id = self._least_loaded()
+            if operator_id is None:
+                break
+            heapq.heappop(self._queue)
+            del self._queued[client_id]
+            self._assign(client_id, operator_id)
+            assigned.append((client_id, operator_id))
+        return assigned
+
+    def _announce(self, assigned):
+        if self.on_assign is None:
+            return
+        for client_id, operator_id in assigned:
+            try:
+                self.on_assign(client_id, operator_id)
+            except Exception as e:
+                logger.error(f"[DESK] Помилка сповіщення про призначення {client_id}: {e}", exc_info=True)
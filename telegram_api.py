@@ -0,0 +1,102 @@
+import logging
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = "https://api.telegram.org"
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+class TelegramAPIError(Exception):
+    """Помилка, яку повернув Bot API (ok=false або HTTP-помилка)"""
+
+    def __init__(self, method, error_code, description, retry_after=None):
+        super().__init__(f"{method}: [{error_code}] {description}")
+        self.method = method
+        self.error_code = error_code
+        self.description = description
+        self.retry_after = retry_after
+
+
+class TelegramClient:
+    """Клієнт Bot API зі спільним пулом keep-alive з'єднань.
+
+    on_call(method, seconds, error) викликається після кожного виклику
+    (error - виняток або None), наприклад для метрик.
+    """
+
+    def __init__(self, token, pool_size=16, connect_timeout=3.05, read_timeout=8,
+                 api_url=DEFAULT_API_URL, on_call=None):
+        self.base_url = f"{api_url.rstrip('/')}/bot{token}/"
+        self.timeout = (connect_timeout, read_timeout)
+        self.on_call = on_call
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def call(self, method, payload=None, timeout=None):
+        """Викликає метод Bot API і повертає поле result.
+
+        payload - dict або вже закодоване JSON-тіло (bytes).
+        """
+        with span("telegram", method=method):
+            if self.on_call is None:
+                return self._call(method, payload, timeout)
+            started = time.perf_counter()
+            error = None
+            try:
+                return self._call(method, payload, timeout)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self.on_call(method, time.perf_counter() - started, error)
+
+    def _call(self, method, payload, timeout):
+        if isinstance(payload, bytes):
+            resp = self.session.post(
+                self.base_url + method,
+                data=payload,
+                headers=JSON_HEADERS,
+                timeout=timeout or self.timeout,
+            )
+        else:
+            resp = self.session.post(
+                self.base_url + method,
+                json=payload or {},
+                timeout=timeout or self.timeout,
+            )
+        try:
+            data = resp.json()
+        except ValueError:
+            resp.raise_for_status()
+            raise TelegramAPIError(method, resp.status_code, "non-JSON response")
+        if not data.get("ok"):
+            params = data.get("parameters") or {}
+            raise TelegramAPIError(
+                method,
+                data.get("error_code", resp.status_code),
+                data.get("description", ""),
+                retry_after=params.get("retry_after"),
+            )
+        return data.get("result")
+
+    def close(self):
+        self.session.close()
+
+    # ======= Вебхук =======
+    def set_webhook(self, url, allowed_updates=None):
+        payload = {"url": url}
+        if allowed_updates is not None:
+            payload["allowed_updates"] = allowed_updates
+        return self.call("setWebhook", payload, timeout=10)
+
+    def delete_webhook(self):
+        return self.call("deleteWebhook", timeout=10)
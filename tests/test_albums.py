@@ -0,0 +1,35 @@
+from albums import MediaGroupBuffer
+
+
+class Timer:
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class ManualScheduler:
+    def __init__(self):
+        self.timers = []
+
+    def call_later(self, delay, fn, *args, name=None):
+        timer = Timer()
+        self.timers.append((timer, fn, args))
+        return timer
+
+
+def test_pending_album_is_flushed_before_next_message_of_its_sender():
+    scheduler = ManualScheduler()
+    buffer = MediaGroupBuffer(scheduler, window=1.0)
+    sent = []
+    buffer.add(("g1", 100), {"message_id": 1}, sent.append, source=7)
+    buffer.add(("g1", 100), {"message_id": 2}, sent.append, source=7)
+    buffer.add(("g2", 100), {"message_id": 3}, sent.append, source=8)
+    buffer.flush_source(7)
+    assert sent == [[{"message_id": 1}, {"message_id": 2}]]
+    # Таймер вікна вже нічого не відправить повторно
+    for timer, fn, args in scheduler.timers[:2]:
+        assert timer.cancelled
+        fn(*args)
+    assert len(sent) == 1
@@ -0,0 +1,36 @@
+from coalesce import NoticeCoalescer
+from outbound import OutboundJob
+
+ADMIN_ID = 99
+
+
+class Recorder:
+    """Запам'ятовує виклики; завершує їх тест через resolve()"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def send(self, key, text, callback):
+        return self._job("send", text, callback)
+
+    def edit(self, key, message_id, text, callback):
+        return self._job("edit", text, callback)
+
+    def _job(self, method, text, callback):
+        job = OutboundJob(ADMIN_ID, method, {"text": text}, callback)
+        self.jobs.append(job)
+        return job
+
+
+def test_failed_edit_resends_whole_notice():
+    calls = Recorder()
+    coalescer = NoticeCoalescer(calls.send, calls.edit, window=60)
+    coalescer.add("k", "header", "a")
+    calls.jobs[0].resolve({"message_id": 1})
+    coalescer.add("k", "header", "b")
+    calls.jobs[1].resolve(error=RuntimeError("outage"))
+    coalescer.add("k", "header", "c")
+    assert [(j.method, j.payload["text"]) for j in calls.jobs] == [
+        ("send", "header\na"), ("edit", "header\na\nb"), ("send", "header\na\nb")]
+    calls.jobs[2].resolve({"message_id": 2})
+    assert (calls.jobs[3].method, calls.jobs[3].payload["text"]) == ("edit", "header\na\nb\nc")
@@ -0,0 +1,12 @@
+from dedup import RecentKeys
+from storage import StateStore
+
+
+def test_forgotten_key_is_accepted_again(tmp_path):
+    store = StateStore(f"sqlite:///{tmp_path / 'state.db'}")
+    keys = RecentKeys(capacity=2, shared=store)
+    assert not keys.seen("update:1")
+    keys.forget("update:1")
+    assert not keys.seen("update:1")
+    assert keys.seen("update:1")
+    assert len(keys) == 1
@@ -0,0 +1,20 @@
+import threading
+
+from executor import POLICY_CALLER_RUNS, ChatExecutor
+
+
+def test_caller_runs_keeps_order_within_key():
+    executor = ChatExecutor(workers=1, max_pending=1, policy=POLICY_CALLER_RUNS)
+    release = threading.Event()
+    order = []
+    try:
+        assert executor.submit("a", lambda: (release.wait(5), order.append("a1")))
+        # Ключ "a" зайнятий - друга задача не може обігнати першу
+        assert not executor.submit("a", order.append, "a2")
+        # Для вільного ключа задача виконується в потоці, що викликає submit
+        assert executor.submit("b", order.append, "b1")
+        assert order == ["b1"]
+    finally:
+        release.set()
+        executor.stop()
+    assert order == ["b1", "a1"]
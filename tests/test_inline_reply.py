@@ -0,0 +1,29 @@
+from inline_reply import InlineReply
+from outbound import OutboundQueue
+
+ADMIN_ID = 99
+
+
+def finish_with(queue, chat_id, *calls):
+    slot = InlineReply(queue, targets=(chat_id,))
+    for target in calls or (chat_id,):
+        slot.capture(target, "sendMessage", {"chat_id": target, "text": "reply"})
+    slot.finish()
+    return slot.wait(0)
+
+
+def test_reply_is_inlined_only_when_chat_has_nothing_queued():
+    # Потоки не стартують - виклики лишаються в черзі
+    queue = OutboundQueue(client=None, workers=0)
+    assert finish_with(queue, 1) is not None
+    queue.submit(2, "sendMessage", {"chat_id": 2, "text": "earlier"})
+    assert finish_with(queue, 2) is None
+    assert queue.pending() == 2
+
+
+def test_notice_to_another_chat_stays_on_the_queue():
+    queue = OutboundQueue(client=None, workers=0)
+    body = finish_with(queue, 1, ADMIN_ID, 1)
+    assert body is not None and b'"chat_id":1' in body
+    assert finish_with(queue, 3, ADMIN_ID) is None
+    assert queue.pending() == 2
@@ -0,0 +1,34 @@
+from metrics import MetricsRegistry
+
+
+def test_collector_series_are_rendered_with_labels():
+    registry = MetricsRegistry()
+    hits = {"command:/start": 3, "label:📌 Про нас": 0}
+    registry.counter("bot_route_hits_total", "hits", ("route",)).set_collector(
+        lambda: {(route,): n for route, n in hits.items()})
+    text = registry.render()
+    assert "# TYPE bot_route_hits_total counter" in text
+    assert 'bot_route_hits_total{route="command:/start"} 3' in text
+    assert 'bot_route_hits_total{route="label:📌 Про нас"} 0' in text
+
+
+def test_function_counter_is_rendered_as_counter():
+    registry = MetricsRegistry()
+    registry.counter("bot_updates_rejected_total", "rejected").set_function(lambda: 4)
+    text = registry.render()
+    assert "# TYPE bot_updates_rejected_total counter" in text
+    assert "bot_updates_rejected_total 4" in text
+
+
+def test_shards_of_finished_threads_are_merged():
+    import threading
+
+    registry = MetricsRegistry()
+    histogram = registry.histogram("bot_http_request_seconds", "http", ("route",))
+    threads = [threading.Thread(target=histogram.labels("/webhook").observe, args=(0.01,)) for _ in range(200)]
+    for t in threads:
+        t.start()
+        t.join()
+    child = histogram.labels("/webhook")
+    assert len(child._data) <= 1
+    assert child.snapshot()[-1] == 200
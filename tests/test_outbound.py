@@ -0,0 +1,35 @@
+from circuit import CLOSED, CircuitBreaker
+from outbound import OutboundQueue
+from telegram_api import TelegramAPIError
+
+
+class ScriptedClient:
+    """Віддає заздалегідь задані відповіді по черзі, далі - успіх"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def call(self, method, payload=None):
+        self.calls.append((method, payload))
+        response = self.responses.pop(0) if self.responses else {"ok": True}
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def test_probe_answered_with_429_releases_breaker():
+    breaker = CircuitBreaker(window=5, threshold=0.5, min_calls=1, reset_after=0.01)
+    breaker.record(False)
+    client = ScriptedClient(TelegramAPIError("sendMessage", 429, "Too Many Requests", retry_after=0.01))
+    queue = OutboundQueue(client, workers=1, chat_rate=1000, chat_burst=100, breaker=breaker)
+    queue.start()
+    try:
+        jobs = [queue.submit(i, "sendMessage", {"chat_id": i, "text": "x"}) for i in range(3)]
+        for job in jobs:
+            job.wait(5)
+        assert all(job.done and job.error is None for job in jobs)
+        assert breaker.state == CLOSED
+        assert queue.pending() == 0
+    finally:
+        queue.stop()
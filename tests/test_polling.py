@@ -0,0 +1,49 @@
+import threading
+
+from executor import ChatExecutor
+from polling import LongPoller
+
+
+class OneBatchClient:
+    timeout = (3, 10)
+
+    def __init__(self, poller_ref, updates):
+        self.poller_ref = poller_ref
+        self.updates = updates
+
+    def call(self, method, payload=None, timeout=None):
+        updates, self.updates = self.updates, []
+        if not updates:
+            self.poller_ref[0].stop()
+        return updates
+
+
+def test_offset_advances_over_processed_prefix():
+    release = threading.Event()
+    offsets = {}
+    seen_offsets = []
+
+    def handler(update):
+        if update["update_id"] == 12:
+            release.wait(5)
+        seen_offsets.append(offsets.get(0))
+
+    executor = ChatExecutor(workers=3)
+    ref = []
+    updates = [{"update_id": i, "chat": i} for i in (10, 11, 12, 13)]
+    poller = LongPoller(OneBatchClient(ref, updates), executor, handler, lambda u: u["chat"], offsets)
+    ref.append(poller)
+    thread = threading.Thread(target=poller.run)
+    thread.start()
+    try:
+        for _ in range(200):
+            if len(seen_offsets) == 3:
+                break
+            threading.Event().wait(0.01)
+        # 12 ще обробляється: offset зупинився перед ним, хоча 13 уже готове
+        assert offsets[0] == 12
+    finally:
+        release.set()
+        thread.join(5)
+        executor.stop()
+    assert offsets[0] == 14
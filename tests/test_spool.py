@@ -0,0 +1,66 @@
+from outbound import OutboundJob
+from spool import OutboundSpool, SpoolReplayer
+from telegram_api import TelegramAPIError
+
+
+class ManualScheduler:
+    def __init__(self):
+        self.calls = []
+
+    def call_later(self, delay, fn, *args, name=None):
+        self.calls.append((delay, fn, args))
+
+
+class ScriptedQueue:
+    """Завершує кожен виклик наступною заданою помилкою (None - успіх)"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.sent = []
+
+    def submit_job(self, job):
+        self.sent.append(job.payload)
+        error = self.errors.pop(0) if self.errors else None
+        job.resolve(None if error else {"ok": True}, error)
+        return job
+
+
+def make_replayer(tmp_path, queue, scheduler, *texts):
+    spool = OutboundSpool(str(tmp_path / "spool.jsonl"))
+    for text in texts:
+        spool.append(OutboundJob(1, "sendMessage", {"chat_id": 1, "text": text}))
+    return spool, SpoolReplayer(spool, queue, scheduler)
+
+
+def test_rate_limited_entry_stays_in_spool(tmp_path):
+    scheduler = ManualScheduler()
+    queue = ScriptedQueue(TelegramAPIError("sendMessage", 429, "Too Many Requests", retry_after=7))
+    spool, replayer = make_replayer(tmp_path, queue, scheduler, "a", "b")
+    replayer._step()
+    assert len(spool) == 2 and replayer.dropped == 0
+    assert scheduler.calls[-1][0] == 7
+    scheduler.calls[-1][1]()
+    assert len(spool) == 0 and replayer.delivered == 2
+    assert [p["text"] for p in queue.sent] == ["a", "a", "b"]
+
+
+def test_rejected_entry_is_dropped(tmp_path):
+    scheduler = ManualScheduler()
+    queue = ScriptedQueue(TelegramAPIError("sendMessage", 403, "Forbidden: bot was blocked by the user"))
+    spool, replayer = make_replayer(tmp_path, queue, scheduler, "a", "b")
+    replayer._step()
+    assert len(spool) == 0
+    assert replayer.dropped == 1 and replayer.delivered == 1
+
+
+def test_spoolable_notice_waits_behind_spooled_messages(tmp_path):
+    spool = OutboundSpool(str(tmp_path / "spool.jsonl"))
+    callback = lambda job: None
+    notice = OutboundJob(1, "sendMessage", {"chat_id": 1, "text": "notice"}, callback, spoolable=True)
+    edit = OutboundJob(1, "editMessageText", {"chat_id": 1, "text": "notice"}, callback, spoolable=True)
+    plain = OutboundJob(1, "sendMessage", {"chat_id": 1, "text": "x"}, callback)
+    assert spool.accepts(notice) and not spool.accepts(edit) and not spool.accepts(plain)
+    assert spool.hold(notice) is None
+    spool.append(OutboundJob(1, "sendMessage", {"chat_id": 1, "text": "earlier"}))
+    assert spool.hold(notice) is not None and spool.hold(edit) is not None
+    assert spool.hold(plain) is None
@@ -0,0 +1,38 @@
+import time
+
+from storage import StateStore, StoreMapping
+
+
+class CountingStore(StateStore):
+    def __init__(self, url):
+        super().__init__(url)
+        self.reads = 0
+
+    def get(self, namespace, key):
+        self.reads += 1
+        return super().get(namespace, key)
+
+
+def test_missing_keys_are_cached_until_written(tmp_path):
+    store = CountingStore(f"sqlite:///{tmp_path / 'state.db'}")
+    orders = StoreMapping(store, "user_orders")
+    for _ in range(5):
+        assert orders.get(1) is None
+    assert store.reads == 1
+    orders[1] = {"status": "waiting_link"}
+    assert orders.get(1) == {"status": "waiting_link"}
+    assert store.reads == 1
+    store.stop()
+
+
+def test_expired_rows_leave_the_cache(tmp_path):
+    store = StateStore(f"sqlite:///{tmp_path / 'state.db'}")
+    orders = StoreMapping(store, "user_orders")
+    orders[1] = "old"
+    store.flush()
+    time.sleep(0.1)
+    orders[2] = "fresh"
+    store.flush()
+    assert orders.expire(0.05) == 1
+    assert orders.get(1) is None and orders.get(2) == "fresh"
+    store.stop()
@@ -0,0 +1,26 @@
+import time
+
+from support_desk import SupportDesk
+
+
+def test_queued_requests_outlive_the_chat_ttl_while_paused():
+    desk = SupportDesk([100], max_chats=1, sessions={}, focus={}, queue_ttl=3600)
+    desk.pause()
+    desk.request(1)
+    desk.request(2)
+    assert desk.expire(0) == 0
+    assert desk.pending_clients() == [1, 2]
+    desk.resume()
+    assert desk.operator_of(1) == 100
+    assert desk.pending_clients() == [2]
+    assert desk.expire(0) == 1
+    assert desk.operator_of(2) == 100
+
+
+def test_abandoned_queued_requests_expire_after_queue_ttl():
+    desk = SupportDesk([100], max_chats=1, sessions={}, focus={}, queue_ttl=0.01)
+    desk.pause()
+    desk.request(1)
+    time.sleep(0.02)
+    assert desk.expire(3600) == 1
+    assert desk.pending_clients() == []
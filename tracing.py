@@ -0,0 +1,141 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Span:
+    """Відрізок часу всередині оновлення з вкладеними відрізками"""
+
+    __slots__ = ("name", "attrs", "start", "end", "children")
+
+    def __init__(self, name, attrs, start):
+        self.name = name
+        self.attrs = attrs
+        self.start = start
+        self.end = None
+        self.children = []
+
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    def to_dict(self, origin):
+        data = {
+            "name": self.name,
+            "at_ms": round((self.start - origin) * 1000, 3),
+            "ms": round(self.duration() * 1000, 3),
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.children:
+            data["children"] = [child.to_dict(origin) for child in self.children]
+        return data
+
+    def render(self, origin, depth, lines):
+        attrs = " ".join(f"{k}={v}" for k, v in self.attrs.items())
+        lines.append(f"{'  ' * depth}{self.name} {self.duration() * 1000:.2f} ms"
+                     f" (+{(self.start - origin) * 1000:.2f}){' ' + attrs if attrs else ''}")
+        for child in self.children:
+            child.render(origin, depth + 1, lines)
+
+
+class Trace:
+    """Дерево відрізків одного оновлення; переходить з потоку вебхука в потік обробника.
+
+    Батьківський відрізок береться з contextvar потоку, тож відрізки з
+    різних потоків не плутаються, навіть якщо перекриваються в часі.
+    """
+
+    __slots__ = ("root", "_lock")
+
+    def __init__(self, name, **attrs):
+        self.root = Span(name, attrs, time.perf_counter())
+        self._lock = threading.Lock()
+
+    def add(self, parent, name, attrs):
+        child = Span(name, attrs, time.perf_counter())
+        with self._lock:
+            parent.children.append(child)
+        return child
+
+    def finish(self):
+        self.root.end = time.perf_counter()
+        return self.root.duration()
+
+    def to_dict(self):
+        with self._lock:
+            return self.root.to_dict(self.root.start)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            self.root.render(self.root.start, 0, lines)
+        return "\n".join(lines)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Відрізок у поточному дереві; без активного дерева нічого не робить"""
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    trace, parent = current
+    child = trace.add(parent, name, attrs)
+    token = _current.set((trace, child))
+    try:
+        yield
+    finally:
+        child.end = time.perf_counter()
+        _current.reset(token)
+
+
+@contextmanager
+def activate(trace):
+    """Робить trace поточним для цього потоку (None - нічого не змінює)"""
+    if trace is None:
+        yield
+        return
+    token = _current.set((trace, trace.root))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class Tracer:
+    """Трасування оновлень і збір повільних.
+
+    Поки slow_seconds не задано, start() повертає None і span() коштує
+    одну перевірку contextvar. Дерево оновлення, що тривало довше
+    slow_seconds, пишеться в лог і зберігається серед останніх keep.
+    """
+
+    def __init__(self, slow_seconds=None, keep=20):
+        self.slow_seconds = slow_seconds
+        self.recent = deque(maxlen=keep)
+        self.captured = 0
+
+    @property
+    def enabled(self):
+        return self.slow_seconds is not None
+
+    def start(self, name, **attrs):
+        return Trace(name, **attrs) if self.slow_seconds is not None else None
+
+    def finish(self, trace):
+        if trace is None:
+            return
+        seconds = trace.finish()
+        threshold = self.slow_seconds
+        if threshold is None or seconds < threshold:
+            return
+        self.captured += 1
+        self.recent.append(trace.to_dict())
+        logger.warning(f"[TRACE] Повільне оновлення: {seconds * 1000:.1f} ms\n{trace.render()}")
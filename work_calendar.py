@@ -0,0 +1,94 @@
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+# Пн-Чт 9:00-18:00, Пт 9:00-15:00, вихідні - зачинено
+DEFAULT_HOURS = "mon-thu 09:00-18:00; fri 09:00-15:00"
+
+_INTERVAL = re.compile(r"^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})$")
+
+
+def parse_hours(spec):
+    """'mon-thu 09:00-18:00; fri 09:00-15:00' → {день тижня: [(початок, кінець) у хвилинах]}"""
+    hours = {}
+    for entry in spec.split(";"):
+        entry = entry.strip()
+        if not entry:
+            continue
+        days, _, intervals = entry.partition(" ")
+        first, _, last = days.lower().partition("-")
+        start_day = DAYS.index(first)
+        end_day = DAYS.index(last or first)
+        parsed = []
+        for interval in intervals.replace(" ", "").split(","):
+            m = _INTERVAL.match(interval)
+            if m is None:
+                raise ValueError(f"Bad working hours interval: {interval!r}")
+            h1, m1, h2, m2 = map(int, m.groups())
+            parsed.append((h1 * 60 + m1, h2 * 60 + m2))
+        for day in range(start_day, end_day + 1):
+            hours.setdefault(day, []).extend(parsed)
+    return {day: sorted(intervals) for day, intervals in hours.items()}
+
+
+def parse_holidays(spec):
+    """'2026-01-01,2026-12-25' → {date, ...}"""
+    return {date.fromisoformat(d.strip()) for d in (spec or "").split(",") if d.strip()}
+
+
+class WorkCalendar:
+    """Робочі години магазину в його часовому поясі з вихідними-святами.
+
+    Поточний стан і момент наступної зміни (відкриття/закриття) кешуються,
+    тож is_open() до цього моменту - одне порівняння. Перехід на літній
+    час враховує zoneinfo.
+    """
+
+    def __init__(self, tz="Europe/Kyiv", hours=None, holidays=()):
+        self.tz = ZoneInfo(tz)
+        self.hours = parse_hours(DEFAULT_HOURS) if hours is None else hours
+        self.holidays = set(holidays)
+        self._lock = threading.Lock()
+        self._open = False
+        self._until = float("-inf")
+
+    def is_open(self, now=None):
+        now = time.time() if now is None else now
+        if now < self._until:
+            return self._open
+        with self._lock:
+            if not now < self._until:
+                self._open, self._until = self._compute(now)
+            return self._open
+
+    def next_transition(self, now=None):
+        """Unix-час наступного відкриття або закриття"""
+        self.is_open(now)
+        return self._until
+
+    def _intervals(self, day):
+        if day in self.holidays:
+            return ()
+        return self.hours.get(day.weekday(), ())
+
+    def _at(self, day, minute):
+        return (datetime(day.year, day.month, day.day, tzinfo=self.tz) + timedelta(minutes=minute)).timestamp()
+
+    def _compute(self, now):
+        """(відкрито зараз, коли це зміниться)"""
+        local = datetime.fromtimestamp(now, self.tz)
+        today = local.date()
+        minute = local.hour * 60 + local.minute + local.second / 60
+        for start, end in self._intervals(today):
+            if start <= minute < end:
+                return True, self._at(today, end)
+        for offset in range(0, 370):
+            day = today + timedelta(days=offset)
+            for start, _ in self._intervals(day):
+                if offset or start > minute:
+                    return False, self._at(day, start)
+        return False, float("inf")